@@ -0,0 +1,359 @@
+import os
+import sys
+import json
+import struct
+import argparse
+import tempfile
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from mysql.connector import Error
+
+from db import connection
+from sensor_latest import LATEST_COLUMNS
+from partitions import list_partitions, partition_name
+
+# =========================
+# Columnar cold archive for sensor_readings
+# =========================
+#
+# Days older than ARCHIVE_AFTER_DAYS are streamed out of MySQL with an
+# unbuffered (server-side) cursor, ARCHIVE_CHUNK_ROWS at a time, into one
+# file per day:
+#
+#   MAGIC | uint32 header length | JSON header, padded to 8 bytes
+#   one contiguous typed array per column, each 8-byte aligned
+#
+# Rows are sorted by (node, timestamp). The header lists the node_ids and
+# an offsets array gives each node's row range, so a per-node scan is a
+# slice. Columns: reading_id int64, ts int32 (seconds since midnight),
+# one float32 per reading column (NaN = NULL). About 48 bytes a reading.
+#
+# Queries memory-map the files, so a scan touches only the columns and
+# row ranges it reads. Once a day is archived and its row count checked,
+# --delete removes it from MySQL: DROP PARTITION when the day is exactly
+# one partition (see partitions.py), otherwise small batched DELETEs.
+
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_CHUNK_ROWS = int(os.getenv("ARCHIVE_CHUNK_ROWS", "50000"))
+DELETE_BATCH_ROWS = 10000
+
+MAGIC = b"JRARCHV1"
+READING_COLUMNS = LATEST_COLUMNS[2:]
+COLUMN_DTYPES = dict(
+    [("reading_id", "<i8"), ("ts", "<i4")] + [(col, "<f4") for col in READING_COLUMNS]
+)
+
+DAY_QUERY = f"""
+SELECT reading_id, node_id, timestamp, {', '.join(READING_COLUMNS)}
+FROM sensor_readings
+WHERE timestamp >= %s AND timestamp < %s
+"""
+
+DAY_COUNT_QUERY = "SELECT COUNT(*) FROM sensor_readings WHERE timestamp >= %s AND timestamp < %s"
+FIRST_DAY_QUERY = "SELECT DATE(MIN(timestamp)) FROM sensor_readings"
+DELETE_DAY_QUERY = f"DELETE FROM sensor_readings WHERE timestamp >= %s AND timestamp < %s LIMIT {DELETE_BATCH_ROWS}"
+
+
+def day_path(day, archive_dir=ARCHIVE_DIR):
+    return os.path.join(archive_dir, f"readings-{day:%Y%m%d}.jrcol")
+
+
+# -------- WRITE --------
+def _write_file(path, day, node_ids, columns, order):
+    """
+    columns: name -> unsorted array (possibly memmapped); order: row
+    permutation. Written via a temp file and renamed, so readers never
+    see a partial day.
+    """
+    count = len(order)
+    layout = {}
+    offset = 0
+    for name, dtype in COLUMN_DTYPES.items():
+        layout[name] = {"dtype": dtype, "offset": offset}
+        offset += -(-count * np.dtype(dtype).itemsize // 8) * 8
+    layout["node_offsets"] = {"dtype": "<i8", "offset": offset}
+
+    header = {
+        "day": day.isoformat(),
+        "rows": count,
+        "node_ids": node_ids,
+        "columns": layout,
+        "created": datetime.now().isoformat(),
+    }
+    blob = json.dumps(header).encode("utf-8")
+    blob += b" " * (-(len(MAGIC) + 4 + len(blob)) % 8)
+
+    node_codes = columns["node"]
+    offsets = np.zeros(len(node_ids) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(node_codes, minlength=len(node_ids)), out=offsets[1:])
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<I", len(blob)) + blob)
+        for name, dtype in COLUMN_DTYPES.items():
+            source = columns[name]
+            # Gather in slices so only one chunk of a column is in memory
+            for i in range(0, count, ARCHIVE_CHUNK_ROWS):
+                f.write(np.asarray(source[order[i:i + ARCHIVE_CHUNK_ROWS]], dtype=dtype).tobytes())
+            f.write(b"\0" * (-count * np.dtype(dtype).itemsize % 8))
+        f.write(offsets.tobytes())
+    os.replace(tmp, path)
+    return count
+
+
+def archive_day(conn, day, archive_dir=ARCHIVE_DIR, chunk_rows=ARCHIVE_CHUNK_ROWS):
+    """
+    Streams one day of sensor_readings into its columnar file. Chunks are
+    spilled to per-column temp files, so memory stays at one chunk plus
+    the sort permutation. Returns rows written.
+    """
+    start = datetime.combine(day, datetime.min.time())
+    node_index = {}
+    os.makedirs(archive_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=archive_dir) as spill:
+        spill_files = {
+            name: open(os.path.join(spill, name), "wb")
+            for name in ("node",) + tuple(COLUMN_DTYPES)
+        }
+        # Unbuffered: rows stay on the server until fetched
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(DAY_QUERY, (start, start + timedelta(days=1)))
+        count = 0
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            fields = list(zip(*rows))
+            nodes = np.array([node_index.setdefault(n, len(node_index)) for n in fields[1]], dtype=np.uint32)
+            ts = np.array([int((t - start).total_seconds()) for t in fields[2]], dtype=np.int32)
+            spill_files["node"].write(nodes.tobytes())
+            spill_files["reading_id"].write(np.array(fields[0], dtype=np.int64).tobytes())
+            spill_files["ts"].write(ts.tobytes())
+            for i, col in enumerate(READING_COLUMNS):
+                spill_files[col].write(np.array(fields[3 + i], dtype=np.float32).tobytes())
+            count += len(rows)
+        cursor.close()
+        for f in spill_files.values():
+            f.close()
+        if not count:
+            return 0
+
+        columns = {
+            name: np.memmap(os.path.join(spill, name), mode="r", dtype="<u4" if name == "node" else dtype)
+            for name, dtype in [("node", None)] + list(COLUMN_DTYPES.items())
+        }
+        order = np.lexsort((columns["ts"], columns["node"]))
+        node_ids = list(node_index)
+        columns["node"] = np.asarray(columns["node"])
+        written = _write_file(day_path(day, archive_dir), day, node_ids, columns, order)
+        del columns
+    return written
+
+
+def _drop_day(conn, day):
+    """Removes an archived day from MySQL. Returns how."""
+    end = day + timedelta(days=1)
+    # The first partition has no lower bound and may hold older rows too
+    previous = None
+    for name, bound, _ in list_partitions(conn):
+        if name == partition_name(day) and previous == day and bound == end:
+            cursor = conn.cursor()
+            cursor.execute(f"ALTER TABLE sensor_readings DROP PARTITION {name}")
+            cursor.close()
+            return "partition dropped"
+        previous = bound
+
+    # Short transactions keep row locks brief
+    cursor = conn.cursor()
+    deleted = 0
+    while True:
+        cursor.execute(DELETE_DAY_QUERY, (day, end))
+        conn.commit()
+        deleted += cursor.rowcount
+        if cursor.rowcount < DELETE_BATCH_ROWS:
+            break
+    cursor.close()
+    return f"{deleted} rows deleted"
+
+
+def run_archiver(conn, older_than_days=ARCHIVE_AFTER_DAYS, delete=False, archive_dir=ARCHIVE_DIR):
+    """Archives every day before the cutoff that has no file yet."""
+    os.makedirs(archive_dir, exist_ok=True)
+    cursor = conn.cursor()
+    cursor.execute(FIRST_DAY_QUERY)
+    first_day = cursor.fetchone()[0]
+    cursor.close()
+    if first_day is None:
+        return []
+
+    cutoff = date.today() - timedelta(days=older_than_days)
+    archived = []
+    day = first_day
+    while day < cutoff:
+        path = day_path(day, archive_dir)
+        if not os.path.exists(path):
+            rows = archive_day(conn, day, archive_dir)
+            if rows:
+                print(f"[ARCHIVE] {day}: {rows} rows -> {path}")
+                archived.append(day)
+        if delete and os.path.exists(path):
+            cursor = conn.cursor()
+            cursor.execute(DAY_COUNT_QUERY, (day, day + timedelta(days=1)))
+            live = cursor.fetchone()[0]
+            cursor.close()
+            stored = ArchiveDay(path).rows
+            if live and live != stored:
+                print(f"[ARCHIVE] {day}: {live} rows in MySQL, {stored} archived; not deleting "
+                      f"(remove {path} to re-archive)")
+            elif live:
+                print(f"[ARCHIVE] {day}: {_drop_day(conn, day)}")
+        day += timedelta(days=1)
+    return archived
+
+
+# -------- READ --------
+class ArchiveDay:
+    """Memory-mapped view of one archived day."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a readings archive")
+            (header_len,) = struct.unpack("<I", f.read(4))
+            self.header = json.loads(f.read(header_len))
+            data_offset = f.tell()
+
+        self.day = date.fromisoformat(self.header["day"])
+        self.rows = self.header["rows"]
+        self.node_ids = self.header["node_ids"]
+        self.node_index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self._map = np.memmap(path, dtype=np.uint8, mode="r", offset=data_offset)
+        self.offsets = self._array("node_offsets", len(self.node_ids) + 1)
+
+    def _array(self, name, count):
+        spec = self.header["columns"][name]
+        dtype = np.dtype(spec["dtype"])
+        return self._map[spec["offset"]:spec["offset"] + count * dtype.itemsize].view(dtype)
+
+    def column(self, name):
+        """Whole column as a read-only memmapped array, in (node, ts) order."""
+        return self._array(name, self.rows)
+
+    def timestamps(self, rows=slice(None)):
+        return np.datetime64(self.day, "s") + self.column("ts")[rows].astype("timedelta64[s]")
+
+    def node_rows(self, node_id):
+        """Row slice holding node_id, empty if it has no readings that day."""
+        i = self.node_index.get(node_id)
+        if i is None:
+            return slice(0, 0)
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def select(self, start=None, end=None, node_id=None):
+        """Row indices (a slice when possible) for a time range and node."""
+        rows = self.node_rows(node_id) if node_id else slice(0, self.rows)
+        if start is None and end is None:
+            return rows
+        ts = self.column("ts")[rows]
+        lo = -1 if start is None else (np.datetime64(start, "s") - np.datetime64(self.day, "s")).astype(int)
+        hi = 86400 if end is None else (np.datetime64(end, "s") - np.datetime64(self.day, "s")).astype(int)
+        if node_id:
+            # Sorted by ts within one node
+            a, b = np.searchsorted(ts, [lo, hi], side="left")
+            return slice(rows.start + int(a), rows.start + int(b))
+        return np.flatnonzero((ts >= lo) & (ts < hi))
+
+
+class Archive:
+    """All archived days in a directory."""
+
+    def __init__(self, archive_dir=ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+
+    def days(self, start=None, end=None):
+        """
+        ArchiveDay for each file overlapping [start, end) (datetimes).
+        Nothing if the archive directory does not exist yet.
+        """
+        if not os.path.isdir(self.archive_dir):
+            return
+        names = sorted(n for n in os.listdir(self.archive_dir) if n.endswith(".jrcol"))
+        for name in names:
+            day_start = datetime.strptime(name[len("readings-"):-len(".jrcol")], "%Y%m%d")
+            if start is not None and day_start + timedelta(days=1) <= start:
+                continue
+            if end is not None and day_start >= end:
+                continue
+            yield ArchiveDay(os.path.join(self.archive_dir, name))
+
+    def scan(self, start, end, columns=READING_COLUMNS, node_id=None):
+        """
+        Yields per-day dicts with timestamp, node_id (when not filtered)
+        and the requested columns for readings in [start, end).
+        """
+        for archive_day in self.days(start, end):
+            rows = archive_day.select(start, end, node_id)
+            batch = {"timestamp": archive_day.timestamps(rows)}
+            if not node_id:
+                node_codes = np.repeat(np.arange(len(archive_day.node_ids)), np.diff(archive_day.offsets))
+                batch["node_id"] = np.asarray(archive_day.node_ids, dtype=object)[node_codes[rows]]
+            for col in columns:
+                batch[col] = archive_day.column(col)[rows]
+            yield batch
+
+    def aggregate(self, start, end, columns=READING_COLUMNS, node_id=None):
+        """min, max, mean and count (non-NULL) per column over [start, end)."""
+        totals = {col: [np.inf, -np.inf, 0.0, 0] for col in columns}
+        for archive_day in self.days(start, end):
+            rows = archive_day.select(start, end, node_id)
+            for col in columns:
+                values = archive_day.column(col)[rows]
+                valid = values[~np.isnan(values)]
+                if valid.size:
+                    t = totals[col]
+                    t[0] = min(t[0], float(valid.min()))
+                    t[1] = max(t[1], float(valid.max()))
+                    t[2] += float(valid.sum(dtype=np.float64))
+                    t[3] += int(valid.size)
+        return {
+            col: {"min": lo, "max": hi, "mean": total / n, "count": n} if n else
+                 {"min": None, "max": None, "mean": None, "count": 0}
+            for col, (lo, hi, total, n) in totals.items()
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive old sensor_readings to columnar files")
+    parser.add_argument("action", choices=["run", "info", "query"])
+    parser.add_argument("--dir", default=ARCHIVE_DIR)
+    parser.add_argument("--older-than", type=int, default=ARCHIVE_AFTER_DAYS, help="run: days kept in MySQL")
+    parser.add_argument("--delete", action="store_true", help="run: remove archived days from MySQL")
+    parser.add_argument("--start", type=datetime.fromisoformat, help="query: ISO time")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="query: ISO time")
+    parser.add_argument("--node", help="query: one node_id")
+    parser.add_argument("--columns", nargs="+", default=list(READING_COLUMNS))
+    args = parser.parse_args()
+
+    if args.action == "info":
+        for archive_day in Archive(args.dir).days():
+            size = os.path.getsize(day_path(archive_day.day, args.dir))
+            print(f"[ARCHIVE] {archive_day.day}: {archive_day.rows} rows, "
+                  f"{len(archive_day.node_ids)} nodes, {size / 1e6:.1f} MB")
+        sys.exit(0)
+
+    if args.action == "query":
+        if not (args.start and args.end):
+            parser.error("query needs --start and --end")
+        for col, stats in Archive(args.dir).aggregate(args.start, args.end, args.columns, args.node).items():
+            print(f"[ARCHIVE] {col:<17} {stats}")
+        sys.exit(0)
+
+    try:
+        with connection() as conn:
+            archived = run_archiver(conn, args.older_than, args.delete, args.dir)
+        print(f"[ARCHIVE] Archived {len(archived)} days")
+    except Error as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
@@ -0,0 +1,380 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import statistics
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+
+import numpy as np
+
+from cwqi import compute_cwqi, compute_cwqi_batch, readings_to_columns, READING_KEYS
+from cwqi_analyzer import CWQIAnalyzer, decide_alerts
+from sensor_latest import LATEST_COLUMNS
+from storage import MySQLStorage, SQLiteStorage
+
+# =========================
+# Benchmarks for the CWQI and analyzer hot paths
+# =========================
+#
+# Runs without MySQL: the analyzer talks to an in-memory stand-in that
+# serves synthetic readings, keeps the open alerts it is sent and
+# swallows the other writes, so what is measured is
+# the Python side of a tick (fetch handling, scoring, alert decisions,
+# statement building). The sqlite_* benchmarks run the same paths against
+# an embedded WAL database in a temporary directory, storage included.
+# Results are written as JSON for run-to-run diffs:
+#
+#   python benchmark.py --output bench.json
+#   python benchmark.py --compare bench.json
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+# Fraction of nodes given contaminated readings, roughly a busy tick
+CONTAMINATED_FRACTION = 0.02
+# Fraction of nodes that flip between clean and contaminated every tick
+# in the analyzer benchmarks, so each tick writes a known number of
+# status rows, transitions and alert changes
+STATUS_FLIP_FRACTION = 0.02
+# A metric this much slower than the baseline counts as a regression
+REGRESSION_TOLERANCE = 0.20
+
+
+# -------- SYNTHETIC DATA --------
+def synthetic_readings(count, seed=0):
+    """Reading rows shaped like LATEST_READING_QUERY results."""
+    rng = np.random.default_rng(seed)
+    columns = {
+        "turbidity": rng.uniform(0.3, 2.5, count).round(2),
+        "ph": rng.uniform(6.8, 7.6, count).round(2),
+        "fluoride": rng.uniform(0.4, 1.0, count).round(2),
+        "coliform": np.zeros(count, dtype=int),
+        "conductivity": rng.uniform(400, 900, count).round(1),
+        "temperature": rng.uniform(24, 32, count).round(1),
+        "dissolved_oxygen": rng.uniform(4.5, 7.5, count).round(1),
+        "pressure": rng.uniform(1.5, 3.5, count).round(2),
+    }
+    dirty = rng.random(count) < CONTAMINATED_FRACTION
+    columns["turbidity"][dirty] = rng.uniform(10.0, 25.0, dirty.sum()).round(2)
+    columns["coliform"][dirty] = rng.integers(10, 500, dirty.sum())
+
+    lists = {key: values.tolist() for key, values in columns.items()}
+    return [
+        dict(
+            {key: lists[key][i] for key in READING_KEYS},
+            node_id=f"L3_BENCH_{i}", hierarchy_level=3, pump=f"BENCH_PUMP_{i % 50}"
+        )
+        for i in range(count)
+    ]
+
+
+def flipping_ticks(readings, fraction=STATUS_FLIP_FRACTION):
+    """
+    (ticks, flipped): two versions of the readings that alternate tick by
+    tick. In the second, `fraction` of the clean nodes read as
+    contaminated, which always turns them RED.
+    """
+    clean = [i for i, row in enumerate(readings) if row["coliform"] == 0]
+    chosen = set(clean[::max(1, round(1 / fraction))][:round(len(readings) * fraction)])
+    dirty = [
+        dict(row, turbidity=15.0, coliform=50) if i in chosen else row
+        for i, row in enumerate(readings)
+    ]
+    return (readings, dirty), len(chosen)
+
+
+# -------- IN-MEMORY STAND-IN --------
+class MemoryCursor:
+    """
+    Answers the analyzer's queries from memory and counts writes. Alert
+    inserts and resolves are applied to db.alerts, and status upserts to
+    db.statuses, so later ticks and reloads see what earlier ones wrote,
+    as with the real tables.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.rowcount = 0
+        self._result = []
+
+    def execute(self, query, params=None):
+        head = query.lstrip().split(None, 1)[0].upper()
+        self.rowcount = 0
+        if head == "SELECT":
+            if "FROM alerts" in query:
+                # Active alerts, optionally for the node_ids in params
+                wanted = set(params) if params else None
+                self._result = [
+                    {"node_id": node_id, "alert_id": alert_id, "alert_level": level}
+                    for node_id, (alert_id, level) in self.db.alerts.items()
+                    if wanted is None or node_id in wanted
+                ]
+            elif "FROM node_status" in query:
+                self._result = [
+                    dict(zip(("node_id", "cwqi", "status", "reason", "anomaly_detected"), (node_id,) + row))
+                    for node_id, row in self.db.statuses.items()
+                ]
+            elif "MAX(reading_id)" in query:
+                self._result = [{"max_id": 0}]
+            else:
+                self._result = self.db.readings
+        else:
+            self.db.statements += 1
+            self.rowcount = query.count("(%s")
+            self._result = []
+            if "INTO alerts" in query:
+                # (node_id, hierarchy_level, alert_level, cwqi, reason, detected_at, is_active)
+                for i in range(0, len(params), 7):
+                    self.db.last_alert_id += 1
+                    self.db.alerts[params[i]] = (self.db.last_alert_id, params[i + 2])
+            elif "INTO node_status (" in query:
+                # (node_id, last_updated, cwqi, status, reason, anomaly_detected)
+                for i in range(0, len(params), 6):
+                    self.db.statuses[params[i]] = tuple(params[i + 2:i + 6])
+            elif head == "UPDATE" and "alerts" in query:
+                self.rowcount = sum(self.db.alerts.pop(node_id, None) is not None for node_id in params[1:])
+
+    def fetchall(self):
+        return self._result
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def close(self):
+        pass
+
+
+class MemoryConnection:
+    def __init__(self, readings):
+        self.readings = readings
+        self.statements = 0
+        self.commits = 0
+        # node_id -> (alert_id, alert_level) for the open alerts
+        self.alerts = {}
+        self.last_alert_id = 0
+        # node_id -> (cwqi, status, reason, anomaly_detected)
+        self.statuses = {}
+
+    def cursor(self, dictionary=False):
+        return MemoryCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+
+# -------- TIMING --------
+def _summary(samples_s, per=1):
+    """Latency summary in microseconds per `per` operations."""
+    us = sorted(s * 1e6 / per for s in samples_s)
+    return {
+        "runs": len(us),
+        "mean_us": round(statistics.fmean(us), 3),
+        "p50_us": round(us[len(us) // 2], 3),
+        "p95_us": round(us[min(len(us) - 1, int(len(us) * 0.95))], 3),
+        "min_us": round(us[0], 3),
+    }
+
+
+def _time(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+# -------- BENCHMARKS --------
+def bench_compute_cwqi(calls=20000):
+    readings = synthetic_readings(calls, seed=1)
+    samples = []
+    for reading in readings:
+        start = time.perf_counter()
+        compute_cwqi(reading)
+        samples.append(time.perf_counter() - start)
+    return _summary(samples)
+
+
+def bench_compute_cwqi_batch(size, repeat):
+    columns = readings_to_columns(synthetic_readings(size, seed=2))
+    result = _summary(_time(lambda: compute_cwqi_batch(columns), repeat))
+    result["per_row_us"] = round(result["p50_us"] / size, 4)
+    return result
+
+
+def bench_analyzer_tick(size, repeat):
+    """
+    Full run_tick against the stand-in: every node rescored, all status
+    rows written on the first tick, then only the flipped nodes' (see
+    flipping_ticks) along with their transitions and alert changes.
+    """
+    ticks, flipped = flipping_ticks(synthetic_readings(size, seed=3))
+    conn = MemoryConnection(ticks[0])
+    store = MySQLStorage(conn)
+    analyzer = CWQIAnalyzer(cache_size=0, incremental=False)
+
+    reports = []
+    for i in range(repeat):
+        conn.readings = ticks[i % 2]
+        reports.append(analyzer.run_tick(store))
+
+    result = _summary([r["total_ms"] / 1000 for r in reports])
+    for phase in ("fetch_ms", "score_ms", "alerts_ms", "write_ms"):
+        result[phase] = statistics.median(r[phase] for r in reports)
+    result["statements_per_tick"] = conn.statements // repeat
+    result.update(_write_counts(reports, flipped))
+    return result
+
+
+def _write_counts(reports, flipped):
+    """Median writes per tick; status rows and transitions should equal flipped."""
+    return {
+        "flipped_per_tick": flipped,
+        "status_rows_per_tick": statistics.median(r["status_rows"] for r in reports),
+        "transitions_per_tick": statistics.median(r["transitions"] for r in reports),
+        "alert_changes_per_tick": statistics.median(r["raised"] + r["resolved"] for r in reports),
+    }
+
+
+def bench_decide_alerts(size, repeat):
+    readings = synthetic_readings(size, seed=4)
+    cwqi, status, reasons = compute_cwqi_batch(readings_to_columns(readings))
+    cwqi, status, reasons = cwqi.tolist(), status.tolist(), reasons.tolist()
+    # Half of the abnormal nodes already have an alert open at another level
+    active = {
+        row["node_id"]: (i, "AMBER")
+        for i, (row, code) in enumerate(zip(readings, status))
+        if code and i % 2
+    }
+    now = datetime.now(timezone.utc)
+
+    samples = _time(lambda: decide_alerts(readings, cwqi, status, reasons, active, now), repeat)
+    result = _summary(samples)
+    result["rows_per_sec"] = round(size / statistics.median(samples))
+    return result
+
+
+def _reading_rows(readings, now):
+    """sensor_readings insert tuples for synthetic readings."""
+    return [(r["node_id"], now) + tuple(r.get(col) for col in LATEST_COLUMNS[2:]) for r in readings]
+
+
+def _sqlite_store(path, readings):
+    """A WAL database holding the readings' nodes and one tick of readings."""
+    store = SQLiteStorage(path)
+    store._insert_rows("INSERT INTO nodes (node_id, hierarchy_level, pump) VALUES ",
+                       [(r["node_id"], r["hierarchy_level"], r["pump"]) for r in readings], 3)
+    store.insert_readings(_reading_rows(readings, datetime(2026, 1, 1)))
+    store.commit()
+    return store
+
+
+def bench_sqlite_insert(size, repeat):
+    """One tick of sensor_readings + sensor_latest per commit, like the writer thread."""
+    readings = synthetic_readings(size, seed=5)
+    ticks = [_reading_rows(readings, datetime(2026, 1, 1, 0, 0, 5 * (i + 1))) for i in range(repeat)]
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _sqlite_store(os.path.join(tmp, "bench.db"), readings)
+        pending = iter(ticks)
+
+        def tick():
+            store.insert_readings(next(pending))
+            store.commit()
+
+        samples = _time(tick, repeat)
+        store.close()
+    result = _summary(samples)
+    result["rows_per_sec"] = round(size / statistics.median(samples))
+    return result
+
+
+def bench_analyzer_tick_sqlite(size, repeat):
+    """Full run_tick against a WAL database: real reads, upserts and commits."""
+    ticks, flipped = flipping_ticks(synthetic_readings(size, seed=6))
+    with tempfile.TemporaryDirectory() as tmp:
+        store = _sqlite_store(os.path.join(tmp, "bench.db"), ticks[0])
+        analyzer = CWQIAnalyzer(cache_size=0, incremental=False)
+        reports = []
+        for i in range(repeat):
+            # Untimed: the next tick's readings land in sensor_latest
+            store.insert_readings(_reading_rows(ticks[i % 2], datetime(2026, 1, 1, 0, 0, 5 * (i + 1))))
+            store.commit()
+            reports.append(analyzer.run_tick(store))
+        store.close()
+
+    result = _summary([r["total_ms"] / 1000 for r in reports])
+    for phase in ("fetch_ms", "score_ms", "alerts_ms", "write_ms"):
+        result[phase] = statistics.median(r[phase] for r in reports)
+    result.update(_write_counts(reports, flipped))
+    return result
+
+
+def run_all(sizes, repeat):
+    # The analyzer prints one line per alert change; keep that out of the
+    # timings and out of the JSON on stdout
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        results = {"compute_cwqi": bench_compute_cwqi()}
+        for size in sizes:
+            results[f"compute_cwqi_batch@{size}"] = bench_compute_cwqi_batch(size, repeat)
+            results[f"analyzer_tick@{size}"] = bench_analyzer_tick(size, repeat)
+            results[f"decide_alerts@{size}"] = bench_decide_alerts(size, repeat)
+            results[f"sqlite_insert@{size}"] = bench_sqlite_insert(size, repeat)
+            results[f"analyzer_tick_sqlite@{size}"] = bench_analyzer_tick_sqlite(size, repeat)
+
+    return {
+        "meta": {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "sizes": list(sizes),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+# -------- COMPARISON --------
+def compare(current, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Returns [(benchmark, baseline_p50, current_p50, ratio)] for regressions."""
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if not base:
+            continue
+        ratio = result["p50_us"] / base["p50_us"] if base["p50_us"] else 1.0
+        print(f"[BENCH] {name:<28} {base['p50_us']:>12.1f}us -> {result['p50_us']:>12.1f}us  x{ratio:.2f}")
+        if ratio > 1 + tolerance:
+            regressions.append((name, base["p50_us"], result["p50_us"], ratio))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CWQI scoring and analyzer ticks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--compare", help="baseline JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    report = run_all(args.sizes, args.repeat)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[BENCH] Results written to {args.output}")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            for name, base, current, ratio in regressions:
+                print(f"[BENCH] REGRESSION {name}: {base:.1f}us -> {current:.1f}us (x{ratio:.2f})")
+            sys.exit(1)
@@ -0,0 +1,214 @@
+import os
+import csv
+import time
+import queue
+import tempfile
+import threading
+
+from sensor_latest import LATEST_COLUMNS
+from storage import MySQLStorage, SQLiteStorage, STORAGE_BACKEND, SQLITE_PATH, STORAGE_ERRORS
+
+# =========================
+# Background writer for sensor_readings
+# =========================
+#
+# Producers hand over whole ticks with submit() and carry on; a single
+# thread drains a bounded queue into MySQL, one transaction per tick
+# (sensor_readings + sensor_latest). When the database falls behind the
+# queue fills and submit() blocks, which shows up in stats() as
+# backpressure instead of as a slowly drifting tick cadence.
+#
+# With STORAGE_BACKEND=sqlite the thread writes to the embedded database
+# instead, with executemany in the same one-transaction-per-tick shape.
+
+WRITE_MODE = os.getenv("WRITER_MODE", "insert")  # insert | load_data
+ROWS_PER_STATEMENT = int(os.getenv("WRITER_ROWS_PER_STATEMENT", "1000"))
+QUEUE_TICKS = int(os.getenv("WRITER_QUEUE_TICKS", "4"))
+
+# csv.writer quotes fields holding commas (many seed node_ids do); NULLs
+# are written as \N
+LOAD_READINGS_QUERY = f"""
+LOAD DATA LOCAL INFILE %s INTO TABLE sensor_readings
+FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+LINES TERMINATED BY '\\n'
+({', '.join(LATEST_COLUMNS)})
+"""
+
+_STOP = object()
+
+
+class BulkWriter:
+    """
+    Writes batches of sensor_readings insert tuples (LATEST_COLUMNS order)
+    on a background thread.
+
+    mode "insert" sends multi-row INSERTs of rows_per_statement rows;
+    "load_data" streams chunks of the same size through LOAD DATA LOCAL
+    INFILE, which needs local_infile enabled on the server. On the
+    sqlite backend only "insert" applies.
+    """
+
+    def __init__(self, mode=WRITE_MODE, rows_per_statement=ROWS_PER_STATEMENT,
+                 queue_ticks=QUEUE_TICKS, backend=STORAGE_BACKEND):
+        if mode not in ("insert", "load_data") or (backend == "sqlite" and mode != "insert"):
+            raise ValueError(f"Unknown writer mode for {backend}: {mode}")
+        self.mode = mode
+        self.backend = backend
+        self.rows_per_statement = rows_per_statement
+        self._queue = queue.Queue(maxsize=queue_ticks)
+        self._pool = None
+        self._sqlite = None  # opened on the writer thread, which owns it
+        if backend == "mysql":
+            from db import DB_CONFIG, ConnectionPool
+            config = dict(DB_CONFIG, allow_local_infile=True) if mode == "load_data" else DB_CONFIG
+            self._pool = ConnectionPool(size=1, config=config)
+        self._thread = threading.Thread(target=self._run, name="bulk-writer", daemon=True)
+        self._lock = threading.Lock()
+
+        self.submitted_rows = 0
+        self.written_rows = 0
+        self.failed_rows = 0
+        self.failed_ticks = 0
+        self.statements = 0
+        self.transactions = 0
+        self.max_depth = 0
+        self.blocked = 0
+        self.blocked_time = 0.0
+        self.write_time = 0.0
+        self.last_write_ms = 0.0
+
+        self._thread.start()
+
+    # -------- PRODUCER SIDE --------
+    def submit(self, rows):
+        """Queues one tick's rows; blocks only while the queue is full."""
+        if not rows:
+            return
+        try:
+            self._queue.put_nowait(rows)
+        except queue.Full:
+            start = time.perf_counter()
+            self._queue.put(rows)
+            with self._lock:
+                self.blocked += 1
+                self.blocked_time += time.perf_counter() - start
+        with self._lock:
+            self.submitted_rows += len(rows)
+            self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def flush(self):
+        """Waits until everything submitted so far is committed."""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+        if self._pool:
+            self._pool.close_all()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": self.backend,
+                "mode": self.mode,
+                "queue_depth": self._queue.qsize(),
+                "max_depth": self.max_depth,
+                "submitted_rows": self.submitted_rows,
+                "written_rows": self.written_rows,
+                "failed_rows": self.failed_rows,
+                "failed_ticks": self.failed_ticks,
+                "statements": self.statements,
+                "transactions": self.transactions,
+                "blocked": self.blocked,
+                "blocked_ms": round(self.blocked_time * 1000, 1),
+                "last_write_ms": round(self.last_write_ms, 1),
+                "avg_rows_per_s": round(self.written_rows / self.write_time) if self.write_time else 0,
+            }
+
+    # -------- WRITER THREAD --------
+    def _run(self):
+        while True:
+            rows = self._queue.get()
+            try:
+                if rows is _STOP:
+                    if self._sqlite:
+                        self._sqlite.close()
+                    return
+                self._write(rows)
+            except Exception as e:
+                # A dead thread would leave submit() and flush() blocked
+                # forever on the queue, so a bad tick is dropped instead
+                self._dropped(rows, e)
+            finally:
+                self._queue.task_done()
+
+    def _write(self, rows):
+        start = time.perf_counter()
+        if self._pool:
+            statements = self._write_mysql(rows)
+        else:
+            statements = self._write_sqlite(rows)
+        if statements is None:
+            return
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.written_rows += len(rows)
+            self.statements += statements
+            self.transactions += 1
+            self.write_time += elapsed
+            self.last_write_ms = elapsed * 1000
+
+    def _write_mysql(self, rows):
+        """Returns statements issued, or None if the tick was dropped."""
+        try:
+            conn = self._pool.acquire()
+        except STORAGE_ERRORS as e:
+            self._dropped(rows, e)
+            return None
+        broken = False
+        try:
+            store = MySQLStorage(conn, self.rows_per_statement,
+                                 self._load_chunk if self.mode == "load_data" else None)
+            statements = store.insert_readings(rows)
+            store.commit()
+            store.close()
+            return statements
+        except STORAGE_ERRORS as e:
+            broken = not conn.is_connected()
+            self._dropped(rows, e)
+            return None
+        finally:
+            self._pool.release(conn, broken=broken)
+
+    def _write_sqlite(self, rows):
+        try:
+            if self._sqlite is None:
+                self._sqlite = SQLiteStorage(SQLITE_PATH)
+            statements = self._sqlite.insert_readings(rows)
+            self._sqlite.commit()
+            return statements
+        except Exception:
+            # The connection outlives the tick; don't leave its rows for
+            # the next commit
+            if self._sqlite:
+                self._sqlite.rollback()
+            raise
+
+    def _dropped(self, rows, error):
+        print(f"[WRITER] Dropped {len(rows)} rows: {error}")
+        with self._lock:
+            self.failed_rows += len(rows)
+            self.failed_ticks += 1
+
+    @staticmethod
+    def _load_chunk(cursor, chunk):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", newline="", delete=False) as f:
+            csv.writer(f, lineterminator="\n").writerows(
+                ["\\N" if value is None else value for value in row] for row in chunk
+            )
+            path = f.name
+        try:
+            cursor.execute(LOAD_READINGS_QUERY, (path,))
+        finally:
+            os.remove(path)
@@ -2,6 +2,12 @@
 # Centralized Water Quality Index (CWQI)
 # =========================
 
+import bisect
+import json
+from collections import OrderedDict
+
+import numpy as np
+
 def is_valid(x):
     return x is not None
 
@@ -110,13 +116,19 @@ WEIGHTS = {
 
 # -------- CWQI Core --------
 
-def compute_cwqi(reading: dict):
+def compute_cwqi(reading: dict, profile=None):
     """
     reading keys expected:
     turbidity, ph, fluoride, coliform,
     conductivity, temperature, dissolved_oxygen, pressure
+
+    profile: optional registered profile name; defaults to the
+    built-in BIS curves below.
     """
 
+    if profile is not None:
+        return _compute_cwqi_profile(reading, PROFILES[profile])
+
     scores = {
         "turbidity": turbidity_score(reading.get("turbidity")),
         "ph": ph_score(reading.get("ph")),
@@ -128,14 +140,26 @@ def compute_cwqi(reading: dict):
         "pressure": pressure_score(reading.get("pressure")),
     }
 
+    return _combine_scores(scores, WEIGHTS)
+
+
+def _compute_cwqi_profile(reading, profile):
+    scores = {
+        param: profile.score(param, reading.get(key))
+        for param, key in zip(PARAMS, READING_KEYS)
+    }
+    return _combine_scores(scores, profile.weights)
+
+
+def _combine_scores(scores, weights):
     total = 0.0
     weight_sum = 0.0
     reasons = []
 
     for param, score in scores.items():
         if score is not None:
-            total += score * WEIGHTS[param]
-            weight_sum += WEIGHTS[param]
+            total += score * weights[param]
+            weight_sum += weights[param]
             if score < 50:
                 reasons.append(f"{param} degraded")
 
@@ -157,6 +181,392 @@ def compute_cwqi(reading: dict):
     return round(cwqi, 2), status, reason
 
 
+# -------- Batch CWQI --------
+
+# Parameter order matches the `scores` dict in compute_cwqi so that the
+# reason text decoded from a bitmask lists parameters in the same order.
+PARAMS = (
+    "turbidity", "ph", "fluoride", "coliform",
+    "conductivity", "temperature", "do", "pressure"
+)
+
+# Reading key (sensor_readings column) for each entry in PARAMS
+READING_KEYS = (
+    "turbidity", "ph", "fluoride", "coliform",
+    "conductivity", "temperature", "dissolved_oxygen", "pressure"
+)
+
+STATUS_GREEN = 0
+STATUS_AMBER = 1
+STATUS_RED = 2
+STATUS_NAMES = ("GREEN", "AMBER", "RED")
+
+# Bit i of a reason mask means PARAMS[i] scored below 50.
+# The extra bit marks the coliform hard override.
+REASON_COLIFORM_CRITICAL = 1 << len(PARAMS)
+
+
+def reason_text(mask):
+    """Decode a reason bitmask into the string compute_cwqi returns."""
+    mask = int(mask)
+    if mask & REASON_COLIFORM_CRITICAL:
+        return "Critical coliform contamination"
+    reasons = [f"{param} degraded" for i, param in enumerate(PARAMS) if mask >> i & 1]
+    return ", ".join(reasons) if reasons else "All parameters normal"
+
+
+def readings_to_columns(readings):
+    """
+    Turns a list of reading dicts (or DB rows) into the columnar form
+    expected by compute_cwqi_batch. Missing values become NaN.
+    """
+    return {
+        key: np.array([r.get(key) for r in readings], dtype=np.float64)
+        for key in READING_KEYS
+    }
+
+
+# -------- Scoring profiles --------
+#
+# A profile is the sub-score curves plus weights for one water standard.
+# Each parameter is a piecewise function given as sorted edges with one
+# piece per interval between them:
+#
+#   edge  ["le", x]  values <= x fall left of the edge
+#         ["lt", x]  values <  x fall left of the edge
+#   piece 100                  constant score
+#         [y0, x0, num, den]   y0 + (v - x0) * num / den, floored at 0
+#
+# Profiles are compiled once into NumPy arrays so scoring a column is two
+# searchsorted calls and a gather, whatever the profile.
+
+BIS_PROFILE = {
+    "weights": dict(WEIGHTS),
+    "params": {
+        "turbidity": {"edges": [["le", 1], ["le", 5]],
+                      "pieces": [100, [100, 1, -20, 1], 0]},
+        "ph": {"edges": [["lt", 6.5], ["le", 8.5]],
+               "pieces": [[100, 7.0, 50, 1], 100, [100, 7.0, -50, 1]]},
+        "fluoride": {"edges": [["le", 1.0], ["le", 1.5]],
+                     "pieces": [100, [100, 1.0, -100, 1], 0]},
+        "coliform": {"edges": [["lt", 0], ["le", 0], ["le", 10]],
+                     "pieces": [50, 100, 50, 0]},
+        "conductivity": {"edges": [["le", 500], ["le", 1500]],
+                         "pieces": [100, [100, 500, -1, 10], 0]},
+        "temperature": {"edges": [["lt", 20], ["le", 30], ["le", 35]],
+                        "pieces": [[100, 30, -10, 1], 100, [100, 30, -10, 1], 0]},
+        "do": {"edges": [["lt", 4], ["lt", 6]],
+               "pieces": [0, [0, 4, 100, 2], 100]},
+        "pressure": {"edges": [["lt", 1], ["lt", 2], ["le", 5], ["le", 6]],
+                     "pieces": [0, 50, 100, 50, 0]},
+    }
+}
+
+# Monsoon runoff: tighter turbidity band and more weight on coliform
+MONSOON_PROFILE = {
+    "weights": {
+        "coliform": 0.30,
+        "turbidity": 0.20,
+        "ph": 0.10,
+        "fluoride": 0.10,
+        "conductivity": 0.10,
+        "do": 0.10,
+        "pressure": 0.05,
+        "temperature": 0.05
+    },
+    "params": dict(BIS_PROFILE["params"], turbidity={
+        "edges": [["le", 0.5], ["le", 3]],
+        "pieces": [100, [100, 0.5, -40, 1], 0]
+    })
+}
+
+
+class ScoringProfile:
+    """A profile spec compiled into lookup arrays."""
+
+    def __init__(self, name, spec):
+        self.name = name
+        self.weights = {param: float(spec["weights"][param]) for param in PARAMS}
+        self.tables = [_compile_piecewise(param, spec["params"][param]) for param in PARAMS]
+        # Plain-list copy so the scalar path stays in Python floats
+        self._scalar_tables = {
+            param: tuple(a.tolist() for a in table) for param, table in zip(PARAMS, self.tables)
+        }
+
+    def score(self, param, value):
+        """Scalar sub-score, same contract as the *_score functions."""
+        if not is_valid(value):
+            return None
+        lt_edges, le_edges, y0, x0, num, den, const = self._scalar_tables[param]
+        i = bisect.bisect_right(lt_edges, value) + bisect.bisect_left(le_edges, value)
+        if const[i]:
+            return y0[i]
+        return max(0, y0[i] + (value - x0[i]) * num[i] / den[i])
+
+    def score_column(self, index, values):
+        """Vectorized sub-scores for PARAMS[index]. NaN rows are garbage."""
+        lt_edges, le_edges, y0, x0, num, den, const = self.tables[index]
+        i = np.searchsorted(lt_edges, values, side="right") + np.searchsorted(le_edges, values, side="left")
+        with np.errstate(invalid="ignore"):
+            linear = y0[i] + (values - x0[i]) * num[i] / den[i]
+        return np.maximum(np.where(const[i], y0[i], linear), 0)
+
+
+def _compile_piecewise(param, spec):
+    edges = spec["edges"]
+    pieces = spec["pieces"]
+    if len(pieces) != len(edges) + 1:
+        raise ValueError(f"{param}: expected {len(edges) + 1} pieces, got {len(pieces)}")
+
+    # "lt" sorts before "le" at the same value, so this is the interval order
+    order = [(x, 0 if kind == "lt" else 1) for kind, x in edges]
+    if order != sorted(order):
+        raise ValueError(f"{param}: edges must be sorted")
+
+    y0, x0, num, den, const = [], [], [], [], []
+    for piece in pieces:
+        if isinstance(piece, (int, float)):
+            y0.append(piece); x0.append(0.0); num.append(0.0); den.append(1.0); const.append(True)
+        else:
+            y0.append(piece[0]); x0.append(piece[1]); num.append(piece[2]); den.append(piece[3]); const.append(False)
+
+    return (
+        np.array([x for kind, x in edges if kind == "lt"], dtype=np.float64),
+        np.array([x for kind, x in edges if kind == "le"], dtype=np.float64),
+        np.array(y0, dtype=np.float64),
+        np.array(x0, dtype=np.float64),
+        np.array(num, dtype=np.float64),
+        np.array(den, dtype=np.float64),
+        np.array(const, dtype=bool),
+    )
+
+
+# name -> ScoringProfile, and the same profiles by integer id for batch use
+PROFILES = {}
+PROFILE_LIST = []
+
+DEFAULT_PROFILE = "bis"
+
+
+def register_profile(name, spec):
+    """Compiles spec and registers it under name. Returns the profile id."""
+    profile = ScoringProfile(name, spec)
+    if name in PROFILES:
+        profile_id = PROFILE_LIST.index(PROFILES[name])
+        PROFILE_LIST[profile_id] = profile
+    else:
+        profile_id = len(PROFILE_LIST)
+        PROFILE_LIST.append(profile)
+    PROFILES[name] = profile
+    return profile_id
+
+
+def profile_id(name):
+    return PROFILE_LIST.index(PROFILES[name])
+
+
+def load_profiles(path):
+    """
+    Registers profiles from a JSON file and returns its pump assignments.
+
+    File layout:
+      {"default": "bis",
+       "pumps": {"BANIPARK": "monsoon"},
+       "profiles": {"<name>": <profile spec>}}
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    for name, spec in config.get("profiles", {}).items():
+        register_profile(name, spec)
+    return config.get("default", DEFAULT_PROFILE), config.get("pumps", {})
+
+
+register_profile("bis", BIS_PROFILE)
+register_profile("monsoon", MONSOON_PROFILE)
+
+
+def _round2(values):
+    """
+    Elementwise equivalent of Python's round(x, 2).
+
+    np.round scales by 100 before rounding, which can pick the other
+    neighbour when x sits on a decimal tie. Those few values are redone
+    with the builtin so the batch path matches compute_cwqi exactly.
+    """
+    rounded = np.round(values, 2)
+    scaled = values * 100
+    ties = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for i in ties:
+        rounded[i] = round(float(values[i]), 2)
+    return rounded
+
+
+def compute_cwqi_batch(columns, profile=DEFAULT_PROFILE, profile_ids=None):
+    """
+    Scores many readings at once.
+
+    columns maps each reading key (same keys as compute_cwqi) to an array
+    of equal length; NaN means the parameter is missing for that row.
+
+    Every row is scored under `profile` unless profile_ids is given, in
+    which case it holds one registered profile id per row.
+
+    Returns (cwqi, status, reasons) arrays:
+      cwqi    float64, rounded to 2 decimals
+      status  int8 codes indexing STATUS_NAMES
+      reasons int32 bitmasks, decode with reason_text
+    """
+    n = len(columns[READING_KEYS[0]])
+    values = [np.asarray(columns[key], dtype=np.float64) for key in READING_KEYS]
+
+    if profile_ids is None:
+        return _score_columns(PROFILES[profile], values, n)
+
+    # One pass per profile present in the batch, not per row
+    profile_ids = np.asarray(profile_ids)
+    cwqi = np.zeros(n)
+    status = np.zeros(n, dtype=np.int8)
+    reasons = np.zeros(n, dtype=np.int32)
+    for pid in np.unique(profile_ids):
+        rows = np.flatnonzero(profile_ids == pid)
+        cwqi[rows], status[rows], reasons[rows] = _score_columns(
+            PROFILE_LIST[pid], [v[rows] for v in values], len(rows)
+        )
+    return cwqi, status, reasons
+
+
+def _score_columns(profile, values, n):
+    total = np.zeros(n)
+    weight_sum = np.zeros(n)
+    reasons = np.zeros(n, dtype=np.int32)
+    coliform_critical = np.zeros(n, dtype=bool)
+
+    for bit, param in enumerate(PARAMS):
+        valid = ~np.isnan(values[bit])
+        scores = profile.score_column(bit, values[bit])
+        weight = profile.weights[param]
+
+        total += np.where(valid, scores * weight, 0.0)
+        weight_sum += np.where(valid, weight, 0.0)
+        reasons |= np.where(valid & (scores < 50), 1 << bit, 0).astype(np.int32)
+
+        if param == "coliform":
+            coliform_critical = valid & (scores == 0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cwqi = np.where(weight_sum > 0, total / weight_sum, 0.0)
+
+    status = np.full(n, STATUS_RED, dtype=np.int8)
+    status[cwqi >= 50] = STATUS_AMBER
+    status[cwqi >= 80] = STATUS_GREEN
+
+    cwqi = _round2(cwqi)
+
+    # Hard safety override
+    cwqi[coliform_critical] = 0.0
+    status[coliform_critical] = STATUS_RED
+    reasons[coliform_critical] = REASON_COLIFORM_CRITICAL
+
+    return cwqi, status, reasons
+
+
+# -------- Result cache --------
+
+class CWQICache:
+    """
+    Bounded LRU cache in front of the CWQI scorers.
+
+    Readings are quantized to `decimals` places and the quantized reading is
+    what gets scored, so a key always maps to one result. Probe and simulator
+    values already arrive with at most two decimals, which makes repeat
+    readings common and the default quantization lossless for them.
+    """
+
+    def __init__(self, capacity=4096, decimals=2):
+        self.capacity = capacity
+        self.decimals = decimals
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, reading, profile_id=0):
+        d = self.decimals
+        return tuple(
+            None if v is None else round(float(v), d)
+            for v in (reading.get(k) for k in READING_KEYS)
+        ) + (profile_id,)
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def _put(self, key, entry):
+        self._entries[key] = entry
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def compute(self, reading, profile=DEFAULT_PROFILE):
+        """Cached compute_cwqi. Returns (cwqi, status, reason)."""
+        cwqi, status, reasons = self.compute_batch([reading], [profile_id(profile)])
+        return float(cwqi[0]), STATUS_NAMES[status[0]], reason_text(reasons[0])
+
+    def compute_batch(self, readings, profile_ids):
+        """
+        Cached scoring for a list of reading dicts, one profile id per row.
+        Only cache misses go through compute_cwqi_batch, so a tick with no
+        new values does no scoring at all.
+
+        Returns the same (cwqi, status, reasons) arrays as compute_cwqi_batch.
+        """
+        n = len(readings)
+        cwqi = np.zeros(n)
+        status = np.zeros(n, dtype=np.int8)
+        reasons = np.zeros(n, dtype=np.int32)
+
+        miss_keys = {}
+        for i, (reading, pid) in enumerate(zip(readings, profile_ids)):
+            key = self.key(reading, pid)
+            entry = self._get(key)
+            if entry is None:
+                miss_keys.setdefault(key, []).append(i)
+            else:
+                cwqi[i], status[i], reasons[i] = entry
+
+        if miss_keys:
+            keys = list(miss_keys)
+            columns = {
+                k: np.array([key[j] for key in keys], dtype=np.float64)
+                for j, k in enumerate(READING_KEYS)
+            }
+            ids = np.array([key[-1] for key in keys])
+            new_cwqi, new_status, new_reasons = compute_cwqi_batch(columns, profile_ids=ids)
+            for key, c, st, r in zip(keys, new_cwqi.tolist(), new_status.tolist(), new_reasons.tolist()):
+                self._put(key, (c, st, r))
+                for i in miss_keys[key]:
+                    cwqi[i], status[i], reasons[i] = c, st, r
+
+        return cwqi, status, reasons
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._entries),
+            "capacity": self.capacity,
+        }
+
+    def clear(self):
+        self._entries.clear()
+
+
 # -------- Local test --------
 
 if __name__ == "__main__":
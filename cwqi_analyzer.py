@@ -1,206 +1,461 @@
 import time
+import zlib
+import multiprocessing
 from datetime import datetime, timezone
-import mysql.connector
-from mysql.connector import Error
-
-from cwqi import compute_cwqi
-
+from storage import session, STORAGE_BACKEND, STORAGE_ERRORS
+from cwqi import (
+    compute_cwqi_batch, readings_to_columns, reason_text, STATUS_NAMES,
+    DEFAULT_PROFILE, load_profiles, profile_id, CWQICache
+)
 
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
-# -------- MySQL CONFIG --------
-DB_CONFIG = {
-    "host": os.getenv("DB_HOST", "127.0.0.1"),
-    "user": os.getenv("DB_USER", "root"),
-    "password": os.getenv("DB_PASSWORD", "5568"),
-    "database": os.getenv("DB_NAME", "jalrakshak")
-}
-
-
-
-# -------- DB CONNECTION --------
-def get_connection():
-    attempts = 0
-    while attempts < 3:
-        try:
-            return mysql.connector.connect(**DB_CONFIG)
-        except Error as e:
-            attempts += 1
-            print(f"[DB] Connection failed (Attempt {attempts}/3): {e}")
-            time.sleep(1)
-    raise Error("Failed to connect to database after 3 attempts")
-
-
-# -------- FETCH LATEST SENSOR READING PER NODE --------
-LATEST_READING_QUERY = """
-SELECT sr.node_id,
-       n.hierarchy_level,
-       sr.turbidity,
-       sr.ph,
-       sr.fluoride,
-       sr.coliform,
-       sr.conductivity,
-       sr.temperature,
-       sr.dissolved_oxygen,
-       sr.pressure
-FROM sensor_readings sr
-JOIN nodes n ON sr.node_id = n.node_id
-JOIN (
-    SELECT node_id, MAX(timestamp) AS latest_time
-    FROM sensor_readings
-    GROUP BY node_id
-) latest
-ON sr.node_id = latest.node_id
-AND sr.timestamp = latest.latest_time
-"""
-
-
-# -------- UPSERT NODE STATUS --------
-UPSERT_STATUS_QUERY = """
-INSERT INTO node_status (
-    node_id,
-    last_updated,
-    cwqi,
-    status,
-    reason,
-    anomaly_detected
-)
-VALUES (%s, %s, %s, %s, %s, %s)
-ON DUPLICATE KEY UPDATE
-    last_updated = VALUES(last_updated),
-    cwqi = VALUES(cwqi),
-    status = VALUES(status),
-    reason = VALUES(reason),
-    anomaly_detected = VALUES(anomaly_detected)
-"""
-
-
-# -------- ALERT QUERIES --------
-GET_ACTIVE_ALERT_QUERY = """
-SELECT alert_id, alert_level
-FROM alerts
-WHERE node_id = %s AND is_active = 1
-LIMIT 1
-"""
-
-INSERT_ALERT_QUERY = """
-INSERT INTO alerts (
-    node_id, hierarchy_level, alert_level, cwqi_value,
-    reason, detected_at, is_active
-) VALUES (%s, %s, %s, %s, %s, %s, 1)
-"""
-
-RESOLVE_ALERT_QUERY = """
-UPDATE alerts
-SET is_active = 0, resolved_at = %s
-WHERE alert_id = %s
-"""
-
-RESOLVE_ALL_ALERTS_QUERY = """
-UPDATE alerts
-SET is_active = 0, resolved_at = %s
-WHERE node_id = %s AND is_active = 1
-"""
+# Optional JSON file with extra scoring profiles and pump -> profile map
+PROFILE_CONFIG = os.getenv("CWQI_PROFILE_CONFIG")
+
+# Quantized result cache size; 0 disables the cache
+CACHE_SIZE = int(os.getenv("CWQI_CACHE_SIZE", "0"))
+
+# Incremental mode: only fetch readings above the last seen reading_id
+INCREMENTAL = os.getenv("ANALYZER_INCREMENTAL", "0") == "1"
+INCREMENTAL_FETCH_LIMIT = 50000
+# Ticks between full latest-reading resyncs in incremental mode
+FULL_RESYNC_TICKS = int(os.getenv("ANALYZER_RESYNC_TICKS", "720"))
+
+# Ticks between reloads of the in-memory active alert registry, to pick up
+# alerts opened or closed by other writers
+ALERT_RECONCILE_TICKS = int(os.getenv("ANALYZER_ALERT_RECONCILE_TICKS", "12"))
+
+# node_status rows are only rewritten when status, reason or the anomaly
+# flag change, or cwqi moves more than this from the stored value
+CWQI_TOLERANCE = float(os.getenv("ANALYZER_CWQI_TOLERANCE", "0.5"))
+
+
+# -------- SHARDING --------
+# Nodes are partitioned by L1 pump, so a whole pump -> zone -> colony
+# subtree (see build_hierarchy_map in the simulator) lands on one shard.
+# MySQL's CRC32() matches zlib.crc32, which keeps the assignment stable
+# across restarts and identical in SQL and Python (storage.SHARD_CLAUSE).
+def shard_of(pump, shard_count):
+    return zlib.crc32(pump.encode("utf-8")) % shard_count
+
+
+# -------- INCREMENTAL FETCH --------
+class LatestReadingTracker:
+    """
+    Keeps the newest reading per node in memory and advances a reading_id
+    watermark, so each tick reads only rows inserted since the last one
+    (a primary key range scan) and rescores only the nodes they touch.
+
+    reading_id order stands in for timestamp order, which holds for the
+    simulator and probes since they insert readings as they are taken.
+    """
+
+    def __init__(self, fetch_limit=INCREMENTAL_FETCH_LIMIT, shard=None):
+        self.fetch_limit = fetch_limit
+        self.shard = shard
+        self.watermark = None
+        self.latest = {}  # node_id -> reading row
+
+    def bootstrap(self, store):
+        """Full load via store.latest_readings(). Returns every node's row."""
+        watermark = store.max_reading_id()
+        self.latest = {row["node_id"]: row for row in store.latest_readings(self.shard)}
+        # Rows above the watermark may already be in self.latest; fetching
+        # them again next tick only rescores those nodes once more.
+        self.watermark = watermark
+        return list(self.latest.values())
+
+    def poll(self, store):
+        """Fetches rows above the watermark. Returns rows of changed nodes."""
+        changed = {}
+        while True:
+            rows = store.readings_since(self.watermark, self.fetch_limit, self.shard)
+            for row in rows:
+                changed[row["node_id"]] = row
+            if rows:
+                self.watermark = rows[-1]["reading_id"]
+            if len(rows) < self.fetch_limit:
+                break
+
+        self.latest.update(changed)
+        return list(changed.values())
+
+
+# -------- SCORING PROFILES --------
+def load_profile_assignments():
+    """
+    Returns (default_profile_id, {pump: profile_id}).
+    Resolved once at startup so per-node selection is a dict lookup.
+    """
+    default_name, pumps = DEFAULT_PROFILE, {}
+    if PROFILE_CONFIG:
+        default_name, pumps = load_profiles(PROFILE_CONFIG)
+        print(f"[ANALYZER] Loaded profiles from {PROFILE_CONFIG} ({len(pumps)} pump overrides)")
+    return profile_id(default_name), {pump: profile_id(name) for pump, name in pumps.items()}
+
+
+# -------- ACTIVE ALERT REGISTRY --------
+class ActiveAlertRegistry:
+    """
+    In-memory copy of the open alerts: node_id -> (alert_id, alert_level).
+
+    Loaded once, then kept in step with the analyzer's own resolves and
+    inserts, so per-node alert decisions need no SQL. reconcile() reloads
+    it from the table to catch changes made by other writers.
+    """
+
+    def __init__(self, shard=None):
+        self.shard = shard
+        self.alerts = {}
+        self.loaded = False
+
+    def reconcile(self, store):
+        """Reloads from the alerts table. Returns how many nodes differed."""
+        fresh = store.active_alerts(self.shard)
+        drift = sum(1 for node_id in fresh.keys() | self.alerts.keys()
+                    if fresh.get(node_id) != self.alerts.get(node_id))
+        self.alerts = fresh
+        self.loaded = True
+        return drift
+
+    def apply(self, store, resolve_node_ids, alert_rows):
+        """Mirrors a committed tick's resolves and inserts."""
+        for node_id in resolve_node_ids:
+            self.alerts.pop(node_id, None)
+        if not alert_rows:
+            return
+        # Multi-row INSERT ids are not guaranteed consecutive, so read back
+        # the new alert ids in one set-based query
+        self.alerts.update(store.alerts_for([row[0] for row in alert_rows]))
+
+
+# -------- STATUS CHANGE DETECTION --------
+class StatusWriteFilter:
+    """
+    In-memory copy of what node_status holds for this analyzer's nodes:
+    node_id -> (cwqi, status, reason, anomaly). Drops status rows that
+    would rewrite the same values, and turns status changes into
+    node_status_transitions rows. Reloaded with the alert registry so
+    external writes are picked up.
+
+    node_status.last_updated is therefore the time of the last change,
+    not of the last tick.
+    """
+
+    def __init__(self, tolerance=CWQI_TOLERANCE, shard=None):
+        self.tolerance = tolerance
+        self.shard = shard
+        self.written = {}
+
+    def reload(self, store):
+        self.written = store.current_statuses(self.shard)
+
+    def changes(self, status_rows):
+        """Returns (rows to write, transition rows)."""
+        changed = []
+        transitions = []
+        for row in status_rows:
+            node_id, now, cwqi, status, reason, anomaly = row
+            previous = self.written.get(node_id)
+            if previous is not None:
+                old_cwqi, old_status, old_reason, old_anomaly = previous
+                if (status == old_status and reason == old_reason and anomaly == old_anomaly
+                        and abs(cwqi - old_cwqi) <= self.tolerance):
+                    continue
+            changed.append(row)
+            if previous is None or previous[1] != status:
+                transitions.append((node_id, now, previous and previous[1], status, cwqi))
+        return changed, transitions
+
+    def apply(self, status_rows):
+        """Mirrors a committed tick's status writes."""
+        for node_id, _, cwqi, status, reason, anomaly in status_rows:
+            self.written[node_id] = (cwqi, status, reason, anomaly)
+
+
+# -------- ALERT LOGIC --------
+def decide_alerts(readings, cwqi_values, status_codes, reason_masks, active_alerts, now):
+    """
+    Works out the writes for one tick without touching the database.
+
+    active_alerts: node_id -> (alert_id, alert_level) for open alerts.
+    Returns (status_rows, resolve_node_ids, alert_rows).
+    """
+    status_rows = []
+    resolve_node_ids = []
+    alert_rows = []
+
+    for row, cwqi, status_code, reason_mask in zip(
+        readings, cwqi_values, status_codes, reason_masks
+    ):
+        node_id = row["node_id"]
+        hierarchy_level = row["hierarchy_level"]
+
+        status = STATUS_NAMES[status_code]
+        reason = reason_text(reason_mask)
+        anomaly = status in ("AMBER", "RED")
+
+        status_rows.append((node_id, now, cwqi, status, reason, anomaly))
+
+        active_alert = active_alerts.get(node_id)
+
+        if status == "GREEN":
+            # Condition is normal, resolve any active alerts
+            if active_alert:
+                print(f"[ALERT] Resolving alert for {node_id}")
+                resolve_node_ids.append(node_id)
+
+        elif not active_alert:
+            # Abnormal condition and no active alert, create new one
+            print(f"[ALERT] Raising {status} alert for {node_id}")
+            alert_rows.append((node_id, hierarchy_level, status, cwqi, reason, now))
+
+        elif active_alert[1] != status:
+            # Severity changed (e.g. AMBER -> RED or RED -> AMBER)
+            # Resolve old, create new
+            print(f"[ALERT] Updating alert level {active_alert[1]} -> {status} for {node_id}")
+            resolve_node_ids.append(node_id)
+            alert_rows.append((node_id, hierarchy_level, status, cwqi, reason, now))
+        # else: same severity, do nothing
+
+    return status_rows, resolve_node_ids, alert_rows
+
+
+def _ms(start, end):
+    return round((end - start) * 1000, 1)
+
+
+# -------- ANALYZER STATE --------
+class CWQIAnalyzer:
+    """
+    Everything the analyzer carries between ticks: profile assignments,
+    the optional result cache, the incremental watermark, the active
+    alert registry and the stored node statuses. With a shard
+    (index, count) it only sees the nodes whose pump hashes to that shard.
+    """
+
+    def __init__(self, cache_size=CACHE_SIZE, incremental=INCREMENTAL, shard=None):
+        self.shard = shard
+        self.default_profile_id, self.pump_profile_ids = load_profile_assignments()
+        self.cache = CWQICache(capacity=cache_size) if cache_size > 0 else None
+        self.tracker = LatestReadingTracker(shard=shard) if incremental else None
+        self.registry = ActiveAlertRegistry(shard=shard)
+        self.statuses = StatusWriteFilter(shard=shard)
+        self.tick = 0
+
+    def fetch_readings(self, store):
+        if self.tracker:
+            # Periodic full resync picks up rows committed out of id order
+            if self.tracker.watermark is None or self.tick % FULL_RESYNC_TICKS == 0:
+                return self.tracker.bootstrap(store)
+            return self.tracker.poll(store)
+        return store.latest_readings(self.shard)
+
+    def score(self, readings):
+        """Scores the whole tick in one vectorized pass."""
+        profile_ids = [
+            self.pump_profile_ids.get(row["pump"], self.default_profile_id) for row in readings
+        ]
+        if self.cache:
+            return self.cache.compute_batch(readings, profile_ids)
+        return compute_cwqi_batch(readings_to_columns(readings), profile_ids=profile_ids)
+
+    def run_tick(self, store, readings=None, now=None):
+        """
+        Fetch, score, decide alerts and write one tick through a Storage
+        (see storage.py). Returns a report dict. readings/now may be
+        supplied instead (replay); the fetch is skipped.
+        """
+        t_start = time.perf_counter()
+
+        if readings is None:
+            readings = self.fetch_readings(store)
+        now = now or datetime.now(timezone.utc)
+        t_fetch = time.perf_counter()
+
+        cwqi_values, status_codes, reason_masks = self.score(readings)
+        t_score = time.perf_counter()
+
+        registry = self.registry
+        if not registry.loaded:
+            registry.reconcile(store)
+            self.statuses.reload(store)
+            print(f"[ANALYZER] Loaded {len(registry.alerts)} active alerts")
+        elif self.tick % ALERT_RECONCILE_TICKS == 0:
+            drift = registry.reconcile(store)
+            self.statuses.reload(store)
+            if drift:
+                print(f"[ANALYZER] Alert registry reconciled, {drift} nodes changed externally")
+
+        status_rows, resolve_node_ids, alert_rows = decide_alerts(
+            readings, cwqi_values.tolist(), status_codes.tolist(), reason_masks.tolist(),
+            registry.alerts, now
+        )
+        status_rows, transition_rows = self.statuses.changes(status_rows)
+        t_decide = time.perf_counter()
+
+        # One transaction per tick: resolves before inserts so a
+        # severity change never leaves two active alerts for a node
+        statuses_written = store.upsert_statuses(status_rows)
+        transitions = store.insert_transitions(transition_rows)
+        alerts_resolved = store.resolve_alerts(resolve_node_ids, now)
+        alerts_raised = store.insert_alerts(alert_rows)
+        store.commit()
+        registry.apply(store, resolve_node_ids, alert_rows)
+        self.statuses.apply(status_rows)
+        t_write = time.perf_counter()
+
+        self.tick += 1
+
+        return {
+            "time": now,
+            "nodes": len(readings),
+            "status_rows": statuses_written,
+            "transitions": transitions,
+            "raised": alerts_raised,
+            "resolved": alerts_resolved,
+            "fetch_ms": _ms(t_start, t_fetch),
+            "score_ms": _ms(t_fetch, t_score),
+            "alerts_ms": _ms(t_score, t_decide),
+            "write_ms": _ms(t_decide, t_write),
+            "total_ms": _ms(t_start, t_write),
+        }
+
+
+REPORT_COUNTS = ("nodes", "status_rows", "transitions", "raised", "resolved")
+REPORT_TIMINGS = ("fetch_ms", "score_ms", "alerts_ms", "write_ms", "total_ms")
+
+
+def merge_reports(reports):
+    """
+    Combines per-shard tick reports: counts add up, timings take the
+    slowest shard since shards run in parallel.
+    """
+    merged = {"time": max(r["time"] for r in reports), "shards": len(reports)}
+    for key in REPORT_COUNTS:
+        merged[key] = sum(r[key] for r in reports)
+    for key in REPORT_TIMINGS:
+        merged[key] = max(r[key] for r in reports)
+    return merged
+
+
+def print_report(report):
+    shards = f" | shards={report['shards']}" if "shards" in report else ""
+    print(f"[ANALYZER] Update complete @ {report['time'].strftime('%H:%M:%S')} | "
+          f"nodes={report['nodes']} status={report['status_rows']} "
+          f"transitions={report['transitions']} "
+          f"raised={report['raised']} resolved={report['resolved']} | "
+          f"fetch={report['fetch_ms']}ms score={report['score_ms']}ms "
+          f"alerts={report['alerts_ms']}ms write={report['write_ms']}ms{shards}")
 
 
 # -------- CONTINUOUS ANALYZER LOOP --------
-def run_cwqi_analyzer(interval_seconds=5):
+def run_cwqi_analyzer(interval_seconds=5, cache_size=CACHE_SIZE, incremental=INCREMENTAL):
     print("[ANALYZER] CWQI analyzer started")
+    analyzer = CWQIAnalyzer(cache_size=cache_size, incremental=incremental)
 
     try:
         while True:
-            conn = get_connection()
-            cursor = conn.cursor(dictionary=True)
-
-            cursor.execute(LATEST_READING_QUERY)
-            readings = cursor.fetchall()
-
-            print(f"[ANALYZER] Processing {len(readings)} nodes")
-
-            now = datetime.now(timezone.utc)
-
-            for row in readings:
-                node_id = row["node_id"]
-                hierarchy_level = row["hierarchy_level"]
-
-                reading = {
-                    "turbidity": row["turbidity"],
-                    "ph": row["ph"],
-                    "fluoride": row["fluoride"],
-                    "coliform": row["coliform"],
-                    "conductivity": row["conductivity"],
-                    "temperature": row["temperature"],
-                    "dissolved_oxygen": row["dissolved_oxygen"],
-                    "pressure": row["pressure"]
-                }
-
-                cwqi, status, reason = compute_cwqi(reading)
-                anomaly = status in ("AMBER", "RED")
-
-                cursor.execute(
-                    UPSERT_STATUS_QUERY,
-                    (
-                        node_id,
-                        now,
-                        cwqi,
-                        status,
-                        reason,
-                        anomaly
-                    )
-                )
-
-                # -------- ALERT LOGIC --------
-                # Check for existing active alerts
-                cursor.execute(GET_ACTIVE_ALERT_QUERY, (node_id,))
-                active_alert = cursor.fetchone()
-
-                if status == "GREEN":
-                    # Condition is normal, resolve any active alerts
-                    if active_alert:
-                        print(f"[ALERT] Resolving alert for {node_id}")
-                        cursor.execute(RESOLVE_ALL_ALERTS_QUERY, (now, node_id))
-                
-                elif status in ("AMBER", "RED"):
-                    # Abnormal condition
-                    if not active_alert:
-                        # No active alert, create new one
-                        print(f"[ALERT] Raising {status} alert for {node_id}")
-                        cursor.execute(INSERT_ALERT_QUERY, (
-                            node_id, hierarchy_level, status, cwqi, reason, now
-                        ))
-                    else:
-                        # Active alert exists. Check if severity changed.
-                        current_alert_level = active_alert['alert_level']
-                        if current_alert_level != status:
-                            # Severity changed (e.g. AMBER -> RED or RED -> AMBER)
-                            # Resolve old, create new
-                            print(f"[ALERT] Updating alert level {current_alert_level} -> {status} for {node_id}")
-                            cursor.execute(RESOLVE_ALERT_QUERY, (now, active_alert['alert_id']))
-                            cursor.execute(INSERT_ALERT_QUERY, (
-                                node_id, hierarchy_level, status, cwqi, reason, now
-                            ))
-                        # else: same severity, do nothing
-
-
-                conn.commit()
-            
-            cursor.close()
-            conn.close()
-
-            print(f"[ANALYZER] Update complete @ {now.strftime('%H:%M:%S')}")
+            with session() as store:
+                report = analyzer.run_tick(store)
+
+            print_report(report)
+            if STORAGE_BACKEND == "mysql" and analyzer.tick % ALERT_RECONCILE_TICKS == 0:
+                from db import get_pool
+                stats = get_pool().stats()
+                print(f"[ANALYZER] DB pool in_use={stats['in_use']} idle={stats['idle']} "
+                      f"waits={stats['waits']} wait={stats['wait_time_ms']}ms "
+                      f"reconnects={stats['reconnects']}")
+            if analyzer.cache:
+                stats = analyzer.cache.stats()
+                print(f"[ANALYZER] Cache hits={stats['hits']} misses={stats['misses']} "
+                      f"evictions={stats['evictions']} size={stats['size']}/{stats['capacity']}")
 
             time.sleep(interval_seconds)
 
     except KeyboardInterrupt:
         print("\n[ANALYZER] Stopped by user")
 
-    except Error as e:
+    except STORAGE_ERRORS as e:
         print("[ERROR]", e)
 
 
+# -------- SHARDED ANALYZER --------
+def _shard_worker(shard, pipe, cache_size, incremental):
+    """
+    Runs in its own process and owns one shard for its whole life, so the
+    shard's alert registry, cache and watermark never move between workers.
+    Each "tick" message from the coordinator runs one tick on a pooled
+    connection private to this process.
+    """
+    analyzer = CWQIAnalyzer(cache_size=cache_size, incremental=incremental, shard=shard)
+    try:
+        while pipe.recv() == "tick":
+            try:
+                with session() as store:
+                    pipe.send(analyzer.run_tick(store))
+            except STORAGE_ERRORS as e:
+                pipe.send({"error": str(e)})
+    except (EOFError, KeyboardInterrupt):
+        pass
+
+
+def run_sharded_analyzer(shard_count, interval_seconds=5, cache_size=CACHE_SIZE,
+                         incremental=INCREMENTAL):
+    """
+    Splits the network into shard_count pump shards, one worker process
+    each, and runs their ticks in parallel on the usual cadence.
+    """
+    print(f"[ANALYZER] Sharded CWQI analyzer started with {shard_count} workers")
+
+    workers = []
+    for index in range(shard_count):
+        parent_end, child_end = multiprocessing.Pipe()
+        proc = multiprocessing.Process(
+            target=_shard_worker,
+            args=((index, shard_count), child_end, cache_size, incremental),
+            daemon=True
+        )
+        proc.start()
+        workers.append((proc, parent_end))
+
+    try:
+        while True:
+            started = time.monotonic()
+            for _, pipe in workers:
+                pipe.send("tick")
+            reports = [pipe.recv() for _, pipe in workers]
+
+            errors = [r["error"] for r in reports if "error" in r]
+            for error in errors:
+                print("[ERROR]", error)
+            reports = [r for r in reports if "error" not in r]
+            if reports:
+                print_report(merge_reports(reports))
+
+            # Keep the cadence: sleep only for what is left of the interval
+            time.sleep(max(0.0, interval_seconds - (time.monotonic() - started)))
+
+    except KeyboardInterrupt:
+        print("\n[ANALYZER] Stopped by user")
+
+    finally:
+        for proc, pipe in workers:
+            try:
+                pipe.send("stop")
+            except (BrokenPipeError, OSError):
+                pass
+            proc.join(timeout=2)
+
+
 # -------- RUN --------
 if __name__ == "__main__":
-    run_cwqi_analyzer(interval_seconds=5)
+    shards = int(os.getenv("ANALYZER_SHARDS", "1"))
+    if shards > 1:
+        run_sharded_analyzer(shards, interval_seconds=5)
+    else:
+        run_cwqi_analyzer(interval_seconds=5)
@@ -1,55 +1,36 @@
 import eventlet
 eventlet.monkey_patch()
 
-from flask import Flask, render_template, jsonify
+from flask import Flask, render_template, jsonify, request
 from flask_socketio import SocketIO, emit
-import mysql.connector
-from mysql.connector import Error
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
 import time
 
 import os
+import sys
 from dotenv import load_dotenv
 
 # Load env vars
 load_dotenv()
 
+# Shared modules live in the repo root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage import session, STORAGE_BACKEND, STORAGE_ERRORS
+from cwqi_analyzer import load_profile_assignments
+from timetravel import state_at
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('FLASK_SECRET_KEY', 'default_secret_key')
 socketio = SocketIO(app, async_mode='eventlet')
 
-# MySQL CONFIG
-DB_CONFIG = {
-    "host": os.getenv("DB_HOST", "127.0.0.1"),
-    "user": os.getenv("DB_USER", "root"),
-    "password": os.getenv("DB_PASSWORD", "5568"),
-    "database": os.getenv("DB_NAME", "jalrakshak")
-}
-
-def get_connection():
-    attempts = 0
-    while attempts < 3:
-        try:
-            return mysql.connector.connect(**DB_CONFIG)
-        except Error as e:
-            attempts += 1
-            print(f"[DB] Connection failed (Attempt {attempts}/3): {e}")
-            time.sleep(1)
-    raise Error("Failed to connect to database after 3 attempts")
+# Pump -> scoring profile, for CWQI of raw history points
+PROFILES = load_profile_assignments()
 
 def fetch_nodes():
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        query = """
-        SELECT n.node_id, n.hierarchy_level, n.pump, n.zone, n.colony, n.latitude, n.longitude,
-               ns.cwqi, ns.status, ns.reason, ns.last_updated
-        FROM nodes n
-        LEFT JOIN node_status ns ON n.node_id = ns.node_id
-        """
-        cursor.execute(query)
-        nodes = cursor.fetchall()
+        with session() as store:
+            nodes = store.node_statuses()
         
         # Convert datetime objects to string and decimals to float
         for node in nodes:
@@ -59,39 +40,16 @@ def fetch_nodes():
             if node['longitude']: node['longitude'] = float(node['longitude'])
             if node['cwqi']: node['cwqi'] = float(node['cwqi'])
                 
-        cursor.close()
-        conn.close()
         return nodes
-    except Error as e:
+    except STORAGE_ERRORS as e:
         print(f"Error fetching nodes: {e}")
         return []
 
 def fetch_alerts():
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        query_active = """
-        SELECT alert_id, node_id, hierarchy_level, alert_level, cwqi_value, reason, detected_at, is_active
-        FROM alerts
-        WHERE is_active = 1
-        ORDER BY detected_at DESC
-        """
-        cursor.execute(query_active)
-        active_alerts = cursor.fetchall()
-        
-        query_resolved = """
-        SELECT alert_id, node_id, hierarchy_level, alert_level, cwqi_value, reason, detected_at, resolved_at, is_active
-        FROM alerts
-        WHERE is_active = 0
-        ORDER BY resolved_at DESC
-        LIMIT 10
-        """
-        cursor.execute(query_resolved)
-        resolved_alerts = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
+        with session() as store:
+            alerts = store.alerts(resolved_limit=10)
+        active_alerts, resolved_alerts = alerts["active"], alerts["resolved"]
         
         # Convert datetime objects and decimals
         for a in active_alerts:
@@ -104,10 +62,68 @@ def fetch_alerts():
             if a['cwqi_value']: a['cwqi_value'] = float(a['cwqi_value'])
             
         return {"active": active_alerts, "resolved": resolved_alerts}
-    except Error as e:
+    except STORAGE_ERRORS as e:
         print(f"Error fetching alerts: {e}")
         return {"active": [], "resolved": []}
 
+def fetch_latest_readings():
+    try:
+        with session() as store:
+            readings = store.latest_sensor_rows()
+
+        for r in readings:
+            if r['timestamp']: r['timestamp'] = r['timestamp'].isoformat()
+
+        return readings
+    except STORAGE_ERRORS as e:
+        print(f"Error fetching latest readings: {e}")
+        return []
+
+def fetch_transitions(after, limit):
+    try:
+        with session() as store:
+            transitions = store.transitions_since(after, limit)
+
+        for t in transitions:
+            if t['changed_at']: t['changed_at'] = t['changed_at'].isoformat()
+            if t['cwqi'] is not None: t['cwqi'] = float(t['cwqi'])
+
+        return transitions
+    except STORAGE_ERRORS as e:
+        print(f"Error fetching transitions: {e}")
+        return []
+
+def parse_time(value):
+    """ISO time from a query string, as naive local time like the readings."""
+    parsed = datetime.fromisoformat(value)
+    return parsed.astimezone().replace(tzinfo=None) if parsed.tzinfo else parsed
+
+def fetch_state(at):
+    try:
+        with session() as store:
+            return state_at(store, at)
+    except STORAGE_ERRORS as e:
+        print(f"Error fetching state: {e}")
+        return {"at": at.isoformat(), "snapshot_at": None, "replayed": 0, "nodes": {}}
+
+def fetch_history(node_id, start, end, max_points):
+    # MySQL-only, see get_history
+    from db import connection
+    from rollups import history
+    try:
+        with connection() as conn:
+            resolution, points = history(conn, node_id, start, end, max_points, PROFILES)
+
+        for p in points:
+            p['bucket'] = p['bucket'].isoformat()
+            for key, value in p.items():
+                if value is not None and key != 'bucket': p[key] = float(value)
+
+        return {"node_id": node_id, "resolution": resolution, "points": points}
+    except STORAGE_ERRORS as e:
+        print(f"Error fetching history: {e}")
+        return {"node_id": node_id, "resolution": None, "points": []}
+
 def background_thread():
     """Background thread to push updates."""
     print("Background thread started")
@@ -136,6 +152,50 @@ def get_nodes():
 def get_alerts():
     return jsonify(fetch_alerts())
 
+@app.route("/api/readings/latest")
+def get_latest_readings():
+    return jsonify(fetch_latest_readings())
+
+# Status changes after transition_id ?after= (default 0), oldest first
+@app.route("/api/transitions")
+def get_transitions():
+    after = request.args.get('after', 0, type=int)
+    limit = min(request.args.get('limit', 1000, type=int), 10000)
+    return jsonify(fetch_transitions(after, limit))
+
+# Network status as it was at ?at= (ISO time)
+@app.route("/api/state")
+def get_state():
+    if 'at' not in request.args:
+        return jsonify({"error": "at is required"}), 400
+    try:
+        at = parse_time(request.args['at'])
+    except ValueError:
+        return jsonify({"error": "at must be an ISO time"}), 400
+    return jsonify(fetch_state(at))
+
+# ?start=&end= as ISO times (default: the last 24 hours), ?points= budget
+@app.route("/api/history/<node_id>")
+def get_history(node_id):
+    # The rollup tables only exist on MySQL
+    if STORAGE_BACKEND != "mysql":
+        return jsonify({"error": "history needs the mysql backend"}), 501
+    try:
+        end = parse_time(request.args['end']) if 'end' in request.args else datetime.now()
+        start = parse_time(request.args['start']) if 'start' in request.args else end - timedelta(days=1)
+    except ValueError:
+        return jsonify({"error": "start and end must be ISO times"}), 400
+    from rollups import HISTORY_MAX_POINTS
+    max_points = request.args.get('points', HISTORY_MAX_POINTS, type=int)
+    return jsonify(fetch_history(node_id, start, end, max_points))
+
+@app.route("/api/db_pool")
+def get_db_pool():
+    if STORAGE_BACKEND != "mysql":
+        return jsonify({"backend": STORAGE_BACKEND})
+    from db import get_pool
+    return jsonify(get_pool().stats())
+
 @socketio.on('connect')
 def handle_connect():
     print('Client connected')
@@ -0,0 +1,205 @@
+import os
+import sys
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import Error
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# -------- MySQL CONFIG --------
+DB_CONFIG = {
+    "host": os.getenv("DB_HOST", "127.0.0.1"),
+    "user": os.getenv("DB_USER", "root"),
+    "password": os.getenv("DB_PASSWORD", "5568"),
+    "database": os.getenv("DB_NAME", "jalrakshak")
+}
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+CONNECT_ATTEMPTS = int(os.getenv("DB_CONNECT_ATTEMPTS", "5"))
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+CHECKOUT_TIMEOUT_SECONDS = 30.0
+# Idle connections older than this are pinged before being handed out
+HEALTH_CHECK_IDLE_SECONDS = 30.0
+
+
+def _green():
+    """True when eventlet has monkey patched sockets (the dashboard)."""
+    eventlet = sys.modules.get("eventlet")
+    return eventlet is not None and eventlet.patcher.is_monkey_patched("socket")
+
+
+# -------- CONNECT WITH BACKOFF --------
+def get_connection(config=None, attempts=None):
+    """
+    Opens a new connection, retrying with exponential backoff.
+    Prefer connection() for anything that runs in a loop.
+    """
+    config = dict(config or DB_CONFIG)
+    attempts = attempts or CONNECT_ATTEMPTS
+    if _green():
+        # The C extension blocks the whole hub; pure Python yields on I/O
+        config.setdefault("use_pure", True)
+
+    delay = BACKOFF_BASE_SECONDS
+    for attempt in range(1, attempts + 1):
+        try:
+            return mysql.connector.connect(**config)
+        except Error as e:
+            print(f"[DB] Connection failed (Attempt {attempt}/{attempts}): {e}")
+            if attempt == attempts:
+                break
+            time.sleep(delay)
+            delay = min(delay * 2, BACKOFF_MAX_SECONDS)
+    raise Error(f"Failed to connect to database after {attempts} attempts")
+
+
+# -------- CONNECTION POOL --------
+class ConnectionPool:
+    """
+    Bounded pool of long-lived MySQL connections.
+
+    At most `size` connections exist; callers block (cooperatively under
+    eventlet, since threading is monkey patched there) until one is free.
+    Connections idle for a while are pinged on checkout and replaced if the
+    server dropped them.
+    """
+
+    def __init__(self, size=POOL_SIZE, config=None):
+        self.size = size
+        self.config = config or DB_CONFIG
+        self._idle = deque()  # (conn, released_at)
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+        self.created = 0
+        self.reconnects = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+
+    def acquire(self, timeout=CHECKOUT_TIMEOUT_SECONDS):
+        start = time.monotonic()
+        waited = False
+        with self._cond:
+            while not self._idle and self._in_use >= self.size:
+                waited = True
+                remaining = timeout - (time.monotonic() - start)
+                if remaining <= 0:
+                    raise Error(f"Timed out waiting for a pooled connection ({self.size} in use)")
+                self._cond.wait(remaining)
+            entry = self._idle.pop() if self._idle else None
+            self._in_use += 1
+
+        if waited:
+            elapsed = time.monotonic() - start
+            self.waits += 1
+            self.wait_time += elapsed
+            self.max_wait = max(self.max_wait, elapsed)
+
+        try:
+            if entry is None:
+                conn = get_connection(self.config)
+                self.created += 1
+                return conn
+            conn, released_at = entry
+            if time.monotonic() - released_at > HEALTH_CHECK_IDLE_SECONDS and not self._healthy(conn):
+                self._close(conn)
+                conn = get_connection(self.config)
+                self.reconnects += 1
+            return conn
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, broken=False):
+        if not broken:
+            try:
+                # Never hand out a connection with an open transaction
+                conn.rollback()
+            except Error:
+                broken = True
+        if broken:
+            self._close(conn)
+        with self._cond:
+            self._in_use -= 1
+            if not broken:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @staticmethod
+    def _healthy(conn):
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Error:
+            return False
+
+    @staticmethod
+    def _close(conn):
+        try:
+            conn.close()
+        except Error:
+            pass
+
+    def close_all(self):
+        with self._cond:
+            while self._idle:
+                self._close(self._idle.pop()[0])
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "in_use": self._in_use,
+            "idle": len(self._idle),
+            "created": self.created,
+            "reconnects": self.reconnects,
+            "waits": self.waits,
+            "wait_time_ms": round(self.wait_time * 1000, 1),
+            "max_wait_ms": round(self.max_wait * 1000, 1),
+        }
+
+
+_pool = None
+_pool_pid = None
+
+
+def get_pool():
+    """Process-wide pool; a forked worker gets its own."""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = ConnectionPool()
+        _pool_pid = os.getpid()
+    return _pool
+
+
+@contextmanager
+def connection():
+    """
+    Checks a connection out of the shared pool:
+
+        with connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            ...
+            conn.commit()
+
+    Anything not committed is rolled back on return. A connection that
+    raised a database error is discarded instead of reused.
+    """
+    pool = get_pool()
+    conn = pool.acquire()
+    broken = False
+    try:
+        yield conn
+    except Error:
+        broken = not conn.is_connected()
+        raise
+    finally:
+        pool.release(conn, broken=broken)
@@ -0,0 +1,18 @@
+-- Newest reading per node, maintained by every ingestion path in the same
+-- transaction as the sensor_readings insert (see sensor_latest.py).
+
+CREATE TABLE IF NOT EXISTS `sensor_latest` (
+  `node_id` varchar(255) NOT NULL,
+  `timestamp` datetime NOT NULL,
+  `turbidity` float DEFAULT NULL,
+  `ph` float DEFAULT NULL,
+  `fluoride` float DEFAULT NULL,
+  `coliform` int(11) DEFAULT NULL,
+  `conductivity` float DEFAULT NULL,
+  `temperature` float DEFAULT NULL,
+  `dissolved_oxygen` float DEFAULT NULL,
+  `pressure` float DEFAULT NULL,
+  `flow_rate` float DEFAULT NULL,
+  PRIMARY KEY (`node_id`),
+  CONSTRAINT `sensor_latest_ibfk_1` FOREIGN KEY (`node_id`) REFERENCES `nodes` (`node_id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
@@ -0,0 +1,110 @@
+-- Per-node downsampled history, maintained incrementally by rollups.py
+-- from sensor_readings rows above the watermark in rollup_state.
+-- Each parameter keeps min, max, sum and the count of non-NULL values;
+-- mean = sum / n. samples counts every reading in the bucket.
+
+-- 1-minute buckets
+CREATE TABLE IF NOT EXISTS `sensor_rollup_1m` (
+  `node_id` varchar(255) NOT NULL,
+  `bucket` datetime NOT NULL,
+  `samples` int(11) NOT NULL DEFAULT '0',
+  `turbidity_min` float DEFAULT NULL,
+  `turbidity_max` float DEFAULT NULL,
+  `turbidity_sum` double NOT NULL DEFAULT '0',
+  `turbidity_n` int(11) NOT NULL DEFAULT '0',
+  `ph_min` float DEFAULT NULL,
+  `ph_max` float DEFAULT NULL,
+  `ph_sum` double NOT NULL DEFAULT '0',
+  `ph_n` int(11) NOT NULL DEFAULT '0',
+  `fluoride_min` float DEFAULT NULL,
+  `fluoride_max` float DEFAULT NULL,
+  `fluoride_sum` double NOT NULL DEFAULT '0',
+  `fluoride_n` int(11) NOT NULL DEFAULT '0',
+  `coliform_min` float DEFAULT NULL,
+  `coliform_max` float DEFAULT NULL,
+  `coliform_sum` double NOT NULL DEFAULT '0',
+  `coliform_n` int(11) NOT NULL DEFAULT '0',
+  `conductivity_min` float DEFAULT NULL,
+  `conductivity_max` float DEFAULT NULL,
+  `conductivity_sum` double NOT NULL DEFAULT '0',
+  `conductivity_n` int(11) NOT NULL DEFAULT '0',
+  `temperature_min` float DEFAULT NULL,
+  `temperature_max` float DEFAULT NULL,
+  `temperature_sum` double NOT NULL DEFAULT '0',
+  `temperature_n` int(11) NOT NULL DEFAULT '0',
+  `dissolved_oxygen_min` float DEFAULT NULL,
+  `dissolved_oxygen_max` float DEFAULT NULL,
+  `dissolved_oxygen_sum` double NOT NULL DEFAULT '0',
+  `dissolved_oxygen_n` int(11) NOT NULL DEFAULT '0',
+  `pressure_min` float DEFAULT NULL,
+  `pressure_max` float DEFAULT NULL,
+  `pressure_sum` double NOT NULL DEFAULT '0',
+  `pressure_n` int(11) NOT NULL DEFAULT '0',
+  `flow_rate_min` float DEFAULT NULL,
+  `flow_rate_max` float DEFAULT NULL,
+  `flow_rate_sum` double NOT NULL DEFAULT '0',
+  `flow_rate_n` int(11) NOT NULL DEFAULT '0',
+  `cwqi_min` float DEFAULT NULL,
+  `cwqi_max` float DEFAULT NULL,
+  `cwqi_sum` double NOT NULL DEFAULT '0',
+  `cwqi_n` int(11) NOT NULL DEFAULT '0',
+  PRIMARY KEY (`node_id`,`bucket`),
+  KEY `idx_bucket` (`bucket`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- 1-hour buckets
+CREATE TABLE IF NOT EXISTS `sensor_rollup_1h` (
+  `node_id` varchar(255) NOT NULL,
+  `bucket` datetime NOT NULL,
+  `samples` int(11) NOT NULL DEFAULT '0',
+  `turbidity_min` float DEFAULT NULL,
+  `turbidity_max` float DEFAULT NULL,
+  `turbidity_sum` double NOT NULL DEFAULT '0',
+  `turbidity_n` int(11) NOT NULL DEFAULT '0',
+  `ph_min` float DEFAULT NULL,
+  `ph_max` float DEFAULT NULL,
+  `ph_sum` double NOT NULL DEFAULT '0',
+  `ph_n` int(11) NOT NULL DEFAULT '0',
+  `fluoride_min` float DEFAULT NULL,
+  `fluoride_max` float DEFAULT NULL,
+  `fluoride_sum` double NOT NULL DEFAULT '0',
+  `fluoride_n` int(11) NOT NULL DEFAULT '0',
+  `coliform_min` float DEFAULT NULL,
+  `coliform_max` float DEFAULT NULL,
+  `coliform_sum` double NOT NULL DEFAULT '0',
+  `coliform_n` int(11) NOT NULL DEFAULT '0',
+  `conductivity_min` float DEFAULT NULL,
+  `conductivity_max` float DEFAULT NULL,
+  `conductivity_sum` double NOT NULL DEFAULT '0',
+  `conductivity_n` int(11) NOT NULL DEFAULT '0',
+  `temperature_min` float DEFAULT NULL,
+  `temperature_max` float DEFAULT NULL,
+  `temperature_sum` double NOT NULL DEFAULT '0',
+  `temperature_n` int(11) NOT NULL DEFAULT '0',
+  `dissolved_oxygen_min` float DEFAULT NULL,
+  `dissolved_oxygen_max` float DEFAULT NULL,
+  `dissolved_oxygen_sum` double NOT NULL DEFAULT '0',
+  `dissolved_oxygen_n` int(11) NOT NULL DEFAULT '0',
+  `pressure_min` float DEFAULT NULL,
+  `pressure_max` float DEFAULT NULL,
+  `pressure_sum` double NOT NULL DEFAULT '0',
+  `pressure_n` int(11) NOT NULL DEFAULT '0',
+  `flow_rate_min` float DEFAULT NULL,
+  `flow_rate_max` float DEFAULT NULL,
+  `flow_rate_sum` double NOT NULL DEFAULT '0',
+  `flow_rate_n` int(11) NOT NULL DEFAULT '0',
+  `cwqi_min` float DEFAULT NULL,
+  `cwqi_max` float DEFAULT NULL,
+  `cwqi_sum` double NOT NULL DEFAULT '0',
+  `cwqi_n` int(11) NOT NULL DEFAULT '0',
+  PRIMARY KEY (`node_id`,`bucket`),
+  KEY `idx_bucket` (`bucket`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- Highest sensor_readings.reading_id already folded into the rollups
+CREATE TABLE IF NOT EXISTS `rollup_state` (
+  `name` varchar(64) NOT NULL,
+  `last_reading_id` bigint(20) NOT NULL DEFAULT '0',
+  `updated_at` datetime DEFAULT NULL,
+  PRIMARY KEY (`name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
@@ -0,0 +1,14 @@
+-- One row per node status change (GREEN/AMBER/RED), appended by the
+-- analyzer in the same transaction as the node_status write. Consumers
+-- follow it by transition_id instead of polling node_status.
+CREATE TABLE IF NOT EXISTS `node_status_transitions` (
+  `transition_id` bigint(20) NOT NULL AUTO_INCREMENT,
+  `node_id` varchar(255) NOT NULL,
+  `changed_at` datetime NOT NULL,
+  `from_status` enum('GREEN','AMBER','RED') DEFAULT NULL,
+  `to_status` enum('GREEN','AMBER','RED') NOT NULL,
+  `cwqi` float NOT NULL,
+  PRIMARY KEY (`transition_id`),
+  KEY `idx_node_changed` (`node_id`,`changed_at`),
+  KEY `idx_changed` (`changed_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
@@ -0,0 +1,26 @@
+-- Point-in-time status history, see timetravel.py.
+-- node_status_changes: every node_status write (the analyzer only writes
+-- rows that changed), appended by Storage.upsert_statuses.
+CREATE TABLE IF NOT EXISTS `node_status_changes` (
+  `change_id` bigint(20) NOT NULL AUTO_INCREMENT,
+  `node_id` varchar(255) NOT NULL,
+  `changed_at` datetime NOT NULL,
+  `cwqi` float NOT NULL,
+  `status` enum('GREEN','AMBER','RED') NOT NULL,
+  `reason` varchar(255) DEFAULT NULL,
+  `anomaly_detected` tinyint(1) DEFAULT 0,
+  PRIMARY KEY (`change_id`),
+  KEY `idx_changed` (`changed_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+-- status_snapshots: full network status folded from the changes up to
+-- last_change_id, zlib-compressed JSON
+CREATE TABLE IF NOT EXISTS `status_snapshots` (
+  `snapshot_id` int(11) NOT NULL AUTO_INCREMENT,
+  `taken_at` datetime NOT NULL,
+  `last_change_id` bigint(20) NOT NULL,
+  `nodes` int(11) NOT NULL,
+  `data` mediumblob NOT NULL,
+  PRIMARY KEY (`snapshot_id`),
+  KEY `idx_taken` (`taken_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
@@ -0,0 +1,38 @@
+-- alerts with the layout of schema.sql. Databases whose alerts table was
+-- created by the old check_db.py (nullable columns, ENUM alert_level,
+-- VARCHAR reason) are converted to it.
+CREATE TABLE IF NOT EXISTS `alerts` (
+  `alert_id` int(11) NOT NULL AUTO_INCREMENT,
+  `node_id` varchar(255) NOT NULL,
+  `hierarchy_level` int(11) NOT NULL,
+  `alert_level` varchar(10) NOT NULL,
+  `cwqi_value` float NOT NULL,
+  `reason` text DEFAULT NULL,
+  `detected_at` datetime NOT NULL,
+  `resolved_at` datetime DEFAULT NULL,
+  `is_active` tinyint(1) NOT NULL DEFAULT 1,
+  PRIMARY KEY (`alert_id`),
+  KEY `idx_node_active` (`node_id`,`is_active`),
+  CONSTRAINT `fk_alerts_node` FOREIGN KEY (`node_id`) REFERENCES `nodes` (`node_id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+
+ALTER TABLE `alerts`
+  MODIFY `node_id` varchar(255) NOT NULL,
+  MODIFY `hierarchy_level` int(11) NOT NULL,
+  MODIFY `alert_level` varchar(10) NOT NULL,
+  MODIFY `cwqi_value` float NOT NULL,
+  MODIFY `reason` text DEFAULT NULL,
+  MODIFY `detected_at` datetime NOT NULL,
+  MODIFY `is_active` tinyint(1) NOT NULL DEFAULT 1;
+
+-- Dashboard: active alerts ORDER BY detected_at DESC, read in index order
+-- (no filesort). Not covering: the list selects reason and the other columns.
+CREATE INDEX `idx_active_detected` ON `alerts` (`is_active`, `detected_at`);
+
+-- Dashboard: resolved alerts ORDER BY resolved_at DESC LIMIT 10, the last
+-- 10 entries of the is_active = 0 range
+CREATE INDEX `idx_active_resolved` ON `alerts` (`is_active`, `resolved_at`);
+
+-- Analyzer: open alert per node; covers node_id, alert_level and (via the
+-- primary key) alert_id, so the registry load never touches the rows
+CREATE INDEX `idx_active_node` ON `alerts` (`is_active`, `node_id`, `alert_level`);
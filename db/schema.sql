@@ -35,6 +35,9 @@ CREATE TABLE `alerts` (
   `is_active` tinyint(1) NOT NULL DEFAULT 1,
   PRIMARY KEY (`alert_id`),
   KEY `idx_node_active` (`node_id`,`is_active`),
+  KEY `idx_active_detected` (`is_active`,`detected_at`),
+  KEY `idx_active_resolved` (`is_active`,`resolved_at`),
+  KEY `idx_active_node` (`is_active`,`node_id`,`alert_level`),
   CONSTRAINT `fk_alerts_node` FOREIGN KEY (`node_id`) REFERENCES `nodes` (`node_id`) ON DELETE CASCADE
 ) ENGINE=InnoDB AUTO_INCREMENT=1152 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
@@ -58,6 +61,46 @@ CREATE TABLE `node_status` (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
+--
+-- Table structure for table `node_status_changes`
+--
+
+DROP TABLE IF EXISTS `node_status_changes`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8mb4 */;
+CREATE TABLE `node_status_changes` (
+  `change_id` bigint(20) NOT NULL AUTO_INCREMENT,
+  `node_id` varchar(255) NOT NULL,
+  `changed_at` datetime NOT NULL,
+  `cwqi` float NOT NULL,
+  `status` enum('GREEN','AMBER','RED') NOT NULL,
+  `reason` varchar(255) DEFAULT NULL,
+  `anomaly_detected` tinyint(1) DEFAULT 0,
+  PRIMARY KEY (`change_id`),
+  KEY `idx_changed` (`changed_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `node_status_transitions`
+--
+
+DROP TABLE IF EXISTS `node_status_transitions`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8mb4 */;
+CREATE TABLE `node_status_transitions` (
+  `transition_id` bigint(20) NOT NULL AUTO_INCREMENT,
+  `node_id` varchar(255) NOT NULL,
+  `changed_at` datetime NOT NULL,
+  `from_status` enum('GREEN','AMBER','RED') DEFAULT NULL,
+  `to_status` enum('GREEN','AMBER','RED') NOT NULL,
+  `cwqi` float NOT NULL,
+  PRIMARY KEY (`transition_id`),
+  KEY `idx_node_changed` (`node_id`,`changed_at`),
+  KEY `idx_changed` (`changed_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `nodes`
 --
@@ -100,11 +143,163 @@ CREATE TABLE `sensor_readings` (
   `dissolved_oxygen` float DEFAULT NULL,
   `pressure` float DEFAULT NULL,
   `flow_rate` float DEFAULT NULL,
-  PRIMARY KEY (`reading_id`),
+  PRIMARY KEY (`reading_id`,`timestamp`),
   KEY `idx_node_time` (`node_id`,`timestamp`),
-  KEY `idx_time` (`timestamp`),
-  CONSTRAINT `sensor_readings_ibfk_1` FOREIGN KEY (`node_id`) REFERENCES `nodes` (`node_id`) ON DELETE CASCADE
-) ENGINE=InnoDB AUTO_INCREMENT=230273 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+  KEY `idx_time` (`timestamp`)
+) ENGINE=InnoDB AUTO_INCREMENT=230273 DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci
+/*!50500 PARTITION BY RANGE  COLUMNS(`timestamp`)
+(PARTITION pmax VALUES LESS THAN (MAXVALUE) ENGINE = InnoDB) */;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `sensor_latest`
+--
+
+DROP TABLE IF EXISTS `sensor_latest`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8mb4 */;
+CREATE TABLE `sensor_latest` (
+  `node_id` varchar(255) NOT NULL,
+  `timestamp` datetime NOT NULL,
+  `turbidity` float DEFAULT NULL,
+  `ph` float DEFAULT NULL,
+  `fluoride` float DEFAULT NULL,
+  `coliform` int(11) DEFAULT NULL,
+  `conductivity` float DEFAULT NULL,
+  `temperature` float DEFAULT NULL,
+  `dissolved_oxygen` float DEFAULT NULL,
+  `pressure` float DEFAULT NULL,
+  `flow_rate` float DEFAULT NULL,
+  PRIMARY KEY (`node_id`),
+  CONSTRAINT `sensor_latest_ibfk_1` FOREIGN KEY (`node_id`) REFERENCES `nodes` (`node_id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `sensor_rollup_1m`
+--
+
+DROP TABLE IF EXISTS `sensor_rollup_1m`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8mb4 */;
+CREATE TABLE `sensor_rollup_1m` (
+  `node_id` varchar(255) NOT NULL,
+  `bucket` datetime NOT NULL,
+  `samples` int(11) NOT NULL DEFAULT '0',
+  `turbidity_min` float DEFAULT NULL,
+  `turbidity_max` float DEFAULT NULL,
+  `turbidity_sum` double NOT NULL DEFAULT '0',
+  `turbidity_n` int(11) NOT NULL DEFAULT '0',
+  `ph_min` float DEFAULT NULL,
+  `ph_max` float DEFAULT NULL,
+  `ph_sum` double NOT NULL DEFAULT '0',
+  `ph_n` int(11) NOT NULL DEFAULT '0',
+  `fluoride_min` float DEFAULT NULL,
+  `fluoride_max` float DEFAULT NULL,
+  `fluoride_sum` double NOT NULL DEFAULT '0',
+  `fluoride_n` int(11) NOT NULL DEFAULT '0',
+  `coliform_min` float DEFAULT NULL,
+  `coliform_max` float DEFAULT NULL,
+  `coliform_sum` double NOT NULL DEFAULT '0',
+  `coliform_n` int(11) NOT NULL DEFAULT '0',
+  `conductivity_min` float DEFAULT NULL,
+  `conductivity_max` float DEFAULT NULL,
+  `conductivity_sum` double NOT NULL DEFAULT '0',
+  `conductivity_n` int(11) NOT NULL DEFAULT '0',
+  `temperature_min` float DEFAULT NULL,
+  `temperature_max` float DEFAULT NULL,
+  `temperature_sum` double NOT NULL DEFAULT '0',
+  `temperature_n` int(11) NOT NULL DEFAULT '0',
+  `dissolved_oxygen_min` float DEFAULT NULL,
+  `dissolved_oxygen_max` float DEFAULT NULL,
+  `dissolved_oxygen_sum` double NOT NULL DEFAULT '0',
+  `dissolved_oxygen_n` int(11) NOT NULL DEFAULT '0',
+  `pressure_min` float DEFAULT NULL,
+  `pressure_max` float DEFAULT NULL,
+  `pressure_sum` double NOT NULL DEFAULT '0',
+  `pressure_n` int(11) NOT NULL DEFAULT '0',
+  `flow_rate_min` float DEFAULT NULL,
+  `flow_rate_max` float DEFAULT NULL,
+  `flow_rate_sum` double NOT NULL DEFAULT '0',
+  `flow_rate_n` int(11) NOT NULL DEFAULT '0',
+  `cwqi_min` float DEFAULT NULL,
+  `cwqi_max` float DEFAULT NULL,
+  `cwqi_sum` double NOT NULL DEFAULT '0',
+  `cwqi_n` int(11) NOT NULL DEFAULT '0',
+  PRIMARY KEY (`node_id`,`bucket`),
+  KEY `idx_bucket` (`bucket`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `sensor_rollup_1h`
+--
+
+DROP TABLE IF EXISTS `sensor_rollup_1h`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8mb4 */;
+CREATE TABLE `sensor_rollup_1h` (
+  `node_id` varchar(255) NOT NULL,
+  `bucket` datetime NOT NULL,
+  `samples` int(11) NOT NULL DEFAULT '0',
+  `turbidity_min` float DEFAULT NULL,
+  `turbidity_max` float DEFAULT NULL,
+  `turbidity_sum` double NOT NULL DEFAULT '0',
+  `turbidity_n` int(11) NOT NULL DEFAULT '0',
+  `ph_min` float DEFAULT NULL,
+  `ph_max` float DEFAULT NULL,
+  `ph_sum` double NOT NULL DEFAULT '0',
+  `ph_n` int(11) NOT NULL DEFAULT '0',
+  `fluoride_min` float DEFAULT NULL,
+  `fluoride_max` float DEFAULT NULL,
+  `fluoride_sum` double NOT NULL DEFAULT '0',
+  `fluoride_n` int(11) NOT NULL DEFAULT '0',
+  `coliform_min` float DEFAULT NULL,
+  `coliform_max` float DEFAULT NULL,
+  `coliform_sum` double NOT NULL DEFAULT '0',
+  `coliform_n` int(11) NOT NULL DEFAULT '0',
+  `conductivity_min` float DEFAULT NULL,
+  `conductivity_max` float DEFAULT NULL,
+  `conductivity_sum` double NOT NULL DEFAULT '0',
+  `conductivity_n` int(11) NOT NULL DEFAULT '0',
+  `temperature_min` float DEFAULT NULL,
+  `temperature_max` float DEFAULT NULL,
+  `temperature_sum` double NOT NULL DEFAULT '0',
+  `temperature_n` int(11) NOT NULL DEFAULT '0',
+  `dissolved_oxygen_min` float DEFAULT NULL,
+  `dissolved_oxygen_max` float DEFAULT NULL,
+  `dissolved_oxygen_sum` double NOT NULL DEFAULT '0',
+  `dissolved_oxygen_n` int(11) NOT NULL DEFAULT '0',
+  `pressure_min` float DEFAULT NULL,
+  `pressure_max` float DEFAULT NULL,
+  `pressure_sum` double NOT NULL DEFAULT '0',
+  `pressure_n` int(11) NOT NULL DEFAULT '0',
+  `flow_rate_min` float DEFAULT NULL,
+  `flow_rate_max` float DEFAULT NULL,
+  `flow_rate_sum` double NOT NULL DEFAULT '0',
+  `flow_rate_n` int(11) NOT NULL DEFAULT '0',
+  `cwqi_min` float DEFAULT NULL,
+  `cwqi_max` float DEFAULT NULL,
+  `cwqi_sum` double NOT NULL DEFAULT '0',
+  `cwqi_n` int(11) NOT NULL DEFAULT '0',
+  PRIMARY KEY (`node_id`,`bucket`),
+  KEY `idx_bucket` (`bucket`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
+--
+-- Table structure for table `rollup_state`
+--
+
+DROP TABLE IF EXISTS `rollup_state`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8mb4 */;
+CREATE TABLE `rollup_state` (
+  `name` varchar(64) NOT NULL,
+  `last_reading_id` bigint(20) NOT NULL DEFAULT '0',
+  `updated_at` datetime DEFAULT NULL,
+  PRIMARY KEY (`name`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
 --
@@ -121,6 +316,24 @@ CREATE TABLE `staging_supply_raw` (
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 /*!40101 SET character_set_client = @saved_cs_client */;
 
+--
+-- Table structure for table `status_snapshots`
+--
+
+DROP TABLE IF EXISTS `status_snapshots`;
+/*!40101 SET @saved_cs_client     = @@character_set_client */;
+/*!40101 SET character_set_client = utf8mb4 */;
+CREATE TABLE `status_snapshots` (
+  `snapshot_id` int(11) NOT NULL AUTO_INCREMENT,
+  `taken_at` datetime NOT NULL,
+  `last_change_id` bigint(20) NOT NULL,
+  `nodes` int(11) NOT NULL,
+  `data` mediumblob NOT NULL,
+  PRIMARY KEY (`snapshot_id`),
+  KEY `idx_taken` (`taken_at`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
+/*!40101 SET character_set_client = @saved_cs_client */;
+
 --
 -- Table structure for table `supply_clean`
 --
@@ -1,15 +1,9 @@
 from pyvis.network import Network
-import mysql.connector
 import time
 
+from db import get_connection
+from topology import Topology
 
-# -------- DB CONFIG --------
-DB_CONFIG = {
-    "host": "127.0.0.1",
-    "user": "root",
-    "password": "5568",
-    "database": "jalrakshak"
-}
 
 REFRESH_SECONDS = 5
 OUTPUT_FILE = "mesh.html"
@@ -29,7 +23,7 @@ LEVEL_SIZE = {
 
 
 def fetch_data():
-    conn = mysql.connector.connect(**DB_CONFIG)
+    conn = get_connection()
     cursor = conn.cursor(dictionary=True)
 
     cursor.execute("""
@@ -83,25 +77,12 @@ def build_mesh(rows):
             """
         )
 
-    pump_nodes = {}
-    zone_nodes = {}
-
-    for r in rows:
-        if r["hierarchy_level"] == 1:
-            pump_nodes[r["pump"]] = r["node_id"]
-        elif r["hierarchy_level"] == 2:
-            zone_nodes[(r["pump"], r["zone"])] = r["node_id"]
-
-    for r in rows:
-        if r["hierarchy_level"] == 2:
-            parent = pump_nodes.get(r["pump"])
-            if parent:
-                net.add_edge(parent, r["node_id"], color="#555555")
-
-        elif r["hierarchy_level"] == 3:
-            parent = zone_nodes.get((r["pump"], r["zone"]))
-            if parent:
-                net.add_edge(parent, r["node_id"], color="#444444")
+    # Edges from the shared topology index
+    topology = Topology.from_rows(rows)
+    for child, parent in enumerate(topology.parent.tolist()):
+        if parent >= 0:
+            color = "#555555" if topology.level[child] == 2 else "#444444"
+            net.add_edge(topology.node_ids[parent], topology.node_ids[child], color=color)
 
     return net
 
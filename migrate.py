@@ -0,0 +1,307 @@
+import os
+import re
+import sys
+import argparse
+from datetime import datetime
+
+from mysql.connector import Error
+
+from db import connection, DB_CONFIG
+
+# =========================
+# Versioned schema migrations
+# =========================
+#
+# db/migrations/NNN_name.sql are applied in version order and recorded in
+# schema_migrations, so `python migrate.py up` only runs what a database
+# is missing:
+#
+#   up      applies pending migrations (--to N stops after version N)
+#   status  lists versions with when they were applied
+#   check   EXPLAINs the hot queries on a scratch copy of the tables
+#           filled to --rows rows, and exits 1 if one of them no longer
+#           uses its intended index
+#
+# Every statement must be safe to run again: CREATE TABLE IF NOT EXISTS,
+# and CREATE INDEX, which the runner skips when the index exists (MySQL
+# has no CREATE INDEX IF NOT EXISTS). Databases created from schema.sql
+# already have everything, so `up` just records the versions.
+#
+# partitions.py migrate rebuilds sensor_readings and stays a separate,
+# deliberate step.
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db", "migrations")
+MIGRATION_FILE_NAME = re.compile(r"^(\d+)_(\w+)\.sql$")
+
+# Rows in the scratch tables for `check`
+EXPLAIN_CHECK_ROWS = int(os.getenv("EXPLAIN_CHECK_ROWS", "10000000"))
+# Needs CREATE/DROP rights on this database
+EXPLAIN_CHECK_DATABASE = os.getenv("EXPLAIN_CHECK_DATABASE", f"{DB_CONFIG['database']}_explain")
+CHECK_NODES = 1000
+
+SCHEMA_MIGRATIONS_QUERY = """
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    version int(11) NOT NULL,
+    name varchar(255) NOT NULL,
+    applied_at datetime NOT NULL,
+    PRIMARY KEY (version)
+)
+"""
+APPLIED_QUERY = "SELECT version, name, applied_at FROM schema_migrations ORDER BY version"
+RECORD_QUERY = "INSERT INTO schema_migrations (version, name, applied_at) VALUES (%s, %s, %s)"
+
+CREATE_INDEX_STATEMENT = re.compile(r"^\s*CREATE\s+INDEX\s+`?(\w+)`?\s+ON\s+`?(\w+)`?", re.IGNORECASE)
+INDEX_EXISTS_QUERY = """
+SELECT 1
+FROM information_schema.STATISTICS
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+LIMIT 1
+"""
+
+
+# -------- FILES --------
+def discover(migrations_dir=MIGRATIONS_DIR):
+    """[(version, name, path)] in version order."""
+    found = []
+    for file_name in os.listdir(migrations_dir):
+        match = MIGRATION_FILE_NAME.match(file_name)
+        if match:
+            found.append((int(match.group(1)), match.group(2), os.path.join(migrations_dir, file_name)))
+    return sorted(found)
+
+
+def read_statements(path):
+    """Statements of a migration file; lines starting with -- are comments."""
+    with open(path, "r", encoding="utf-8") as f:
+        lines = [line for line in f if not line.lstrip().startswith("--")]
+    return [statement.strip() for statement in "".join(lines).split(";") if statement.strip()]
+
+
+def apply_file(conn, path):
+    """Runs one migration file. Returns (statements run, indexes already present)."""
+    cursor = conn.cursor()
+    run = skipped = 0
+    for statement in read_statements(path):
+        match = CREATE_INDEX_STATEMENT.match(statement)
+        if match:
+            cursor.execute(INDEX_EXISTS_QUERY, (match.group(2), match.group(1)))
+            if cursor.fetchall():
+                skipped += 1
+                continue
+        cursor.execute(statement)
+        run += 1
+    conn.commit()
+    cursor.close()
+    return run, skipped
+
+
+# -------- DATA STEPS --------
+# Run after a version's statements, on the first apply only
+def _fill_sensor_latest(conn):
+    from sensor_latest import rebuild
+    rebuild(conn)
+
+
+def _backfill_status_changes(conn):
+    from storage import MySQLStorage
+    store = MySQLStorage(conn)
+    store.backfill_status_changes()
+    store.commit()
+    store.close()
+
+
+DATA_STEPS = {
+    1: _fill_sensor_latest,
+    4: _backfill_status_changes,
+}
+
+
+# -------- RUNNER --------
+def applied_versions(conn):
+    """version -> (name, applied_at)"""
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(SCHEMA_MIGRATIONS_QUERY)
+    cursor.execute(APPLIED_QUERY)
+    rows = cursor.fetchall()
+    cursor.close()
+    return {row["version"]: (row["name"], row["applied_at"]) for row in rows}
+
+
+def upgrade(conn, target=None):
+    """Applies pending migrations up to `target` (default: all). Returns versions applied."""
+    done = applied_versions(conn)
+    applied = []
+    for version, name, path in discover():
+        if version in done:
+            continue
+        if target is not None and version > target:
+            break
+        run, skipped = apply_file(conn, path)
+        if version in DATA_STEPS:
+            DATA_STEPS[version](conn)
+        cursor = conn.cursor()
+        cursor.execute(RECORD_QUERY, (version, name, datetime.now()))
+        conn.commit()
+        cursor.close()
+        print(f"[MIGRATE] {version:03d}_{name}: {run} statements"
+              + (f", {skipped} indexes already present" if skipped else ""))
+        applied.append(version)
+    return applied
+
+
+# -------- EXPLAIN CHECK --------
+def hot_queries(rows):
+    """
+    (name, EXPLAIN table, accepted indexes, filesort allowed, sql, params)
+    for the queries that run every tick or on every dashboard refresh.
+    """
+    from storage import (
+        ACTIVE_ALERTS_LIST_QUERY, RESOLVED_ALERTS_LIST_QUERY, GET_ACTIVE_ALERTS_QUERY,
+        GET_ALERT_IDS_PREFIX, NEW_READINGS_QUERY, shard_query,
+    )
+    from rollups import NODE_READINGS_QUERY
+
+    return [
+        ("dashboard active alerts", "alerts", ("idx_active_detected",), False,
+         ACTIVE_ALERTS_LIST_QUERY, ()),
+        ("dashboard resolved alerts", "alerts", ("idx_active_resolved",), False,
+         RESOLVED_ALERTS_LIST_QUERY, (10,)),
+        # Driving from nodes through idx_node_active is as good
+        ("analyzer alert registry", "a", ("idx_active_node", "idx_node_active"), True,
+         shard_query(GET_ACTIVE_ALERTS_QUERY, None)[0], ()),
+        ("analyzer alert ids", "alerts", ("idx_active_node", "idx_node_active"), True,
+         GET_ALERT_IDS_PREFIX + "(%s, %s, %s)", ("L3_CHECK_1", "L3_CHECK_2", "L3_CHECK_3")),
+        ("analyzer incremental fetch", "sr", ("PRIMARY",), False,
+         NEW_READINGS_QUERY.format(shard=""), (max(rows - 5000, 0), 50000)),
+        ("node history", "sr", ("idx_node_time",), False,
+         NODE_READINGS_QUERY, ("L3_CHECK_1", datetime(2026, 1, 1, 6), datetime(2026, 1, 1, 7))),
+    ]
+
+
+def _numbers(rows):
+    """SELECT of n = 0 .. rows - 1 from cross joins of the digits table."""
+    places = max(1, len(str(max(rows - 1, 1))))
+    tables = ", ".join(f"check_digits d{i}" for i in range(places))
+    expr = " + ".join(f"{10 ** i} * d{i}.d" for i in range(places))
+    return f"SELECT {expr} AS n FROM {tables} WHERE {expr} < {rows}"
+
+
+def build_check_tables(conn, rows, database=EXPLAIN_CHECK_DATABASE):
+    """
+    Copies the structure (indexes and partitioning, no foreign keys) of
+    nodes, alerts and sensor_readings into `database` and fills them with
+    synthetic rows server side: CHECK_NODES nodes, `rows` alerts (the
+    newest per node still active) and `rows` readings at 5 s per node.
+    """
+    live = DB_CONFIG["database"]
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE DATABASE IF NOT EXISTS `{database}`")
+    cursor.execute(f"USE `{database}`")
+    for table in ("nodes", "alerts", "sensor_readings"):
+        cursor.execute(f"DROP TABLE IF EXISTS `{table}`")
+        cursor.execute(f"CREATE TABLE `{table}` LIKE `{live}`.`{table}`")
+
+    cursor.execute("DROP TABLE IF EXISTS check_digits")
+    cursor.execute("CREATE TABLE check_digits (d tinyint NOT NULL PRIMARY KEY)")
+    cursor.execute("INSERT INTO check_digits VALUES " + ", ".join(f"({d})" for d in range(10)))
+
+    cursor.execute(
+        "INSERT INTO nodes (node_id, hierarchy_level, pump, installed_on) "
+        f"SELECT CONCAT('L3_CHECK_', n), 3, CONCAT('CHECK_PUMP_', n % 20), CURDATE() "
+        f"FROM ({_numbers(CHECK_NODES)}) seq"
+    )
+    conn.commit()
+    cursor.execute(
+        "INSERT INTO alerts (node_id, hierarchy_level, alert_level, cwqi_value, reason, "
+        "detected_at, resolved_at, is_active) "
+        f"SELECT CONCAT('L3_CHECK_', n % {CHECK_NODES}), 3, IF(n % 2, 'AMBER', 'RED'), 40, 'check', "
+        "'2026-01-01' + INTERVAL n MINUTE, "
+        f"IF(n >= {rows - CHECK_NODES}, NULL, '2026-01-01' + INTERVAL (n + 5) MINUTE), "
+        f"n >= {rows - CHECK_NODES} "
+        f"FROM ({_numbers(rows)}) seq"
+    )
+    conn.commit()
+    cursor.execute(
+        "INSERT INTO sensor_readings (node_id, timestamp, turbidity, ph, fluoride, coliform, "
+        "conductivity, temperature, dissolved_oxygen, pressure, flow_rate) "
+        f"SELECT CONCAT('L3_CHECK_', n % {CHECK_NODES}), "
+        f"'2026-01-01' + INTERVAL (n DIV {CHECK_NODES}) * 5 SECOND, "
+        "1.0, 7.2, 0.6, 0, 450, 25, 6.5, 2.5, 10 "
+        f"FROM ({_numbers(rows)}) seq"
+    )
+    conn.commit()
+    for table in ("nodes", "alerts", "sensor_readings"):
+        cursor.execute(f"ANALYZE TABLE `{table}`")
+        cursor.fetchall()
+    cursor.close()
+
+
+def explain_check(conn, rows=EXPLAIN_CHECK_ROWS, database=EXPLAIN_CHECK_DATABASE,
+                  live=False, keep=False):
+    """
+    EXPLAINs every hot query and returns the names of those that use an
+    unexpected index (or a filesort where none is expected). Only the key
+    and the filesort are checked; the list queries select TEXT columns, so
+    "Using index" is not expected. With
+    live=True the current database is checked as it is.
+    """
+    failures = []
+    cursor = conn.cursor(dictionary=True)
+    try:
+        if not live:
+            print(f"[EXPLAIN] Filling {database} with {rows} alerts and readings...")
+            build_check_tables(conn, rows, database)
+        for name, table, keys, filesort_ok, query, params in hot_queries(rows):
+            cursor.execute("EXPLAIN " + query, params or None)
+            plan = [row for row in cursor.fetchall() if row["table"] == table]
+            key = plan[0]["key"] if plan else None
+            extra = (plan[0]["Extra"] or "") if plan else ""
+            ok = key in keys and (filesort_ok or "filesort" not in extra)
+            print(f"[EXPLAIN] {'ok  ' if ok else 'FAIL'} {name}: key={key} "
+                  f"rows={plan[0]['rows'] if plan else '?'} {extra}")
+            if not ok:
+                print(f"[EXPLAIN]      expected {' or '.join(keys)}"
+                      + ("" if filesort_ok else " without filesort"))
+                failures.append(name)
+    finally:
+        if not live:
+            # The connection goes back to the pool
+            cursor.execute(f"USE `{DB_CONFIG['database']}`")
+            if not keep:
+                cursor.execute(f"DROP DATABASE `{database}`")
+        cursor.close()
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply schema migrations and check hot query plans")
+    parser.add_argument("action", choices=["up", "status", "check"])
+    parser.add_argument("--to", type=int, help="up: stop after this version")
+    parser.add_argument("--rows", type=int, default=EXPLAIN_CHECK_ROWS, help="check: scratch table size")
+    parser.add_argument("--database", default=EXPLAIN_CHECK_DATABASE, help="check: scratch database")
+    parser.add_argument("--live", action="store_true", help="check: EXPLAIN against the live tables")
+    parser.add_argument("--keep", action="store_true", help="check: keep the scratch database")
+    args = parser.parse_args()
+
+    try:
+        with connection() as conn:
+            if args.action == "up":
+                applied = upgrade(conn, args.to)
+                print(f"[MIGRATE] Applied {len(applied)} migrations" if applied else "[MIGRATE] Up to date")
+
+            elif args.action == "status":
+                done = applied_versions(conn)
+                for version, name, _ in discover():
+                    when = done[version][1] if version in done else "pending"
+                    print(f"[MIGRATE] {version:03d}_{name:<24} {when}")
+
+            else:
+                failures = explain_check(conn, args.rows, args.database, args.live, args.keep)
+                if failures:
+                    print(f"[EXPLAIN] {len(failures)} hot queries off their index")
+                    sys.exit(1)
+                print("[EXPLAIN] All hot queries use their indexes")
+
+    except Error as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
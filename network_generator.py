@@ -0,0 +1,276 @@
+import sys
+import csv
+import argparse
+from datetime import date, timedelta
+
+import numpy as np
+from mysql.connector import Error
+
+from db import DB_CONFIG, connection, get_connection
+from timetravel import decode_state, encode_state
+
+# =========================
+# Synthetic network generator
+# =========================
+#
+# Builds pump -> zone -> colony trees of any size for scale testing, named
+# the way the seed data is (L1_<PUMP>, L2_<PUMP>_<ZONE>, L3_<PUMP>_<ZONE>_<COLONY>)
+# so the simulator, analyzer and dashboard treat them like real nodes.
+#
+#   python network_generator.py --nodes 100000 --load
+#   python network_generator.py --nodes 1000000 --fanout 8 12 --out nodes.csv
+#   python network_generator.py --drop
+
+DEFAULT_PREFIX = "SYN"
+DEFAULT_FANOUT = (4, 6)  # zones per pump, colonies per zone
+DEFAULT_JITTER = 0.5  # fan-out varies +/- this fraction per parent
+
+# Pumps are spread over the city, children scattered around their parent
+CITY_CENTER = (26.9124, 75.7873)
+CITY_SPREAD_DEG = 0.15
+ZONE_SPREAD_DEG = 0.02
+COLONY_SPREAD_DEG = 0.005
+
+INSTALLED_FROM = date(2016, 1, 1)
+INSTALLED_DAYS = (date(2024, 12, 31) - INSTALLED_FROM).days
+
+NODE_COLUMNS = ("node_id", "hierarchy_level", "pump", "zone", "colony",
+                "installed_on", "latitude", "longitude")
+LOAD_BATCH_ROWS = 5000
+
+INSERT_NODES_PREFIX = f"REPLACE INTO nodes ({', '.join(NODE_COLUMNS)}) VALUES "
+
+# Fast path for files written with --out *.csv (needs local_infile on the server)
+LOAD_CSV_QUERY = f"""
+LOAD DATA LOCAL INFILE %s REPLACE INTO TABLE nodes
+FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+IGNORE 1 LINES
+({', '.join(NODE_COLUMNS)})
+"""
+
+# Per-node tables --drop clears before the nodes themselves
+NODE_TABLES = (
+    "alerts", "node_status", "node_status_changes", "node_status_transitions",
+    "sensor_latest", "sensor_rollup_1m", "sensor_rollup_1h", "sensor_readings",
+)
+SNAPSHOT_BATCH_ROWS = 20
+SNAPSHOT_BATCH_QUERY = (
+    "SELECT snapshot_id, data FROM status_snapshots "
+    "WHERE snapshot_id > %s ORDER BY snapshot_id LIMIT %s"
+)
+SNAPSHOT_UPDATE_QUERY = "UPDATE status_snapshots SET nodes = %s, data = %s WHERE snapshot_id = %s"
+
+
+# -------- GENERATION --------
+def _fanout(rng, parents, mean, jitter):
+    """Children per parent, uniform within mean * (1 +/- jitter), at least 1."""
+    low = max(1, round(mean * (1 - jitter)))
+    high = max(low, round(mean * (1 + jitter)))
+    return rng.integers(low, high, parents, endpoint=True)
+
+
+def _scatter(rng, parent_coords, counts, spread):
+    """Child coordinates normally distributed around each parent."""
+    centers = np.repeat(parent_coords, counts, axis=0)
+    return centers + rng.normal(0, spread / 2, centers.shape)
+
+
+def _node_key(name):
+    return name.replace(" ", "_")
+
+
+def generate_network(total_nodes, fanout=DEFAULT_FANOUT, jitter=DEFAULT_JITTER,
+                     prefix=DEFAULT_PREFIX, seed=None):
+    """
+    Returns the nodes as a list of tuples in NODE_COLUMNS order, pumps
+    first, then zones, then colonies. The total lands close to
+    total_nodes; the exact count depends on the drawn fan-outs.
+    """
+    rng = np.random.default_rng(seed)
+    zones_per_pump, colonies_per_zone = fanout
+    per_pump = 1 + zones_per_pump + zones_per_pump * colonies_per_zone
+    pump_count = max(1, round(total_nodes / per_pump))
+
+    zone_counts = _fanout(rng, pump_count, zones_per_pump, jitter)
+    zone_count = int(zone_counts.sum())
+    colony_counts = _fanout(rng, zone_count, colonies_per_zone, jitter)
+    colony_count = int(colony_counts.sum())
+
+    pump_coords = np.array(CITY_CENTER) + rng.uniform(-CITY_SPREAD_DEG, CITY_SPREAD_DEG, (pump_count, 2))
+    zone_coords = _scatter(rng, pump_coords, zone_counts, ZONE_SPREAD_DEG)
+    colony_coords = _scatter(rng, zone_coords, colony_counts, COLONY_SPREAD_DEG)
+    coords = np.concatenate([pump_coords, zone_coords, colony_coords]).round(6).tolist()
+
+    total = pump_count + zone_count + colony_count
+    installed = rng.integers(0, INSTALLED_DAYS, total, endpoint=True).tolist()
+
+    # Names: index within the parent, zero padded to the widest fan-out
+    pump_width = len(str(pump_count))
+    zone_width = len(str(int(zone_counts.max())))
+    colony_width = len(str(int(colony_counts.max())))
+
+    pumps = [f"{prefix} PUMP {i:0{pump_width}d}" for i in range(pump_count)]
+    zone_pump = np.repeat(np.arange(pump_count), zone_counts).tolist()
+    zone_index = (np.arange(zone_count) - np.repeat(np.cumsum(zone_counts) - zone_counts, zone_counts)).tolist()
+    zones = [f"ZONE {i:0{zone_width}d}" for i in zone_index]
+    colony_zone = np.repeat(np.arange(zone_count), colony_counts).tolist()
+    colony_index = (np.arange(colony_count) - np.repeat(np.cumsum(colony_counts) - colony_counts, colony_counts)).tolist()
+
+    rows = []
+    for pump in pumps:
+        rows.append((f"L1_{_node_key(pump)}", 1, pump, None, None))
+    zone_keys = []
+    for pump_i, zone in zip(zone_pump, zones):
+        pump = pumps[pump_i]
+        zone_keys.append(f"{_node_key(pump)}_{_node_key(zone)}")
+        rows.append((f"L2_{zone_keys[-1]}", 2, pump, zone, None))
+    for zone_i, i in zip(colony_zone, colony_index):
+        colony = f"COLONY {i:0{colony_width}d}"
+        rows.append((f"L3_{zone_keys[zone_i]}_{_node_key(colony)}", 3,
+                     pumps[zone_pump[zone_i]], zones[zone_i], colony))
+
+    dates = [(INSTALLED_FROM + timedelta(days=d)).isoformat() for d in range(INSTALLED_DAYS + 1)]
+    return [
+        row + (dates[days], lat, lon)
+        for row, days, (lat, lon) in zip(rows, installed, coords)
+    ]
+
+
+# -------- OUTPUT --------
+def write_csv(nodes, path):
+    """CSV with a header row, NULLs as \\N, ready for LOAD_CSV_QUERY."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(NODE_COLUMNS)
+        # Pumps have no zone or colony, zones have no colony
+        writer.writerows(
+            row if row[4] is not None else
+            row[:3] + (row[3] or "\\N", "\\N") + row[5:]
+            for row in nodes
+        )
+
+
+def _sql_value(value):
+    if value is None:
+        return "NULL"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + str(value).replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def write_sql(nodes, path):
+    """REPLACE statements in the style of db/seed.sql."""
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("set autocommit=0;\n")
+        for i in range(0, len(nodes), LOAD_BATCH_ROWS):
+            chunk = nodes[i:i + LOAD_BATCH_ROWS]
+            f.write(f"REPLACE INTO `nodes` ({', '.join(NODE_COLUMNS)}) VALUES\n")
+            f.write(",\n".join(
+                "(" + ",".join(_sql_value(v) for v in row) + ")" for row in chunk
+            ))
+            f.write(";\n")
+        f.write("commit;\n")
+
+
+# -------- DATABASE --------
+def load_nodes(conn, nodes):
+    """Bulk loads nodes with multi-row REPLACE statements, one commit."""
+    cursor = conn.cursor()
+    row = "(" + ", ".join(["%s"] * len(NODE_COLUMNS)) + ")"
+    for i in range(0, len(nodes), LOAD_BATCH_ROWS):
+        chunk = nodes[i:i + LOAD_BATCH_ROWS]
+        cursor.execute(INSERT_NODES_PREFIX + ", ".join([row] * len(chunk)),
+                       [v for r in chunk for v in r])
+    conn.commit()
+    cursor.close()
+    return len(nodes)
+
+
+def load_csv(path):
+    """LOAD DATA for a CSV from write_csv; the client must opt in to local files."""
+    conn = get_connection(dict(DB_CONFIG, allow_local_infile=True))
+    cursor = conn.cursor()
+    cursor.execute(LOAD_CSV_QUERY, (path,))
+    loaded = cursor.rowcount
+    conn.commit()
+    cursor.close()
+    conn.close()
+    return loaded
+
+
+def drop_nodes(conn, prefix=DEFAULT_PREFIX):
+    """
+    Deletes a generated network and everything recorded for it: readings,
+    rollups, status, status history and alerts. Snapshots are rewritten
+    without its nodes so state_at no longer returns them.
+    """
+    pattern = f"L_\\_{_node_key(prefix)}\\_PUMP\\_%"
+    cursor = conn.cursor()
+    for table in NODE_TABLES:
+        cursor.execute(f"DELETE FROM {table} WHERE node_id LIKE %s", (pattern,))
+    conn.commit()
+    _drop_from_snapshots(conn, cursor, f"_{_node_key(prefix)}_PUMP_")
+    cursor.execute("DELETE FROM nodes WHERE node_id LIKE %s", (pattern,))
+    removed = cursor.rowcount
+    conn.commit()
+    cursor.close()
+    return removed
+
+
+def _drop_from_snapshots(conn, cursor, marker):
+    """Rewrites status_snapshots without the node ids matching L?<marker>."""
+    last_id = 0
+    while True:
+        cursor.execute(SNAPSHOT_BATCH_QUERY, (last_id, SNAPSHOT_BATCH_ROWS))
+        rows = cursor.fetchall()
+        for snapshot_id, data in rows:
+            state = decode_state(data)
+            kept = {k: v for k, v in state.items() if not k.startswith(marker, 2)}
+            if len(kept) != len(state):
+                cursor.execute(SNAPSHOT_UPDATE_QUERY, (len(kept), encode_state(kept), snapshot_id))
+        conn.commit()
+        if len(rows) < SNAPSHOT_BATCH_ROWS:
+            return
+        last_id = rows[-1][0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic pump/zone/colony network")
+    parser.add_argument("--nodes", type=int, default=10000, help="approximate total node count")
+    parser.add_argument("--fanout", type=int, nargs=2, default=list(DEFAULT_FANOUT),
+                        metavar=("ZONES", "COLONIES"), help="mean zones per pump and colonies per zone")
+    parser.add_argument("--jitter", type=float, default=DEFAULT_JITTER)
+    parser.add_argument("--prefix", default=DEFAULT_PREFIX, help="pump name prefix")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--out", help="write to a .csv or .sql file")
+    parser.add_argument("--load", action="store_true", help="bulk load into the nodes table")
+    parser.add_argument("--load-csv", help="LOAD DATA LOCAL INFILE a CSV written by --out")
+    parser.add_argument("--drop", action="store_true", help="delete nodes generated with --prefix")
+    args = parser.parse_args()
+
+    try:
+        if args.drop:
+            with connection() as conn:
+                print(f"[NETWORK] Removed {drop_nodes(conn, args.prefix)} nodes")
+        if args.load_csv:
+            print(f"[NETWORK] Loaded {load_csv(args.load_csv)} rows from {args.load_csv}")
+        if (args.drop or args.load_csv) and not (args.out or args.load):
+            sys.exit(0)
+
+        nodes = generate_network(args.nodes, tuple(args.fanout), args.jitter, args.prefix, args.seed)
+        levels = [sum(1 for n in nodes if n[1] == level) for level in (1, 2, 3)]
+        print(f"[NETWORK] Generated {len(nodes)} nodes "
+              f"({levels[0]} pumps, {levels[1]} zones, {levels[2]} colonies)")
+
+        if args.out:
+            if args.out.endswith(".sql"):
+                write_sql(nodes, args.out)
+            else:
+                write_csv(nodes, args.out)
+            print(f"[NETWORK] Written to {args.out}")
+        if args.load:
+            with connection() as conn:
+                print(f"[NETWORK] Loaded {load_nodes(conn, nodes)} nodes")
+    except Error as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
@@ -0,0 +1,274 @@
+import os
+import sys
+import time
+import argparse
+from datetime import date, datetime, timedelta
+
+from mysql.connector import Error
+
+from db import connection
+
+# =========================
+# sensor_readings partition maintenance
+# =========================
+#
+# sensor_readings is RANGE COLUMNS partitioned on timestamp, one partition
+# per day or week (pYYYYMMDD, named after the first day it holds), plus a
+# MAXVALUE catch-all `pmax` that should always stay empty:
+#
+#   migrate   one-off conversion of an existing table (rebuilds it)
+#   maintain  splits new partitions off pmax ahead of time and drops the
+#             ones older than the retention window
+#   status    lists partitions with their bounds and row estimates
+#
+# Dropping a partition is a metadata operation with a brief lock, unlike a
+# DELETE over millions of rows. Queries filtering on timestamp are pruned
+# to the partitions that can match.
+#
+# An expired partition is only dropped once every day in it is in the
+# cold archive (archive.py) with a matching row count, so retention never
+# discards readings that were not archived.
+
+TABLE = "sensor_readings"
+GRANULARITY = os.getenv("READINGS_PARTITION", "daily")  # daily | weekly
+PARTITIONS_AHEAD_DAYS = int(os.getenv("READINGS_PARTITIONS_AHEAD_DAYS", "7"))
+# 0 keeps everything
+RETENTION_DAYS = int(os.getenv("READINGS_RETENTION_DAYS", "90"))
+# 0 drops expired partitions whether or not they were archived
+REQUIRE_ARCHIVE = os.getenv("READINGS_REQUIRE_ARCHIVE", "1") == "1"
+CATCH_ALL = "pmax"
+
+PARTITIONS_QUERY = """
+SELECT PARTITION_NAME AS name,
+       PARTITION_DESCRIPTION AS bound,
+       TABLE_ROWS AS row_estimate
+FROM information_schema.PARTITIONS
+WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+ORDER BY PARTITION_ORDINAL_POSITION
+"""
+
+# Partitioned InnoDB tables cannot have foreign keys, and every unique key
+# must contain the partitioning column
+PREPARE_QUERIES = (
+    f"ALTER TABLE {TABLE} DROP FOREIGN KEY sensor_readings_ibfk_1",
+    f"ALTER TABLE {TABLE} DROP PRIMARY KEY, ADD PRIMARY KEY (reading_id, timestamp)",
+)
+
+MIN_TIMESTAMP_QUERY = f"SELECT DATE(MIN(timestamp)) AS first_day FROM {TABLE}"
+COUNT_RANGE_QUERY = f"SELECT COUNT(*) FROM {TABLE} WHERE timestamp >= %s AND timestamp < %s"
+
+
+# -------- BOUNDARIES --------
+def period_start(day, granularity=GRANULARITY):
+    """First day of the partition holding `day` (weeks start on Monday)."""
+    if granularity == "weekly":
+        return day - timedelta(days=day.weekday())
+    return day
+
+
+def period_step(granularity=GRANULARITY):
+    return timedelta(days=7 if granularity == "weekly" else 1)
+
+
+def partition_name(start):
+    return f"p{start:%Y%m%d}"
+
+
+def _partition_clause(start, end):
+    return f"PARTITION {partition_name(start)} VALUES LESS THAN ('{end.isoformat()}')"
+
+
+def _parse_bound(bound):
+    """PARTITION_DESCRIPTION for RANGE COLUMNS, e.g. "'2026-01-11 00:00:00'"."""
+    if bound is None or bound == "MAXVALUE":
+        return None
+    return datetime.fromisoformat(bound.strip("'")).date()
+
+
+def list_partitions(conn):
+    """[(name, upper_bound_date or None, row_estimate)]; empty if unpartitioned."""
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(PARTITIONS_QUERY, (TABLE,))
+    rows = cursor.fetchall()
+    cursor.close()
+    return [
+        (row["name"], _parse_bound(row["bound"]), row["row_estimate"])
+        for row in rows if row["name"] is not None
+    ]
+
+
+# -------- MIGRATION --------
+def migrate(conn, granularity=GRANULARITY, ahead_days=PARTITIONS_AHEAD_DAYS):
+    """
+    Converts an unpartitioned sensor_readings in place: one partition per
+    period from the oldest row up to `ahead_days` from today, plus pmax.
+    This rebuilds the table, so run it in a quiet window.
+    """
+    if list_partitions(conn):
+        print(f"[PARTITIONS] {TABLE} is already partitioned")
+        return 0
+
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(MIN_TIMESTAMP_QUERY)
+    first_day = cursor.fetchone()["first_day"] or date.today()
+
+    step = period_step(granularity)
+    start = period_start(first_day, granularity)
+    horizon = date.today() + timedelta(days=ahead_days)
+    clauses = []
+    while start <= horizon:
+        clauses.append(_partition_clause(start, start + step))
+        start += step
+    clauses.append(f"PARTITION {CATCH_ALL} VALUES LESS THAN (MAXVALUE)")
+
+    for query in PREPARE_QUERIES:
+        cursor.execute(query)
+    cursor.execute(
+        f"ALTER TABLE {TABLE} PARTITION BY RANGE COLUMNS(timestamp) (\n  "
+        + ",\n  ".join(clauses) + "\n)"
+    )
+    cursor.close()
+    return len(clauses) - 1
+
+
+# -------- MAINTENANCE --------
+def create_future_partitions(conn, granularity=GRANULARITY, ahead_days=PARTITIONS_AHEAD_DAYS):
+    """
+    Splits partitions off pmax until they cover `ahead_days` from today.
+    pmax is expected to be empty, so REORGANIZE only touches metadata.
+    Returns the names created.
+    """
+    partitions = list_partitions(conn)
+    if not partitions:
+        raise Error(f"{TABLE} is not partitioned; run `python partitions.py migrate` first")
+
+    bounds = [bound for _, bound, _ in partitions if bound is not None]
+    step = period_step(granularity)
+    # A fresh table (only pmax) starts at the current period
+    start = bounds[-1] if bounds else period_start(date.today(), granularity)
+    horizon = date.today() + timedelta(days=ahead_days)
+
+    clauses = []
+    created = []
+    while start <= horizon:
+        clauses.append(_partition_clause(start, start + step))
+        created.append(partition_name(start))
+        start += step
+    if not clauses:
+        return []
+
+    if partitions[-1][0] == CATCH_ALL and partitions[-1][2]:
+        print(f"[PARTITIONS] Warning: {CATCH_ALL} holds ~{partitions[-1][2]} rows; "
+              f"reorganizing will copy them")
+
+    clauses.append(f"PARTITION {CATCH_ALL} VALUES LESS THAN (MAXVALUE)")
+    cursor = conn.cursor()
+    cursor.execute(
+        f"ALTER TABLE {TABLE} REORGANIZE PARTITION {CATCH_ALL} INTO (\n  "
+        + ",\n  ".join(clauses) + "\n)"
+    )
+    cursor.close()
+    return created
+
+
+def is_archived(conn, start, end):
+    """
+    True if every day in [start, end) that still has rows is archived
+    with the same row count.
+    """
+    # archive.py imports this module
+    from archive import ArchiveDay, day_path
+
+    cursor = conn.cursor()
+    day = start
+    try:
+        while day < end:
+            cursor.execute(COUNT_RANGE_QUERY, (day, day + timedelta(days=1)))
+            live = cursor.fetchone()[0]
+            path = day_path(day)
+            if live and not (os.path.exists(path) and ArchiveDay(path).rows == live):
+                return False
+            day += timedelta(days=1)
+    finally:
+        cursor.close()
+    return True
+
+
+def drop_expired_partitions(conn, retention_days=RETENTION_DAYS, require_archive=REQUIRE_ARCHIVE):
+    """
+    Drops partitions whose rows are all older than the retention window
+    and, with require_archive, are in the cold archive. Returns the names
+    dropped.
+    """
+    if retention_days <= 0:
+        return []
+    cutoff = date.today() - timedelta(days=retention_days)
+    expired = []
+    # A partition holds everything from the previous bound up; the first
+    # one has no lower bound (e.g. split off a pmax that already had rows),
+    # so its range starts at the oldest row
+    start = None
+    for name, bound, _ in list_partitions(conn):
+        if bound is None or bound > cutoff:
+            break
+        if require_archive:
+            if start is None:
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute(MIN_TIMESTAMP_QUERY)
+                start = cursor.fetchone()["first_day"] or bound
+                cursor.close()
+            archived = is_archived(conn, start, bound)
+            start = bound
+            if not archived:
+                print(f"[PARTITIONS] {name} is past retention but not archived; keeping it")
+                continue
+        expired.append(name)
+    if expired:
+        cursor = conn.cursor()
+        cursor.execute(f"ALTER TABLE {TABLE} DROP PARTITION {', '.join(expired)}")
+        cursor.close()
+    return expired
+
+
+def maintain(conn, granularity=GRANULARITY, ahead_days=PARTITIONS_AHEAD_DAYS,
+             retention_days=RETENTION_DAYS):
+    created = create_future_partitions(conn, granularity, ahead_days)
+    dropped = drop_expired_partitions(conn, retention_days)
+    return created, dropped
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage sensor_readings partitions")
+    parser.add_argument("action", choices=["migrate", "maintain", "status"])
+    parser.add_argument("--granularity", choices=["daily", "weekly"], default=GRANULARITY)
+    parser.add_argument("--ahead-days", type=int, default=PARTITIONS_AHEAD_DAYS)
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS)
+    parser.add_argument("--every", type=int, help="with maintain: repeat every N seconds")
+    args = parser.parse_args()
+
+    try:
+        if args.action == "status":
+            with connection() as conn:
+                for name, bound, rows in list_partitions(conn):
+                    print(f"[PARTITIONS] {name:<10} < {bound or 'MAXVALUE'}  ~{rows} rows")
+
+        elif args.action == "migrate":
+            with connection() as conn:
+                count = migrate(conn, args.granularity, args.ahead_days)
+            print(f"[PARTITIONS] Created {count} {args.granularity} partitions")
+
+        else:
+            while True:
+                with connection() as conn:
+                    created, dropped = maintain(conn, args.granularity, args.ahead_days, args.retention_days)
+                print(f"[PARTITIONS] Created {len(created)} partitions, dropped {len(dropped)}"
+                      + (f" ({', '.join(dropped)})" if dropped else ""))
+                if not args.every:
+                    break
+                time.sleep(args.every)
+
+    except KeyboardInterrupt:
+        print("\n[PARTITIONS] Stopped.")
+    except Error as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
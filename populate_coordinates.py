@@ -1,20 +1,10 @@
-import mysql.connector
 from geopy.geocoders import Nominatim
 from geopy.exc import GeocoderTimedOut
 import time
 import re
-import os
-from dotenv import load_dotenv
 
-load_dotenv()
-
-# MySQL CONFIG
-DB_CONFIG = {
-    "host": os.getenv("DB_HOST", "127.0.0.1"),
-    "user": os.getenv("DB_USER", "root"),
-    "password": os.getenv("DB_PASSWORD", "5568"),
-    "database": os.getenv("DB_NAME", "jalrakshak")
-}
+from db import get_connection
+from topology import Topology
 
 # Fallback coordinates
 JAIPUR_PHED_COORDS = (26.8997, 75.8048)
@@ -22,9 +12,6 @@ JHOTWARA_COORDS = (26.9392, 75.7562)
 VIDHYADHAR_NAGAR_COORDS = (26.9654, 75.7766)
 MACHEDA_COORDS = (27.0003, 75.7483)
 
-def get_connection():
-    return mysql.connector.connect(**DB_CONFIG)
-
 def clean_name(name):
     if not name:
         return ""
@@ -46,6 +33,9 @@ def populate_coordinates():
     cursor.execute("SELECT node_id, hierarchy_level, pump, zone, colony, latitude, longitude FROM nodes")
     all_nodes = cursor.fetchall()
     
+    # Parent lookup for fallbacks
+    topology = Topology.from_rows(all_nodes)
+
     # Cache for hierarchical fallbacks
     coords_cache = {}
     for n in all_nodes:
@@ -63,7 +53,6 @@ def populate_coordinates():
 
     for node in nodes_to_process:
         node_id = node['node_id']
-        level = node['hierarchy_level']
         
         # Check for abnormal names
         abnormal_keywords = ["DIRECT_SUPPLY", "UWSS", "GLOBAL", "C/O", "G.L."]
@@ -95,13 +84,7 @@ def populate_coordinates():
                 print(f"Found: {location_coords}")
             else:
                 # Fallback to Parent logic
-                parent_key = None
-                if level == 2:
-                    parent_key = f"L1_{node['pump'].replace(' ', '_').upper()}"
-                elif level == 3:
-                    # Try to find L2 parent: Zone + Pump
-                    zp = f"{node['pump']}_{node['zone']}".replace(' ', '_').upper()
-                    parent_key = f"L2_{zp}"
+                parent_key = topology.parent_id(node_id)
                 
                 if parent_key and parent_key in coords_cache:
                     location_coords = coords_cache[parent_key]
@@ -0,0 +1,397 @@
+import os
+import sys
+import time
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+from mysql.connector import Error
+
+from db import connection
+from migrate import upgrade
+from cwqi import compute_cwqi_batch, readings_to_columns
+from cwqi_analyzer import load_profile_assignments
+from sensor_latest import LATEST_COLUMNS
+
+# =========================
+# Downsampled history (1-minute and 1-hour rollups)
+# =========================
+#
+# sensor_rollup_1m and sensor_rollup_1h hold one row per node and bucket
+# with min, max, sum and non-NULL count for every reading column plus
+# CWQI. The job folds in readings above a reading_id watermark
+# (rollup_state) and merges them into existing buckets with
+# ON DUPLICATE KEY UPDATE, so nothing is ever recomputed from scratch.
+# The watermark moves in the same transaction as the rollup rows.
+#
+# AUTO_INCREMENT ids are handed out at insert time, not commit time, so a
+# reading can become visible after a higher id was already folded. The
+# watermark therefore only moves over contiguous ids. A gap is waited on
+# until it is older than ROLLUP_SETTLE_SECONDS: the ids that existed that
+# long ago (the "horizon" row in rollup_state) are settled, and gaps below
+# them are ids whose insert rolled back.
+#
+# history() serves a time range from raw rows, 1-minute or 1-hour buckets,
+# whichever is the finest that stays within the caller's point budget.
+
+# db/migrations/002_sensor_rollups.sql
+MIGRATION_VERSION = 2
+
+READING_COLUMNS = LATEST_COLUMNS[2:]
+ROLLUP_PARAMS = READING_COLUMNS + ("cwqi",)
+AGGREGATES = ("min", "max", "sum", "n")
+ROLLUP_COLUMNS = ("node_id", "bucket", "samples") + tuple(
+    f"{param}_{agg}" for param in ROLLUP_PARAMS for agg in AGGREGATES
+)
+
+# Readings arrive every simulator tick
+RAW_INTERVAL_SECONDS = int(os.getenv("SIM_TICK_SECONDS", "5"))
+# (name, bucket seconds, table), finest first
+RESOLUTIONS = (
+    ("raw", RAW_INTERVAL_SECONDS, "sensor_readings"),
+    ("1m", 60, "sensor_rollup_1m"),
+    ("1h", 3600, "sensor_rollup_1h"),
+)
+ROLLUP_TABLES = {seconds: table for name, seconds, table in RESOLUTIONS if name != "raw"}
+
+ROLLUP_INTERVAL_SECONDS = int(os.getenv("ROLLUP_INTERVAL_SECONDS", "30"))
+ROLLUP_FETCH_LIMIT = int(os.getenv("ROLLUP_FETCH_LIMIT", "50000"))
+# Longest an insert may take to commit after taking its reading_id
+ROLLUP_SETTLE_SECONDS = int(os.getenv("ROLLUP_SETTLE_SECONDS", "60"))
+UPSERT_BATCH_ROWS = 1000
+HISTORY_MAX_POINTS = 2000
+STATE_NAME = "sensor_readings"
+# last_reading_id = newest reading_id when last checked, updated_at = then
+HORIZON_NAME = "sensor_readings:horizon"
+# Buckets are aligned on the naive timestamps as stored
+_EPOCH = datetime(1970, 1, 1)
+
+_READING_SELECT = ", ".join(f"sr.{col}" for col in READING_COLUMNS)
+
+NEW_READINGS_QUERY = f"""
+SELECT sr.reading_id, sr.node_id, n.pump, sr.timestamp, {_READING_SELECT}
+FROM sensor_readings sr
+LEFT JOIN nodes n ON sr.node_id = n.node_id
+WHERE sr.reading_id > %s
+ORDER BY sr.reading_id
+LIMIT %s
+"""
+
+# Range reads are pruned to the matching sensor_readings partitions
+RANGE_READINGS_QUERY = f"""
+SELECT sr.node_id, n.pump, sr.timestamp, {_READING_SELECT}
+FROM sensor_readings sr
+LEFT JOIN nodes n ON sr.node_id = n.node_id
+WHERE sr.timestamp >= %s AND sr.timestamp < %s AND sr.reading_id <= %s
+"""
+
+NODE_READINGS_QUERY = f"""
+SELECT sr.node_id, n.pump, sr.timestamp, {_READING_SELECT}
+FROM sensor_readings sr
+LEFT JOIN nodes n ON sr.node_id = n.node_id
+WHERE sr.node_id = %s AND sr.timestamp >= %s AND sr.timestamp < %s
+ORDER BY sr.timestamp
+"""
+
+INIT_STATE_QUERY = "INSERT IGNORE INTO rollup_state (name, last_reading_id) VALUES (%s, 0)"
+# FOR UPDATE keeps two jobs from folding the same readings twice
+GET_WATERMARK_QUERY = "SELECT last_reading_id FROM rollup_state WHERE name = %s FOR UPDATE"
+SET_WATERMARK_QUERY = "UPDATE rollup_state SET last_reading_id = %s, updated_at = %s WHERE name = %s"
+GET_HORIZON_QUERY = "SELECT last_reading_id, updated_at FROM rollup_state WHERE name = %s"
+MAX_READING_ID_QUERY = "SELECT COALESCE(MAX(reading_id), 0) AS max_id FROM sensor_readings"
+
+
+def _upsert_suffix():
+    """Merges an incoming partial bucket into the stored one."""
+    assignments = ["    samples = samples + VALUES(samples)"]
+    for param in ROLLUP_PARAMS:
+        lo, hi, total, count = (f"{param}_{agg}" for agg in AGGREGATES)
+        # LEAST/GREATEST return NULL if either side is NULL
+        assignments += [
+            f"    {lo} = LEAST(COALESCE({lo}, VALUES({lo})), COALESCE(VALUES({lo}), {lo}))",
+            f"    {hi} = GREATEST(COALESCE({hi}, VALUES({hi})), COALESCE(VALUES({hi}), {hi}))",
+            f"    {total} = {total} + VALUES({total})",
+            f"    {count} = {count} + VALUES({count})",
+        ]
+    return "\nON DUPLICATE KEY UPDATE\n" + ",\n".join(assignments) + "\n"
+
+
+UPSERT_SUFFIX = _upsert_suffix()
+_ROW_PLACEHOLDER = "(" + ", ".join(["%s"] * len(ROLLUP_COLUMNS)) + ")"
+
+
+# -------- AGGREGATION --------
+def score_readings(rows, profiles):
+    """CWQI per raw reading, under each node's pump profile."""
+    default_id, pump_ids = profiles
+    profile_ids = [pump_ids.get(row["pump"], default_id) for row in rows]
+    cwqi, _, _ = compute_cwqi_batch(readings_to_columns(rows), profile_ids=profile_ids)
+    return cwqi
+
+
+def aggregate(rows, cwqi, seconds):
+    """
+    Groups reading rows (dicts with node_id, timestamp and the reading
+    columns) into buckets of `seconds`. Returns tuples in ROLLUP_COLUMNS
+    order, one per (node, bucket).
+    """
+    if not rows:
+        return []
+    node_ids, node_codes = np.unique(np.array([row["node_id"] for row in rows], dtype=object),
+                                     return_inverse=True)
+    epoch = np.array([row["timestamp"] for row in rows], dtype="datetime64[s]").astype(np.int64)
+    buckets = epoch // seconds
+    first = buckets.min()
+    keys = node_codes.astype(np.int64) * (buckets.max() - first + 1) + (buckets - first)
+
+    groups, inverse = np.unique(keys, return_inverse=True)
+    order = np.argsort(inverse, kind="stable")
+    starts = np.searchsorted(inverse[order], np.arange(len(groups)))
+    samples = np.diff(np.append(starts, len(order)))
+
+    values = {col: np.array([row[col] for row in rows], dtype=np.float64) for col in READING_COLUMNS}
+    values["cwqi"] = np.asarray(cwqi, dtype=np.float64)
+
+    out = [
+        node_ids[node_codes[order][starts]].tolist(),
+        (buckets[order][starts] * seconds).astype("datetime64[s]").tolist(),
+        samples.tolist(),
+    ]
+    for param in ROLLUP_PARAMS:
+        v = values[param][order]
+        valid = ~np.isnan(v)
+        lo = np.fmin.reduceat(v, starts)
+        hi = np.fmax.reduceat(v, starts)
+        out += [
+            [None if np.isnan(x) else x for x in lo.tolist()],
+            [None if np.isnan(x) else x for x in hi.tolist()],
+            np.add.reduceat(np.where(valid, v, 0.0), starts).tolist(),
+            np.add.reduceat(valid.astype(np.int64), starts).tolist(),
+        ]
+    return list(zip(*out))
+
+
+def upsert_rollups(cursor, table, rollup_rows):
+    for i in range(0, len(rollup_rows), UPSERT_BATCH_ROWS):
+        chunk = rollup_rows[i:i + UPSERT_BATCH_ROWS]
+        cursor.execute(
+            f"INSERT INTO {table} ({', '.join(ROLLUP_COLUMNS)}) VALUES "
+            + ", ".join([_ROW_PLACEHOLDER] * len(chunk)) + UPSERT_SUFFIX,
+            [v for r in chunk for v in r]
+        )
+    return len(rollup_rows)
+
+
+def fold(cursor, rows, profiles):
+    """Adds raw reading rows to every rollup table. Returns buckets touched."""
+    cwqi = score_readings(rows, profiles)
+    return sum(
+        upsert_rollups(cursor, table, aggregate(rows, cwqi, seconds))
+        for seconds, table in ROLLUP_TABLES.items()
+    )
+
+
+# -------- INCREMENTAL JOB --------
+def settled_reading_id(cursor, now, settle_seconds=ROLLUP_SETTLE_SECONDS):
+    """
+    Highest reading_id whose insert has surely committed or rolled back:
+    the newest id that existed settle_seconds ago, or 0 while the horizon
+    is younger than that. An aged horizon is moved up to the current
+    newest id, so gaps wait at most two settle periods.
+    """
+    cursor.execute(GET_HORIZON_QUERY, (HORIZON_NAME,))
+    horizon = cursor.fetchone()
+    if horizon["updated_at"] is not None and now - horizon["updated_at"] < timedelta(seconds=settle_seconds):
+        return 0
+    settled = horizon["last_reading_id"] if horizon["updated_at"] is not None else 0
+    cursor.execute(MAX_READING_ID_QUERY)
+    cursor.execute(SET_WATERMARK_QUERY, (cursor.fetchone()["max_id"], now, HORIZON_NAME))
+    return settled
+
+
+def ready_count(rows, watermark, settled):
+    """
+    How many of `rows` (in reading_id order, all above the watermark) can
+    be folded: up to the first gap that is not settled yet.
+    """
+    expected = watermark + 1
+    for i, row in enumerate(rows):
+        if row["reading_id"] != expected and row["reading_id"] - 1 > settled:
+            return i
+        expected = row["reading_id"] + 1
+    return len(rows)
+
+
+def roll_up(conn, profiles, fetch_limit=ROLLUP_FETCH_LIMIT, settle_seconds=ROLLUP_SETTLE_SECONDS):
+    """
+    Folds the readings above the watermark into the rollups, one
+    transaction per fetch_limit readings, stopping at a reading_id gap
+    younger than settle_seconds. Returns (readings, buckets).
+    """
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(INIT_STATE_QUERY, (STATE_NAME,))
+    cursor.execute(INIT_STATE_QUERY, (HORIZON_NAME,))
+    conn.commit()
+    settled = settled_reading_id(cursor, datetime.now(), settle_seconds)
+    conn.commit()
+
+    readings = buckets = 0
+    while True:
+        cursor.execute(GET_WATERMARK_QUERY, (STATE_NAME,))
+        watermark = cursor.fetchone()["last_reading_id"]
+        cursor.execute(NEW_READINGS_QUERY, (watermark, fetch_limit))
+        rows = cursor.fetchall()
+        rows = rows[:ready_count(rows, watermark, settled)]
+        if rows:
+            buckets += fold(cursor, rows, profiles)
+            cursor.execute(SET_WATERMARK_QUERY, (rows[-1]["reading_id"], datetime.now(), STATE_NAME))
+        conn.commit()
+        readings += len(rows)
+        if len(rows) < fetch_limit:
+            break
+    cursor.close()
+    return readings, buckets
+
+
+def rebuild(conn, profiles, start, end):
+    """
+    Recomputes the rollups for [start, end), widened to whole hours, from
+    sensor_readings. Only readings at or below the watermark are used, so
+    the incremental job never counts a reading twice. Useful for history
+    loaded before the rollups existed, or after a reading's insert took
+    longer than ROLLUP_SETTLE_SECONDS to commit (run the job first to move the watermark).
+    """
+    start = start.replace(minute=0, second=0, microsecond=0)
+    if end.replace(minute=0, second=0, microsecond=0) != end:
+        end = end.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(INIT_STATE_QUERY, (STATE_NAME,))
+    conn.commit()
+    readings = 0
+    hour = start
+    while hour < end:
+        cursor.execute(GET_WATERMARK_QUERY, (STATE_NAME,))
+        watermark = cursor.fetchone()["last_reading_id"]
+        for table in ROLLUP_TABLES.values():
+            cursor.execute(f"DELETE FROM {table} WHERE bucket >= %s AND bucket < %s",
+                           (hour, hour + timedelta(hours=1)))
+        cursor.execute(RANGE_READINGS_QUERY, (hour, hour + timedelta(hours=1), watermark))
+        rows = cursor.fetchall()
+        if rows:
+            fold(cursor, rows, profiles)
+        conn.commit()
+        readings += len(rows)
+        hour += timedelta(hours=1)
+    cursor.close()
+    return readings
+
+
+# -------- QUERY --------
+def pick_resolution(start, end, max_points=HISTORY_MAX_POINTS):
+    """
+    (name, seconds, table) of the finest resolution giving at most
+    max_points buckets over [start, end); hourly if none does.
+    """
+    span = (end - start).total_seconds()
+    for resolution in RESOLUTIONS:
+        if span / resolution[1] <= max_points:
+            return resolution
+    return RESOLUTIONS[-1]
+
+
+def history(conn, node_id, start, end, max_points=HISTORY_MAX_POINTS, profiles=None):
+    """
+    One node's history over [start, end). Returns (resolution, points);
+    each point has bucket, samples and <param>_min/_max/_mean for every
+    reading column and cwqi. Raw points have samples = 1 and
+    min = max = mean.
+    """
+    name, seconds, table = pick_resolution(start, end, max_points)
+    cursor = conn.cursor(dictionary=True)
+
+    if name == "raw":
+        cursor.execute(NODE_READINGS_QUERY, (node_id, start, end))
+        rows = cursor.fetchall()
+        cursor.close()
+        cwqi = score_readings(rows, profiles or load_profile_assignments()) if rows else []
+        points = []
+        for row, score in zip(rows, np.asarray(cwqi).tolist()):
+            point = {"bucket": row["timestamp"], "samples": 1}
+            for param in ROLLUP_PARAMS:
+                value = score if param == "cwqi" else row[param]
+                point[f"{param}_min"] = point[f"{param}_max"] = point[f"{param}_mean"] = value
+            points.append(point)
+        return name, points
+
+    # The bucket containing `start` is included
+    first_bucket = start - timedelta(seconds=(start - _EPOCH).total_seconds() % seconds)
+    select = ", ".join(
+        f"{param}_min, {param}_max, {param}_sum / NULLIF({param}_n, 0) AS {param}_mean"
+        for param in ROLLUP_PARAMS
+    )
+    cursor.execute(
+        f"SELECT bucket, samples, {select} FROM {table} "
+        f"WHERE node_id = %s AND bucket >= %s AND bucket < %s ORDER BY bucket",
+        (node_id, first_bucket, end)
+    )
+    points = cursor.fetchall()
+    cursor.close()
+    return name, points
+
+
+# -------- SETUP --------
+def migrate(conn):
+    """
+    Brings the schema up to the rollup tables through migrate.py.
+    Returns the versions applied.
+    """
+    return upgrade(conn, MIGRATION_VERSION)
+
+
+def run_rollups(interval_seconds=ROLLUP_INTERVAL_SECONDS):
+    print("[ROLLUP] Rollup job started")
+    profiles = load_profile_assignments()
+    try:
+        while True:
+            start = time.perf_counter()
+            with connection() as conn:
+                readings, buckets = roll_up(conn, profiles)
+            if readings:
+                print(f"[ROLLUP] Folded {readings} readings into {buckets} buckets "
+                      f"in {round((time.perf_counter() - start) * 1000, 1)}ms")
+            time.sleep(interval_seconds)
+    except KeyboardInterrupt:
+        print("\n[ROLLUP] Stopped by user")
+    except Error as e:
+        print("[ERROR]", e)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain sensor_readings rollups")
+    parser.add_argument("action", nargs="?", default="run", choices=["run", "once", "migrate", "rebuild"])
+    parser.add_argument("--since", type=datetime.fromisoformat, help="rebuild: start (ISO time)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="rebuild: end, default now")
+    parser.add_argument("--every", type=int, default=ROLLUP_INTERVAL_SECONDS, help="run: seconds between passes")
+    args = parser.parse_args()
+
+    if args.action == "run":
+        run_rollups(args.every)
+        sys.exit(0)
+
+    try:
+        with connection() as conn:
+            if args.action == "migrate":
+                versions = migrate(conn)
+                print(f"[ROLLUP] Rollup tables ready, {len(versions)} migrations applied")
+            elif args.action == "once":
+                readings, buckets = roll_up(conn, load_profile_assignments())
+                print(f"[ROLLUP] Folded {readings} readings into {buckets} buckets")
+            else:
+                if not args.since:
+                    parser.error("rebuild needs --since")
+                readings = rebuild(conn, load_profile_assignments(), args.since, args.until or datetime.now())
+                print(f"[ROLLUP] Rebuilt rollups from {readings} readings")
+    except Error as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
@@ -15,6 +15,8 @@ NGROK_AUTH_TOKEN = ""
 COMPONENTS = [
     {"name": "Simulator", "cmd": ["python", "sensor_simulator.py"], "cwd": "."},
     {"name": "Analyzer", "cmd": ["python", "cwqi_analyzer.py"], "cwd": "."},
+    {"name": "Rollups", "cmd": ["python", "rollups.py"], "cwd": "."},
+    {"name": "Snapshots", "cmd": ["python", "timetravel.py"], "cwd": "."},
     {"name": "Dashboard", "cmd": ["python", "dashboard/app.py"], "cwd": "."},
 ]
 
@@ -28,7 +30,8 @@ REQUIRED_PACKAGES = [
     "pyvis",
     "geopy",
     "eventlet",
-    "python-dotenv"
+    "python-dotenv",
+    "numpy"
 ]
 
 def install_packages():
@@ -0,0 +1,157 @@
+import sys
+import argparse
+
+# =========================
+# sensor_latest: newest reading per node
+# =========================
+#
+# Ingestion paths call upsert_latest() with the same rows and cursor they
+# use for the sensor_readings insert, before committing, so the two tables
+# never disagree. Readers get current values with a primary key scan
+# instead of a MAX(timestamp) group-by over the whole history.
+
+# db/migrations/001_sensor_latest.sql
+MIGRATION_VERSION = 1
+
+# Column order matches the sensor_readings insert tuples
+LATEST_COLUMNS = (
+    "node_id", "timestamp", "turbidity", "ph", "fluoride", "coliform",
+    "conductivity", "temperature", "dissolved_oxygen", "pressure", "flow_rate"
+)
+
+UPSERT_BATCH_ROWS = 1000
+
+UPSERT_LATEST_PREFIX = f"""
+INSERT INTO sensor_latest ({", ".join(LATEST_COLUMNS)})
+VALUES """
+
+# An older reading arriving late must not overwrite a newer one, so each
+# column only moves when the incoming timestamp is at least as new.
+# timestamp is assigned last because MySQL applies assignments in order.
+UPSERT_LATEST_SUFFIX = "\nON DUPLICATE KEY UPDATE\n" + ",\n".join(
+    f"    {col} = IF(VALUES(timestamp) >= timestamp, VALUES({col}), {col})"
+    for col in LATEST_COLUMNS[2:]
+) + ",\n    timestamp = GREATEST(timestamp, VALUES(timestamp))\n"
+
+_HISTORY_COLUMNS = ", ".join(f"sr.{col}" for col in LATEST_COLUMNS)
+
+# Newest row per node; ties on timestamp go to the highest reading_id
+LATEST_FROM_HISTORY = f"""
+SELECT {_HISTORY_COLUMNS}
+FROM sensor_readings sr
+JOIN (
+    SELECT s.node_id, MAX(s.reading_id) AS reading_id
+    FROM sensor_readings s
+    JOIN (
+        SELECT node_id, MAX(timestamp) AS latest_time
+        FROM sensor_readings
+        GROUP BY node_id
+    ) m ON s.node_id = m.node_id AND s.timestamp = m.latest_time
+    GROUP BY s.node_id
+) latest ON sr.reading_id = latest.reading_id
+"""
+
+REBUILD_QUERY = f"""
+REPLACE INTO sensor_latest ({", ".join(LATEST_COLUMNS)})
+{LATEST_FROM_HISTORY}
+"""
+
+# Nodes whose sensor_latest row is missing or differs from history
+CHECK_QUERY = f"""
+SELECT h.node_id,
+       h.timestamp AS history_time,
+       sl.timestamp AS latest_time
+FROM ({LATEST_FROM_HISTORY}) h
+LEFT JOIN sensor_latest sl ON sl.node_id = h.node_id
+WHERE sl.node_id IS NULL
+   OR sl.timestamp <> h.timestamp
+   OR NOT (sl.turbidity <=> h.turbidity AND sl.ph <=> h.ph
+           AND sl.fluoride <=> h.fluoride AND sl.coliform <=> h.coliform
+           AND sl.conductivity <=> h.conductivity AND sl.temperature <=> h.temperature
+           AND sl.dissolved_oxygen <=> h.dissolved_oxygen AND sl.pressure <=> h.pressure
+           AND sl.flow_rate <=> h.flow_rate)
+"""
+
+# Rows in sensor_latest for nodes without any history
+ORPHAN_QUERY = """
+SELECT sl.node_id
+FROM sensor_latest sl
+LEFT JOIN (SELECT DISTINCT node_id FROM sensor_readings) h ON h.node_id = sl.node_id
+WHERE h.node_id IS NULL
+"""
+
+
+# -------- WRITE PATH --------
+def upsert_latest(cursor, rows):
+    """
+    rows: tuples in LATEST_COLUMNS order, i.e. the sensor_readings insert
+    tuples. Call inside the ingesting transaction, before commit.
+    """
+    for i in range(0, len(rows), UPSERT_BATCH_ROWS):
+        chunk = rows[i:i + UPSERT_BATCH_ROWS]
+        row = "(" + ", ".join(["%s"] * len(LATEST_COLUMNS)) + ")"
+        query = UPSERT_LATEST_PREFIX + ", ".join([row] * len(chunk)) + UPSERT_LATEST_SUFFIX
+        cursor.execute(query, [v for r in chunk for v in r])
+    return len(rows)
+
+
+# -------- MAINTENANCE --------
+def migrate(conn):
+    """
+    Brings the schema up to sensor_latest through migrate.py, which fills
+    it from history on first apply. Returns the versions applied.
+    """
+    from migrate import upgrade
+    return upgrade(conn, MIGRATION_VERSION)
+
+
+def rebuild(conn):
+    """Recomputes every row from sensor_readings. Returns rows affected."""
+    cursor = conn.cursor()
+    cursor.execute(REBUILD_QUERY)
+    written = cursor.rowcount
+    conn.commit()
+    cursor.close()
+    return written
+
+
+def check(conn):
+    """
+    Compares sensor_latest with history.
+    Returns (mismatched_rows, orphan_node_ids).
+    """
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(CHECK_QUERY)
+    mismatched = cursor.fetchall()
+    cursor.execute(ORPHAN_QUERY)
+    orphans = [row["node_id"] for row in cursor.fetchall()]
+    cursor.close()
+    return mismatched, orphans
+
+
+if __name__ == "__main__":
+    # Imported here so the SQLite backend can use this module without MySQL
+    from mysql.connector import Error
+    from db import connection
+
+    parser = argparse.ArgumentParser(description="Maintain the sensor_latest table")
+    parser.add_argument("action", choices=["migrate", "rebuild", "check"])
+    args = parser.parse_args()
+
+    try:
+        with connection() as conn:
+            if args.action == "migrate":
+                versions = migrate(conn)
+                print(f"[LATEST] sensor_latest ready, {len(versions)} migrations applied")
+            elif args.action == "rebuild":
+                print(f"[LATEST] Rebuilt, {rebuild(conn)} rows affected")
+            else:
+                mismatched, orphans = check(conn)
+                for row in mismatched[:20]:
+                    print(f"[LATEST] {row['node_id']}: history={row['history_time']} latest={row['latest_time']}")
+                print(f"[LATEST] {len(mismatched)} mismatched, {len(orphans)} orphaned")
+                if mismatched or orphans:
+                    sys.exit(1)
+    except Error as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
@@ -1,236 +1,429 @@
-import random
+import os
 import time
+import heapq
+import multiprocessing
 from datetime import datetime, timedelta
-import mysql.connector
-from mysql.connector import Error
-from collections import defaultdict
+from itertools import repeat
 
-import os
-from dotenv import load_dotenv
+import numpy as np
+
+from storage import session, STORAGE_ERRORS
+from sensor_latest import LATEST_COLUMNS
+from bulk_writer import BulkWriter
+from sim_log import SimRecorder
+from topology import Topology
+
+# Set SIM_SEED for a reproducible run
+SIM_SEED = os.getenv("SIM_SEED")
+
+# Seconds of simulated time between readings
+TICK_SECONDS = float(os.getenv("SIM_TICK_SECONDS", "5"))
 
-load_dotenv()
+# Virtual clock: unset follows the wall clock. SIM_SPEED=0 runs as fast as
+# the database keeps up, SIM_SPEED=N runs at N x real time. SIM_START and
+# SIM_END (ISO datetimes) bound the simulated period.
+SIM_SPEED = os.getenv("SIM_SPEED")
+SIM_START = os.getenv("SIM_START")
+SIM_END = os.getenv("SIM_END")
 
-# -------- MySQL CONFIG --------
-DB_CONFIG = {
-    "host": os.getenv("DB_HOST", "127.0.0.1"),
-    "user": os.getenv("DB_USER", "root"),
-    "password": os.getenv("DB_PASSWORD", "5568"),
-    "database": os.getenv("DB_NAME", "jalrakshak")
-}
+# SIM_RECORD=run.jrlog records every tick and trigger to a replayable log
+# (see sim_log.py); with SIM_RECORD_ONLY=1 nothing is written to MySQL
+SIM_RECORD = os.getenv("SIM_RECORD")
+SIM_RECORD_ONLY = os.getenv("SIM_RECORD_ONLY", "0") == "1"
+
+SEVERITY_NONE = 0
+SEVERITY_AMBER = 1
+SEVERITY_RED = 2
+SEVERITY_CODES = {"AMBER": SEVERITY_AMBER, "RED": SEVERITY_RED}
+
+# Water takes this long to flow one hop; a contamination lasts CONTAMINATION_ACTIVE
+PROPAGATION_DELAY = timedelta(seconds=20)
+CONTAMINATION_ACTIVE = timedelta(minutes=2)
+
+GLITCH_PROBABILITY = 0.005
+GLITCH_TURBIDITY = 15.0
+
+# Reading columns in insert order, after node_id and timestamp
+READING_COLUMNS = LATEST_COLUMNS[2:]
 
 # -------- GLOBALS --------
-HIERARCHY_MAP = defaultdict(list)  # parent_id -> [child_ids]
 NODE_DETAILS = {}  # node_id -> {level, pump, zone}
-CONTAMINATION_QUEUE = []  # List of {node_id, trigger_time, severity}
-
-# -------- CONNECT --------
-def get_connection():
-    attempts = 0
-    while attempts < 3:
-        try:
-            return mysql.connector.connect(**DB_CONFIG)
-        except Error as e:
-            attempts += 1
-            print(f"[DB] Connection failed (Attempt {attempts}/3): {e}")
-            time.sleep(1)
-    raise Error("Failed to connect to database after 3 attempts")
+TOPOLOGY = Topology([], [], [])  # integer-indexed tree, in NODE_DETAILS order
 
 # -------- BUILD HIERARCHY --------
 def build_hierarchy_map():
-    global HIERARCHY_MAP, NODE_DETAILS
+    global TOPOLOGY
     print("[SIMULATOR] Building Hierarchy Map...")
     try:
-        conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT node_id, hierarchy_level, pump, zone, colony FROM nodes")
-        nodes = cursor.fetchall()
-        
-        # 1. Index all nodes
-        l1_nodes = {}
-        l2_nodes = {}
+        with session() as store:
+            nodes = store.nodes()
         
         for n in nodes:
             NODE_DETAILS[n['node_id']] = n
-            if n['hierarchy_level'] == 1:
-                l1_nodes[n['pump']] = n['node_id']
-            elif n['hierarchy_level'] == 2:
-                key = f"{n['pump']}_{n['zone']}"
-                l2_nodes[key] = n['node_id']
-
-        # 2. Map Parents to Children
-        for n in nodes:
-            if n['hierarchy_level'] == 2:
-                parent_id = l1_nodes.get(n['pump'])
-                if parent_id:
-                    HIERARCHY_MAP[parent_id].append(n['node_id'])
-            
-            elif n['hierarchy_level'] == 3:
-                parent_key = f"{n['pump']}_{n['zone']}"
-                parent_id = l2_nodes.get(parent_key)
-                if parent_id:
-                    HIERARCHY_MAP[parent_id].append(n['node_id'])
+        TOPOLOGY = Topology.from_rows(nodes)
         
-        print(f"[SIMULATOR] Mapped {len(HIERARCHY_MAP)} parent-child relationships.")
-        cursor.close()
-        conn.close()
-    except Error as e:
+        print(f"[SIMULATOR] Mapped {int((TOPOLOGY.parent >= 0).sum())} parent-child relationships.")
+    except STORAGE_ERRORS as e:
         print(f"[ERROR] Failed to build hierarchy: {e}")
 
 # -------- SENSOR GENERATORS --------
-def generate_reading(node_id, level, current_contamination=None):
+class ReadingGenerator:
     """
-    Generates a reading. If current_contamination is set, 
-    values will reflect that severity (AMBER/RED).
+    Generates one tick of readings for every node at once as NumPy
+    columns. Contamination overrides (AMBER/RED) and random glitches are
+    applied as masks, so a tick costs a handful of array draws regardless
+    of network size. Seed the Generator to make runs reproducible.
     """
-    
-    # Base values
-    base = {
-        "turbidity": round(random.uniform(0.3, 2.5), 2),
-        "ph": round(random.uniform(6.8, 7.6), 2),
-        "fluoride": round(random.uniform(0.4, 1.0), 2),
-        "coliform": 0,
-        "conductivity": round(random.uniform(400, 900), 1),
-        "dissolved_oxygen": round(random.uniform(4.5, 7.5), 1)
-    }
-
-    if current_contamination:
-        severity = current_contamination['severity'] # 'AMBER' or 'RED'
-        
-        if severity == 'AMBER':
-            # Slight drift
-            base["turbidity"] = round(random.uniform(4.5, 6.0), 2)
-            base["coliform"] = random.randint(10, 50)
-        elif severity == 'RED':
-            # Major contamination
-            base["turbidity"] = round(random.uniform(10.0, 25.0), 2)
-            base["coliform"] = random.randint(100, 500)
-            base["ph"] = round(random.uniform(5.5, 6.0), 2)
-
-    return {
-        "turbidity": base["turbidity"],
-        "ph": base["ph"],
-        "fluoride": base["fluoride"],
-        "coliform": base["coliform"],
-        "conductivity": base["conductivity"],
-        "temperature": round(random.uniform(24, 32), 1),
-        "dissolved_oxygen": base["dissolved_oxygen"],
-        "pressure": round(random.uniform(1.5, 3.5), 2),
-        "flow_rate": round(random.uniform(8, 25), 1)
-    }
+
+    def __init__(self, node_ids, rng):
+        self.node_ids = list(node_ids)
+        self.rng = rng
+
+    def generate(self, severity):
+        """
+        severity: SEVERITY_* per node.
+        Returns (columns, glitch_count); columns follow READING_COLUMNS.
+        """
+        rng = self.rng
+        n = len(self.node_ids)
+
+        # Base values
+        columns = {
+            "turbidity": rng.uniform(0.3, 2.5, n).round(2),
+            "ph": rng.uniform(6.8, 7.6, n).round(2),
+            "fluoride": rng.uniform(0.4, 1.0, n).round(2),
+            "coliform": np.zeros(n, dtype=np.int64),
+            "conductivity": rng.uniform(400, 900, n).round(1),
+            "temperature": rng.uniform(24, 32, n).round(1),
+            "dissolved_oxygen": rng.uniform(4.5, 7.5, n).round(1),
+            "pressure": rng.uniform(1.5, 3.5, n).round(2),
+            "flow_rate": rng.uniform(8, 25, n).round(1),
+        }
+
+        # Slight drift
+        amber = severity == SEVERITY_AMBER
+        count = int(amber.sum())
+        if count:
+            columns["turbidity"][amber] = rng.uniform(4.5, 6.0, count).round(2)
+            columns["coliform"][amber] = rng.integers(10, 50, count, endpoint=True)
+
+        # Major contamination
+        red = severity == SEVERITY_RED
+        count = int(red.sum())
+        if count:
+            columns["turbidity"][red] = rng.uniform(10.0, 25.0, count).round(2)
+            columns["coliform"][red] = rng.integers(100, 500, count, endpoint=True)
+            columns["ph"][red] = rng.uniform(5.5, 6.0, count).round(2)
+
+        # Tiny chance of random glitch unrelated to flow, only on clean nodes
+        glitch = (severity == SEVERITY_NONE) & (rng.random(n) < GLITCH_PROBABILITY)
+        columns["turbidity"][glitch] = GLITCH_TURBIDITY
+
+        return columns, int(glitch.sum())
+
+    def rows(self, now, columns):
+        """sensor_readings insert tuples (LATEST_COLUMNS order)."""
+        # tolist() hands the connector plain Python ints and floats
+        values = [columns[col].tolist() for col in READING_COLUMNS]
+        return list(zip(self.node_ids, repeat(now, len(self.node_ids)), *values))
 
 # -------- PROPAGATION LOGIC --------
-def process_propagation(now):
+class ContaminationScheduler:
     """
-    Checks the queue for active contaminations.
-    Returns a dict: node_id -> {severity}
+    Time-ordered contamination events over topology node indices.
+
+    Pending triggers sit in a heap keyed on trigger time and active
+    contaminations in a second heap keyed on expiry, so a tick only touches
+    the events that are due. The per-node SEVERITY_* array is updated in
+    place as nodes activate and expire, ready for ReadingGenerator.
     """
-    active_pollution = {}
-    new_queue = []
 
-    for item in CONTAMINATION_QUEUE:
-        if now >= item['trigger_time']:
-            active_pollution[item['node_id']] = item
-            
-            # If this is a fresh trigger (within last 5s), schedule children
-            # We use a flag 'propagated' to avoid rescheduling endlessly
-            if not item.get('propagated'):
-                item['propagated'] = True
-                children = HIERARCHY_MAP.get(item['node_id'], [])
-                for child_id in children:
-                    # Delay: 20 seconds for water to flow
-                    delay = timedelta(seconds=20) 
-                    CONTAMINATION_QUEUE.append({
-                        'node_id': child_id,
-                        'trigger_time': now + delay,
-                        'severity': item['severity'], # Inherit severity
-                        'propagated': False
-                    })
-                    print(f"[PROPAGATION] Scheduled {item['severity']} for {child_id} in 20s")
-            
-            # Keep active for ~2 mins then clear
-            if now < item['trigger_time'] + timedelta(minutes=2):
-                 new_queue.append(item)
-        else:
-            new_queue.append(item) # future event
-            
-    CONTAMINATION_QUEUE[:] = new_queue
-    return active_pollution
+    def __init__(self, topology):
+        self.topology = topology
+        self.severity = np.full(len(topology), SEVERITY_NONE, dtype=np.int8)
+        self.active = {}  # node index -> (severity, expires_at)
+        self._pending = []  # (trigger_time, seq, node, severity)
+        self._expiry = []  # (expires_at, seq, node)
+        self._seq = 0
+
+    def schedule(self, node, trigger_time, severity):
+        self._seq += 1
+        heapq.heappush(self._pending, (trigger_time, self._seq, node, severity))
+
+    def advance(self, now):
+        """Fires due triggers and expires old ones. Returns (fired, expired)."""
+        fired = 0
+        while self._pending and self._pending[0][0] <= now:
+            trigger_time, _, node, severity = heapq.heappop(self._pending)
+            self._activate(node, severity, trigger_time + CONTAMINATION_ACTIVE)
+            fired += 1
+
+            # Children see it after the water has flowed one hop
+            children = self.topology.children_of(node).tolist()
+            for child in children:
+                self.schedule(child, now + PROPAGATION_DELAY, severity)
+            if children:
+                print(f"[PROPAGATION] Scheduled {severity} for {len(children)} nodes below "
+                      f"{self.topology.node_ids[node]} in {PROPAGATION_DELAY.seconds}s")
+
+        expired = 0
+        while self._expiry and self._expiry[0][0] <= now:
+            expires_at, _, node = heapq.heappop(self._expiry)
+            entry = self.active.get(node)
+            # A re-triggered node has a newer expiry; this one is stale
+            if entry and entry[1] == expires_at:
+                del self.active[node]
+                self.severity[node] = SEVERITY_NONE
+                expired += 1
+        return fired, expired
+
+    def _activate(self, node, severity, expires_at):
+        self.active[node] = (severity, expires_at)
+        self._seq += 1
+        heapq.heappush(self._expiry, (expires_at, self._seq, node))
+        self.severity[node] = SEVERITY_CODES[severity]
+
+# -------- CLOCK --------
+class SimClock:
+    """
+    Source of reading timestamps and pacing between ticks.
+
+    With speed=None it follows the wall clock and sleeps TICK_SECONDS, like
+    a deployed sensor. Otherwise time is virtual: every tick advances it by
+    exactly tick_seconds, and the loop waits tick_seconds / speed of real
+    time (or not at all for speed 0). Propagation delays and expiries are
+    measured on this clock, so they scale with it.
+    """
+
+    def __init__(self, tick_seconds=TICK_SECONDS, speed=None, start=None, end=None):
+        self.tick_seconds = tick_seconds
+        self.speed = speed
+        self.virtual = speed is not None
+        self.end = end
+        self._now = start or datetime.now()
+        self._deadline = time.monotonic()
+
+    def now(self):
+        return self._now if self.virtual else datetime.now()
+
+    def finished(self):
+        return self.end is not None and self.now() >= self.end
+
+    def wait(self):
+        if not self.virtual:
+            time.sleep(self.tick_seconds)
+            return
+        self._now += timedelta(seconds=self.tick_seconds)
+        if self.speed:
+            # Pace against a fixed schedule; a slow tick is not made up later
+            self._deadline = max(self._deadline + self.tick_seconds / self.speed, time.monotonic())
+            time.sleep(max(0.0, self._deadline - time.monotonic()))
+
+    @classmethod
+    def from_env(cls):
+        start = datetime.fromisoformat(SIM_START) if SIM_START else None
+        end = datetime.fromisoformat(SIM_END) if SIM_END else None
+        speed = float(SIM_SPEED) if SIM_SPEED else None
+        if speed is None and (start or end):
+            speed = 0.0
+        return cls(TICK_SECONDS, speed, start, end)
 
 # -------- MAIN LOOP --------
-def run_simulator():
-    build_hierarchy_map()
-    
-    INSERT_SENSOR_QUERY = """
-    INSERT INTO sensor_readings (
-        node_id, timestamp, turbidity, ph, fluoride, coliform, 
-        conductivity, temperature, dissolved_oxygen, pressure, flow_rate
-    ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+def spontaneous_trigger(rng, l1_nodes, scheduler, now):
+    """
+    1% chance every cycle to pollute a random L1 node.
+    Returns (node_id, severity) when it fires.
     """
+    if not l1_nodes.size or rng.random() >= 0.01:
+        return None
+    target = int(l1_nodes[rng.integers(l1_nodes.size)])
+    severity = ('AMBER', 'RED')[rng.integers(2)]
+    print(f"\n[TRIGGER] Spontaneous {severity} at {TOPOLOGY.node_ids[target]}!")
+    scheduler.schedule(target, now, severity)  # Immediate
+    return TOPOLOGY.node_ids[target], severity
+
+def run_simulator(clock=None):
+    build_hierarchy_map()
+    clock = clock or SimClock.from_env()
     
+    rng = np.random.default_rng(int(SIM_SEED) if SIM_SEED else None)
+    generator = ReadingGenerator(TOPOLOGY.node_ids, rng)
+    scheduler = ContaminationScheduler(TOPOLOGY)
+    l1_nodes = np.flatnonzero(TOPOLOGY.level == 1)
+    # Inserts run on a background thread so a slow database does not stall ticks
+    writer = None if SIM_RECORD and SIM_RECORD_ONLY else BulkWriter()
+    recorder = None
+    if SIM_RECORD:
+        recorder = SimRecorder(
+            SIM_RECORD,
+            [(n, NODE_DETAILS[n]['hierarchy_level'], NODE_DETAILS[n]['pump']) for n in TOPOLOGY.node_ids],
+            meta={"seed": SIM_SEED, "tick_seconds": clock.tick_seconds}
+        )
+        print(f"[SIMULATOR] Recording to {SIM_RECORD}")
+
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
         print("[SIMULATOR] Running... Press Ctrl+C to stop.")
+        if clock.virtual:
+            pace = f"{clock.speed:g}x real time" if clock.speed else "max speed"
+            print(f"[SIMULATOR] Virtual clock from {clock.now()} at {pace}")
         
-        while True:
-            now = datetime.now()
+        while not clock.finished():
+            now = clock.now()
             
             # 1. Random Spontaneous Trigger (L1 only)
-            # 1% chance every cycle to pollute a random L1 node
-            if random.random() < 0.01:
-                l1_ids = [n for n, d in NODE_DETAILS.items() if d['hierarchy_level'] == 1]
-                if l1_ids:
-                    target = random.choice(l1_ids)
-                    severity = random.choice(['AMBER', 'RED'])
-                    print(f"\n[TRIGGER] Spontaneous {severity} at {target}!")
-                    CONTAMINATION_QUEUE.append({
-                        'node_id': target,
-                        'trigger_time': now, # Immediate
-                        'severity': severity,
-                        'propagated': False
-                    })
+            trigger = spontaneous_trigger(rng, l1_nodes, scheduler, now)
+            if trigger and recorder:
+                recorder.event(*trigger)
 
             # 2. Process Propagation
-            active_pollution = process_propagation(now)
+            scheduler.advance(now)
             
             # 3. Generate Readings
-            batch = []
-            node_ids = list(NODE_DETAILS.keys())
-            
-            for node_id in node_ids:
-                level = NODE_DETAILS[node_id]['hierarchy_level']
-                contamination = active_pollution.get(node_id)
-                
-                # Check normal anomaly chance ONLY if not already receiving simulated pollution
-                if not contamination and random.random() < 0.005: 
-                    # Tiny chance of random glitch unrelated to flow
-                    reading = generate_reading(node_id, level)
-                    # corrupt it manually
-                    reading['turbidity'] = 15.0 
-                else:
-                    reading = generate_reading(node_id, level, contamination)
-                
-                batch.append((
-                    node_id, now,
-                    reading["turbidity"], reading["ph"], reading["fluoride"],
-                    reading["coliform"], reading["conductivity"], reading["temperature"],
-                    reading["dissolved_oxygen"], reading["pressure"], reading["flow_rate"]
-                ))
+            columns, _ = generator.generate(scheduler.severity)
+            if recorder:
+                recorder.write_tick(now, columns)
             
-            cursor.executemany(INSERT_SENSOR_QUERY, batch)
-            conn.commit()
-            print(f"[SIMULATOR] Batch: {len(batch)} readings | Polluted Nodes: {len(active_pollution)}")
+            status = f"[SIMULATOR] Batch: {len(generator.node_ids)} readings | Polluted Nodes: {len(scheduler.active)}"
+            if writer:
+                writer.submit(generator.rows(now, columns))
+                stats = writer.stats()
+                status += f" | Queue: {stats['queue_depth']} | Blocked: {stats['blocked_ms']}ms"
+            if clock.virtual:
+                status += f" | Sim Time: {now}"
+            print(status)
             
-            time.sleep(5)
+            clock.wait()
+
+        print(f"[SIMULATOR] Reached end of simulated period ({clock.end}).")
 
     except KeyboardInterrupt:
         print("\n[SIMULATOR] Stopped.")
-    except Error as e:
+    except STORAGE_ERRORS as e:
         print(f"[ERROR] {e}")
     finally:
-        if conn and conn.is_connected():
-            conn.close()
+        if recorder:
+            recorder.close()
+            print(f"[SIMULATOR] Recorded {recorder.ticks} ticks to {SIM_RECORD}")
+        if writer:
+            print("[SIMULATOR] Flushing writer...")
+            writer.close()
+            print(f"[SIMULATOR] Writer: {writer.stats()}")
+
+# -------- PARALLEL WRITERS --------
+def _writer_worker(node_ids, seed, pipe):
+    """
+    Runs in its own process with its own generator, BulkWriter and
+    connection. Each (now, severity) message from the coordinator is one
+    tick for this worker's nodes; it replies with its writer stats.
+    """
+    generator = ReadingGenerator(node_ids, np.random.default_rng(seed))
+    writer = BulkWriter()
+    try:
+        while True:
+            message = pipe.recv()
+            if message == "stop":
+                break
+            now, severity = message
+            columns, _ = generator.generate(severity)
+            writer.submit(generator.rows(now, columns))
+            pipe.send(writer.stats())
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        writer.close()
+        try:
+            pipe.send(writer.stats())
+        except (BrokenPipeError, OSError):
+            pass
+
+def _throughput(stats, elapsed):
+    return stats["written_rows"] / elapsed if elapsed > 0 else 0.0
+
+def print_worker_throughput(all_stats, elapsed):
+    rates = [_throughput(stats, elapsed) for stats in all_stats]
+    per_worker = " ".join(f"w{i}={rate:,.0f}" for i, rate in enumerate(rates))
+    blocked = sum(stats["blocked_ms"] for stats in all_stats)
+    print(f"[SIMULATOR] Rows/s: {per_worker} | Total: {sum(rates):,.0f} | Blocked: {blocked:.0f}ms")
+
+def run_parallel_simulator(worker_count, clock=None):
+    """
+    Splits the nodes across worker_count writer processes. Triggers and
+    propagation stay in this process on one ContaminationScheduler over
+    the whole topology, so a pump subtree that spans several workers
+    still sees a single, consistent contamination timeline; each worker
+    only receives its slice of the severity array.
+    """
+    build_hierarchy_map()
+    clock = clock or SimClock.from_env()
+    if SIM_RECORD:
+        print("[SIMULATOR] SIM_RECORD is not supported with SIM_WORKERS > 1, not recording")
+
+    # Independent, reproducible streams for the coordinator and each worker
+    seeds = np.random.SeedSequence(int(SIM_SEED) if SIM_SEED else None).spawn(worker_count + 1)
+    rng = np.random.default_rng(seeds[0])
+    scheduler = ContaminationScheduler(TOPOLOGY)
+    l1_nodes = np.flatnonzero(TOPOLOGY.level == 1)
+
+    # Contiguous runs of the Euler tour keep most pump subtrees on one worker
+    shards = np.array_split(TOPOLOGY.order, worker_count)
+    workers = []
+    for shard, seed in zip(shards, seeds[1:]):
+        parent_end, child_end = multiprocessing.Pipe()
+        proc = multiprocessing.Process(
+            target=_writer_worker, args=(TOPOLOGY.ids(shard), seed, child_end), daemon=True
+        )
+        proc.start()
+        # Only the worker may hold its end, or recv() never sees EOF
+        child_end.close()
+        workers.append((proc, parent_end))
+
+    started = time.monotonic()
+    try:
+        print(f"[SIMULATOR] Running with {worker_count} writer processes... Press Ctrl+C to stop.")
+        while not clock.finished():
+            now = clock.now()
+            spontaneous_trigger(rng, l1_nodes, scheduler, now)
+            scheduler.advance(now)
+
+            for shard, (_, pipe) in zip(shards, workers):
+                pipe.send((now, scheduler.severity[shard]))
+            # Waiting for every worker keeps them in lockstep, and a worker
+            # blocked on a full writer queue slows the whole tick down
+            all_stats = [pipe.recv() for _, pipe in workers]
+
+            print(f"[SIMULATOR] Batch: {len(TOPOLOGY)} readings | Polluted Nodes: {len(scheduler.active)}"
+                  + (f" | Sim Time: {now}" if clock.virtual else ""))
+            print_worker_throughput(all_stats, time.monotonic() - started)
+            clock.wait()
+
+        print(f"[SIMULATOR] Reached end of simulated period ({clock.end}).")
+
+    except KeyboardInterrupt:
+        print("\n[SIMULATOR] Stopped.")
+    finally:
+        print("[SIMULATOR] Flushing writers...")
+        final = []
+        for proc, pipe in workers:
+            try:
+                pipe.send("stop")
+            except (BrokenPipeError, OSError):
+                pass
+            # The last message before the worker exits is its post-flush stats
+            stats = None
+            try:
+                while pipe.poll(30):
+                    stats = pipe.recv()
+            except (EOFError, OSError):
+                pass
+            if stats:
+                final.append(stats)
+            proc.join(timeout=30)
+        if final:
+            print_worker_throughput(final, time.monotonic() - started)
 
 if __name__ == "__main__":
-    run_simulator()
+    workers = int(os.getenv("SIM_WORKERS", "1"))
+    if workers > 1:
+        run_parallel_simulator(workers)
+    else:
+        run_simulator()
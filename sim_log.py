@@ -0,0 +1,257 @@
+import sys
+import json
+import time
+import struct
+import argparse
+from datetime import datetime, timedelta, timezone
+from itertools import repeat
+
+import numpy as np
+
+from storage import session
+from bulk_writer import BulkWriter
+from cwqi_analyzer import CWQIAnalyzer, print_report
+from sensor_latest import LATEST_COLUMNS
+
+# =========================
+# Simulation record / replay log
+# =========================
+#
+# A run is stored as one binary file:
+#
+#   MAGIC | uint32 header length | JSON header, padded to 8 bytes
+#   tick records, fixed size: int64 timestamp (us since epoch, naive local
+#       time like sensor_readings.timestamp), then one int16 array per
+#       reading column, scaled to fixed point
+#   footer (on clean close): trigger events as a typed array,
+#       uint64 event count | uint64 tick count | END_MAGIC
+#
+# Every reading column has at most 2 decimals, so fixed point int16 is
+# lossless and a reading takes 18 bytes instead of a ~100 byte SQL row.
+# Tick records are fixed size, so the whole run is memory mapped as one
+# structured array. A log cut short by a crash still opens; only the
+# events are lost.
+
+MAGIC = b"JRSIMLOG"
+END_MAGIC = b"JRSIMEND"
+VERSION = 1
+
+READING_COLUMNS = LATEST_COLUMNS[2:]
+# Fixed point scale per column, matching the decimals the simulator rounds to
+SCALES = {
+    "turbidity": 100, "ph": 100, "fluoride": 100, "coliform": 1,
+    "conductivity": 10, "temperature": 10, "dissolved_oxygen": 10,
+    "pressure": 100, "flow_rate": 10,
+}
+VALUE_DTYPE = np.dtype("<i2")
+_VALUE_LIMIT = np.iinfo(VALUE_DTYPE).max
+
+SEVERITIES = ("AMBER", "RED")
+EVENT_DTYPE = np.dtype([("tick", "<u4"), ("node", "<u4"), ("severity", "u1")])
+_FOOTER = struct.Struct("<QQ8s")
+_EPOCH = datetime(1970, 1, 1)
+
+
+def tick_dtype(node_count):
+    return np.dtype(
+        [("timestamp", "<i8")] + [(col, VALUE_DTYPE, (node_count,)) for col in READING_COLUMNS]
+    )
+
+
+def _to_micros(ts):
+    return (ts - _EPOCH) // timedelta(microseconds=1)
+
+
+def _from_micros(us):
+    return _EPOCH + timedelta(microseconds=int(us))
+
+
+# -------- RECORD --------
+class SimRecorder:
+    """Appends ticks to a log; nodes carry their level and pump for replay."""
+
+    def __init__(self, path, nodes, meta=None):
+        """nodes: [(node_id, hierarchy_level, pump)] in tick column order."""
+        self.path = path
+        self.node_index = {node[0]: i for i, node in enumerate(nodes)}
+        self.dtype = tick_dtype(len(nodes))
+        self.ticks = 0
+        self.events = []
+
+        header = {
+            "version": VERSION,
+            "columns": list(READING_COLUMNS),
+            "scales": [SCALES[col] for col in READING_COLUMNS],
+            "node_ids": [node[0] for node in nodes],
+            "levels": [node[1] for node in nodes],
+            "pumps": [node[2] for node in nodes],
+            "created": datetime.now().isoformat(),
+            "meta": meta or {},
+        }
+        blob = json.dumps(header).encode("utf-8")
+        blob += b" " * (-(len(MAGIC) + 4 + len(blob)) % 8)
+
+        self._file = open(path, "wb")
+        self._file.write(MAGIC + struct.pack("<I", len(blob)) + blob)
+        self._record = np.zeros(1, dtype=self.dtype)
+
+    def event(self, node_id, severity):
+        """A trigger in the tick about to be written."""
+        self.events.append((self.ticks, self.node_index[node_id], SEVERITIES.index(severity)))
+
+    def write_tick(self, timestamp, columns):
+        record = self._record[0]
+        record["timestamp"] = _to_micros(timestamp)
+        for col in READING_COLUMNS:
+            scaled = np.rint(columns[col] * SCALES[col])
+            if scaled.size and np.abs(scaled).max() > _VALUE_LIMIT:
+                raise ValueError(f"{col} out of range for the log's fixed point encoding")
+            record[col] = scaled
+        self._file.write(self._record.tobytes())
+        self.ticks += 1
+
+    def close(self):
+        events = np.array(self.events, dtype=EVENT_DTYPE)
+        self._file.write(events.tobytes())
+        self._file.write(_FOOTER.pack(len(events), self.ticks, END_MAGIC))
+        self._file.close()
+
+
+# -------- READ --------
+class SimLog:
+    """Memory-mapped view of a recorded run."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a simulation log")
+            (header_len,) = struct.unpack("<I", f.read(4))
+            self.header = json.loads(f.read(header_len))
+            data_offset = f.tell()
+            f.seek(0, 2)
+            size = f.tell()
+            f.seek(size - _FOOTER.size)
+            event_count, tick_count, end = _FOOTER.unpack(f.read(_FOOTER.size))
+
+            self.node_ids = self.header["node_ids"]
+            self.dtype = tick_dtype(len(self.node_ids))
+            if end == END_MAGIC:
+                events_offset = data_offset + tick_count * self.dtype.itemsize
+                f.seek(events_offset)
+                self.events = np.frombuffer(f.read(event_count * EVENT_DTYPE.itemsize), dtype=EVENT_DTYPE)
+            else:
+                # Unclean shutdown: keep every complete tick, no events
+                tick_count = (size - data_offset) // self.dtype.itemsize
+                self.events = np.zeros(0, dtype=EVENT_DTYPE)
+
+        self.scales = dict(zip(self.header["columns"], self.header["scales"]))
+        self.ticks = np.memmap(path, dtype=self.dtype, mode="r", offset=data_offset, shape=(tick_count,))
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def timestamp(self, i):
+        return _from_micros(self.ticks[i]["timestamp"])
+
+    def columns(self, i):
+        """Tick i as float columns (coliform as ints)."""
+        record = self.ticks[i]
+        columns = {col: record[col] / self.scales[col] for col in READING_COLUMNS}
+        columns["coliform"] = record["coliform"].astype(np.int64)
+        return columns
+
+    def rows(self, i, timestamp=None):
+        """Tick i as sensor_readings insert tuples."""
+        columns = self.columns(i)
+        values = [columns[col].tolist() for col in READING_COLUMNS]
+        ts = timestamp or self.timestamp(i)
+        return list(zip(self.node_ids, repeat(ts, len(self.node_ids)), *values))
+
+    def readings(self, i):
+        """Tick i shaped like the analyzer's LATEST_READING_QUERY rows."""
+        columns = self.columns(i)
+        values = {col: columns[col].tolist() for col in READING_COLUMNS}
+        return [
+            dict({col: values[col][n] for col in READING_COLUMNS},
+                 node_id=node_id, hierarchy_level=level, pump=pump)
+            for n, (node_id, level, pump) in enumerate(
+                zip(self.node_ids, self.header["levels"], self.header["pumps"]))
+        ]
+
+    def trigger_events(self):
+        """[(timestamp, node_id, severity)] for the recorded triggers."""
+        return [
+            (self.timestamp(int(e["tick"])), self.node_ids[int(e["node"])], SEVERITIES[int(e["severity"])])
+            for e in self.events
+        ]
+
+
+# -------- REPLAY --------
+def _paced(log, speed):
+    """Yields tick indices, sleeping recorded gaps / speed between them (0 = no wait)."""
+    start_wall = time.monotonic()
+    start_ts = log.ticks[0]["timestamp"] if len(log) else 0
+    for i in range(len(log)):
+        if speed:
+            due = start_wall + (log.ticks[i]["timestamp"] - start_ts) / 1e6 / speed
+            time.sleep(max(0.0, due - time.monotonic()))
+        yield i
+
+
+def replay_to_db(log, speed=0.0, shift=False):
+    """
+    Streams the log into sensor_readings through the bulk writer. With
+    shift, timestamps move so the first tick lands at the current time.
+    """
+    offset = datetime.now() - log.timestamp(0) if shift and len(log) else timedelta(0)
+    writer = BulkWriter()
+    try:
+        for i in _paced(log, speed):
+            writer.submit(log.rows(i, log.timestamp(i) + offset))
+    finally:
+        writer.close()
+    return writer.stats()
+
+
+def replay_to_analyzer(log, speed=0.0):
+    """
+    Feeds each tick straight into CWQIAnalyzer, skipping sensor_readings.
+    Statuses and alerts are written as usual, stamped with the recorded
+    tick times in UTC like the live analyzer's. Returns the per-tick
+    reports.
+    """
+    analyzer = CWQIAnalyzer(incremental=False)
+    reports = []
+    for i in _paced(log, speed):
+        with session() as store:
+            report = analyzer.run_tick(
+                store, readings=log.readings(i), now=log.timestamp(i).astimezone(timezone.utc)
+            )
+        print_report(report)
+        reports.append(report)
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect or replay a recorded simulation")
+    parser.add_argument("action", choices=["info", "replay"])
+    parser.add_argument("path")
+    parser.add_argument("--to", choices=["db", "analyzer"], default="db")
+    parser.add_argument("--speed", type=float, default=0.0, help="x real time, 0 = as fast as possible")
+    parser.add_argument("--shift", action="store_true", help="move timestamps so the run starts now")
+    args = parser.parse_args()
+
+    log = SimLog(args.path)
+    if args.action == "info":
+        print(f"[LOG] {args.path}: {len(log)} ticks x {len(log.node_ids)} nodes, "
+              f"{log.dtype.itemsize} bytes per tick")
+        if len(log):
+            print(f"[LOG] {log.timestamp(0)} -> {log.timestamp(len(log) - 1)}")
+        for ts, node_id, severity in log.trigger_events():
+            print(f"[LOG] {ts} {severity} at {node_id}")
+        sys.exit(0)
+
+    if args.to == "db":
+        print(f"[LOG] Replayed into sensor_readings: {replay_to_db(log, args.speed, args.shift)}")
+    else:
+        replay_to_analyzer(log, args.speed)
@@ -0,0 +1,795 @@
+import os
+import sys
+import zlib
+import sqlite3
+import argparse
+import threading
+from datetime import date, datetime, timezone
+from contextlib import contextmanager
+
+try:
+    from mysql.connector import Error
+except ImportError:
+    # SQLite-only installs do not need the MySQL driver
+    Error = None
+
+from sensor_latest import LATEST_COLUMNS, upsert_latest
+
+# =========================
+# Storage backends
+# =========================
+#
+# The analyzer, simulator writer and dashboard talk to a Storage instead
+# of a raw connection:
+#
+#   latest_readings / readings_since / max_reading_id   reads for scoring
+#   insert_readings                                     sensor_readings + sensor_latest
+#   current_statuses / upsert_statuses                  node_status
+#   insert_transitions / transitions_since              node_status_transitions
+#   status_changes_since / latest_status_changes / *snapshot*   time travel
+#   active_alerts / alerts_for / insert_alerts / resolve_alerts
+#   nodes / node_statuses / alerts / latest_sensor_rows  hierarchy and dashboard reads
+#
+# Writes are not committed until commit(), so a caller still decides
+# what one transaction covers. The queries are plain SQL shared by both
+# backends; only the upserts and the bulk insert strategy differ.
+#
+#   STORAGE_BACKEND=mysql   (default) pooled MySQL connections, see db.py
+#   STORAGE_BACKEND=sqlite  one embedded WAL database file, SQLITE_PATH
+#
+# SQLite suits single-box deployments and test rigs: no server, no
+# network round trips. The simulator, analyzer and dashboard processes
+# can share the file; WAL lets readers run alongside the single writer.
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "mysql")  # mysql | sqlite
+SQLITE_PATH = os.getenv("SQLITE_PATH", "jalrakshak.db")
+SEED_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "db", "seed.sql")
+# db/migrations/003_status_transitions.sql
+TRANSITIONS_MIGRATION_VERSION = 3
+
+# Errors either backend can raise
+STORAGE_ERRORS = (Error, sqlite3.Error) if Error else (sqlite3.Error,)
+
+# Rows per multi-row statement
+WRITE_BATCH_ROWS = 1000
+
+
+# -------- SHARDING --------
+# MySQL's CRC32() matches zlib.crc32; SQLite gets the same function
+# registered, so a shard filter selects the same nodes on both backends.
+SHARD_CLAUSE = " AND MOD(CRC32(n.pump), %s) = %s"
+
+
+def shard_query(query, shard):
+    """
+    Fills the {shard} slot of a query. shard is (index, count) or None.
+    Returns (sql, params) with the shard params first, matching their
+    position in the JOIN clause.
+    """
+    if shard is None:
+        return query.format(shard=""), ()
+    index, count = shard
+    return query.format(shard=SHARD_CLAUSE), (count, index)
+
+
+# -------- READ QUERIES --------
+# sensor_latest holds one row per node, kept current by the ingestion
+# paths, so this is a primary key scan whatever the history size.
+LATEST_READING_QUERY = """
+SELECT sl.node_id,
+       n.hierarchy_level,
+       n.pump,
+       sl.turbidity,
+       sl.ph,
+       sl.fluoride,
+       sl.coliform,
+       sl.conductivity,
+       sl.temperature,
+       sl.dissolved_oxygen,
+       sl.pressure
+FROM sensor_latest sl
+JOIN nodes n ON sl.node_id = n.node_id{shard}
+"""
+
+MAX_READING_ID_QUERY = """
+SELECT COALESCE(MAX(reading_id), 0) AS max_id
+FROM sensor_readings
+"""
+
+NEW_READINGS_QUERY = """
+SELECT sr.reading_id,
+       sr.node_id,
+       n.hierarchy_level,
+       n.pump,
+       sr.turbidity,
+       sr.ph,
+       sr.fluoride,
+       sr.coliform,
+       sr.conductivity,
+       sr.temperature,
+       sr.dissolved_oxygen,
+       sr.pressure
+FROM sensor_readings sr
+JOIN nodes n ON sr.node_id = n.node_id{shard}
+WHERE sr.reading_id > %s
+ORDER BY sr.reading_id
+LIMIT %s
+"""
+
+NODES_QUERY = "SELECT node_id, hierarchy_level, pump, zone, colony FROM nodes"
+
+NODE_STATUS_QUERY = """
+SELECT n.node_id, n.hierarchy_level, n.pump, n.zone, n.colony, n.latitude, n.longitude,
+       ns.cwqi, ns.status, ns.reason, ns.last_updated
+FROM nodes n
+LEFT JOIN node_status ns ON n.node_id = ns.node_id
+"""
+
+LATEST_SENSOR_QUERY = f"SELECT {', '.join(LATEST_COLUMNS)} FROM sensor_latest"
+
+CURRENT_STATUS_QUERY = """
+SELECT ns.node_id, ns.cwqi, ns.status, ns.reason, ns.anomaly_detected
+FROM node_status ns
+JOIN nodes n ON ns.node_id = n.node_id{shard}
+"""
+
+# -------- STATUS HISTORY QUERIES --------
+STATUS_CHANGES_SINCE_QUERY = """
+SELECT change_id, node_id, changed_at, cwqi, status, reason, anomaly_detected
+FROM node_status_changes
+WHERE change_id > %s
+ORDER BY change_id
+LIMIT %s
+"""
+
+# Each node's last change in (after_id, upto_id] made at or before a time;
+# the change_id range keeps the scan to one snapshot interval
+LATEST_STATUS_CHANGES_QUERY = """
+SELECT c.change_id, c.node_id, c.changed_at, c.cwqi, c.status, c.reason, c.anomaly_detected
+FROM node_status_changes c
+JOIN (
+    SELECT node_id, MAX(change_id) AS change_id
+    FROM node_status_changes
+    WHERE change_id > %s AND change_id <= %s AND changed_at <= %s
+    GROUP BY node_id
+) last ON c.change_id = last.change_id
+"""
+
+SNAPSHOT_COLUMNS = "snapshot_id, taken_at, last_change_id, nodes, data"
+SNAPSHOT_AT_QUERY = f"""
+SELECT {SNAPSHOT_COLUMNS}
+FROM status_snapshots
+WHERE taken_at <= %s
+ORDER BY snapshot_id DESC
+LIMIT 1
+"""
+LATEST_SNAPSHOT_QUERY = f"SELECT {SNAPSHOT_COLUMNS} FROM status_snapshots ORDER BY snapshot_id DESC LIMIT 1"
+NEXT_SNAPSHOT_QUERY = """
+SELECT last_change_id
+FROM status_snapshots
+WHERE snapshot_id > %s
+ORDER BY snapshot_id
+LIMIT 1
+"""
+FIRST_CHANGE_QUERY = "SELECT MIN(change_id) AS first_id FROM node_status_changes"
+
+TRANSITIONS_SINCE_QUERY = """
+SELECT transition_id, node_id, changed_at, from_status, to_status, cwqi
+FROM node_status_transitions
+WHERE transition_id > %s
+ORDER BY transition_id
+LIMIT %s
+"""
+
+
+# -------- ALERT QUERIES --------
+GET_ACTIVE_ALERTS_QUERY = """
+SELECT a.node_id, a.alert_id, a.alert_level
+FROM alerts a
+JOIN nodes n ON a.node_id = n.node_id{shard}
+WHERE a.is_active = 1
+"""
+
+GET_ALERT_IDS_PREFIX = """
+SELECT node_id, alert_id, alert_level
+FROM alerts
+WHERE is_active = 1 AND node_id IN """
+
+ACTIVE_ALERTS_LIST_QUERY = """
+SELECT alert_id, node_id, hierarchy_level, alert_level, cwqi_value, reason, detected_at, is_active
+FROM alerts
+WHERE is_active = 1
+ORDER BY detected_at DESC
+"""
+
+RESOLVED_ALERTS_LIST_QUERY = """
+SELECT alert_id, node_id, hierarchy_level, alert_level, cwqi_value, reason, detected_at, resolved_at, is_active
+FROM alerts
+WHERE is_active = 0
+ORDER BY resolved_at DESC
+LIMIT %s
+"""
+
+INSERT_ALERTS_PREFIX = """
+INSERT INTO alerts (
+    node_id, hierarchy_level, alert_level, cwqi_value,
+    reason, detected_at, is_active
+) VALUES """
+
+RESOLVE_ALERTS_PREFIX = """
+UPDATE alerts
+SET is_active = 0, resolved_at = %s
+WHERE is_active = 1 AND node_id IN """
+
+
+# -------- WRITE QUERIES --------
+INSERT_READINGS_PREFIX = f"INSERT INTO sensor_readings ({', '.join(LATEST_COLUMNS)}) VALUES "
+
+UPSERT_STATUS_PREFIX = """
+INSERT INTO node_status (
+    node_id,
+    last_updated,
+    cwqi,
+    status,
+    reason,
+    anomaly_detected
+)
+VALUES """
+
+INSERT_TRANSITIONS_PREFIX = """
+INSERT INTO node_status_transitions (
+    node_id, changed_at, from_status, to_status, cwqi
+) VALUES """
+
+INSERT_STATUS_CHANGES_PREFIX = """
+INSERT INTO node_status_changes (
+    node_id, changed_at, cwqi, status, reason, anomaly_detected
+) VALUES """
+
+BACKFILL_STATUS_CHANGES_QUERY = """
+INSERT INTO node_status_changes (node_id, changed_at, cwqi, status, reason, anomaly_detected)
+SELECT node_id, last_updated, cwqi, status, reason, anomaly_detected
+FROM node_status
+ORDER BY last_updated
+"""
+
+INSERT_SNAPSHOT_PREFIX = "INSERT INTO status_snapshots (taken_at, last_change_id, nodes, data) VALUES "
+
+STATUS_UPDATE_COLUMNS = ("last_updated", "cwqi", "status", "reason", "anomaly_detected")
+
+MYSQL_UPSERT_STATUS_SUFFIX = "\nON DUPLICATE KEY UPDATE\n" + ",\n".join(
+    f"    {col} = VALUES({col})" for col in STATUS_UPDATE_COLUMNS
+) + "\n"
+
+SQLITE_UPSERT_STATUS_SUFFIX = "\nON CONFLICT (node_id) DO UPDATE SET\n" + ",\n".join(
+    f"    {col} = excluded.{col}" for col in STATUS_UPDATE_COLUMNS
+) + "\n"
+
+# Same rule as sensor_latest.UPSERT_LATEST_SUFFIX: an older reading never
+# overwrites a newer one. SQLite evaluates every SET against the old row,
+# so the order of the assignments does not matter here.
+SQLITE_UPSERT_LATEST = (
+    f"INSERT INTO sensor_latest ({', '.join(LATEST_COLUMNS)}) VALUES "
+    "(" + ", ".join(["?"] * len(LATEST_COLUMNS)) + ")"
+    "\nON CONFLICT (node_id) DO UPDATE SET\n" + ",\n".join(
+        f"    {col} = CASE WHEN excluded.timestamp >= timestamp THEN excluded.{col} ELSE {col} END"
+        for col in LATEST_COLUMNS[2:]
+    ) + ",\n    timestamp = MAX(timestamp, excluded.timestamp)\n"
+)
+
+
+def _chunks(rows):
+    for i in range(0, len(rows), WRITE_BATCH_ROWS):
+        yield rows[i:i + WRITE_BATCH_ROWS]
+
+
+def _placeholders(count, width):
+    row = "(" + ", ".join(["%s"] * width) + ")"
+    return ", ".join([row] * count)
+
+
+def _in_list(count):
+    return "(" + ", ".join(["%s"] * count) + ")"
+
+
+# -------- INTERFACE --------
+class Storage:
+    """
+    Shared queries over the primitives each backend provides: _fetchall,
+    _execute (returns rowcount), _insert_rows, commit and rollback.
+    Queries are written with %s placeholders.
+    """
+
+    backend = None
+    upsert_status_suffix = ""
+
+    # -------- BACKEND PRIMITIVES --------
+    def _fetchall(self, query, params=()):
+        raise NotImplementedError
+
+    def _execute(self, query, params=()):
+        raise NotImplementedError
+
+    def _insert_rows(self, prefix, rows, width, suffix=""):
+        """INSERT prefix + one (%s, ...) group per row + suffix."""
+        raise NotImplementedError
+
+    def insert_readings(self, rows):
+        """
+        rows: sensor_readings insert tuples (LATEST_COLUMNS order); also
+        upserts sensor_latest. Returns statements issued.
+        """
+        raise NotImplementedError
+
+    def commit(self):
+        raise NotImplementedError
+
+    def rollback(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    # -------- READINGS --------
+    def latest_readings(self, shard=None):
+        """Newest reading per node, with hierarchy_level and pump."""
+        return self._fetchall(*shard_query(LATEST_READING_QUERY, shard))
+
+    def max_reading_id(self):
+        return self._fetchall(MAX_READING_ID_QUERY)[0]["max_id"]
+
+    def readings_since(self, reading_id, limit, shard=None):
+        query, shard_params = shard_query(NEW_READINGS_QUERY, shard)
+        return self._fetchall(query, shard_params + (reading_id, limit))
+
+    # -------- STATUS --------
+    def current_statuses(self, shard=None):
+        """node_id -> (cwqi, status, reason, anomaly) as stored in node_status."""
+        return {
+            row["node_id"]: (row["cwqi"], row["status"], row["reason"], bool(row["anomaly_detected"]))
+            for row in self._fetchall(*shard_query(CURRENT_STATUS_QUERY, shard))
+        }
+
+    def upsert_statuses(self, status_rows):
+        """
+        status_rows: (node_id, last_updated, cwqi, status, reason, anomaly);
+        also appended to node_status_changes.
+        """
+        self._insert_rows(UPSERT_STATUS_PREFIX, status_rows, 6, self.upsert_status_suffix)
+        self._insert_rows(INSERT_STATUS_CHANGES_PREFIX, status_rows, 6)
+        return len(status_rows)
+
+    def insert_transitions(self, transition_rows):
+        """transition_rows: (node_id, changed_at, from_status, to_status, cwqi)"""
+        self._insert_rows(INSERT_TRANSITIONS_PREFIX, transition_rows, 5)
+        return len(transition_rows)
+
+    def transitions_since(self, transition_id=0, limit=1000):
+        """Status transitions after transition_id, oldest first."""
+        return self._fetchall(TRANSITIONS_SINCE_QUERY, (transition_id, limit))
+
+    # -------- STATUS HISTORY --------
+    def status_changes_since(self, change_id, limit):
+        return self._fetchall(STATUS_CHANGES_SINCE_QUERY, (change_id, limit))
+
+    def latest_status_changes(self, after_id, upto_id, at):
+        """Each node's last change with after_id < change_id <= upto_id at or before `at`."""
+        return self._fetchall(LATEST_STATUS_CHANGES_QUERY, (after_id, upto_id, at))
+
+    def snapshot_at(self, at=None):
+        """Newest snapshot taken at or before `at` (None: the newest), or None."""
+        rows = self._fetchall(SNAPSHOT_AT_QUERY, (at,)) if at else self._fetchall(LATEST_SNAPSHOT_QUERY)
+        return rows[0] if rows else None
+
+    def next_snapshot_change_id(self, snapshot_id):
+        """last_change_id of the snapshot after snapshot_id, or None."""
+        rows = self._fetchall(NEXT_SNAPSHOT_QUERY, (snapshot_id,))
+        return rows[0]["last_change_id"] if rows else None
+
+    def insert_snapshot(self, taken_at, last_change_id, nodes, data):
+        self._insert_rows(INSERT_SNAPSHOT_PREFIX, [(taken_at, last_change_id, nodes, data)], 4)
+
+    def prune_status_history(self, keep_snapshot):
+        """
+        Drops snapshots older than keep_snapshot and the changes it already
+        contains. Returns (snapshots, changes) deleted.
+        """
+        snapshots = self._execute("DELETE FROM status_snapshots WHERE snapshot_id < %s",
+                                  (keep_snapshot["snapshot_id"],))
+        changes = self._execute("DELETE FROM node_status_changes WHERE change_id <= %s",
+                                (keep_snapshot["last_change_id"],))
+        return snapshots, changes
+
+    def backfill_status_changes(self):
+        """Seeds an empty node_status_changes from node_status. Returns rows added."""
+        if self._fetchall(FIRST_CHANGE_QUERY)[0]["first_id"] is not None:
+            return 0
+        return self._execute(BACKFILL_STATUS_CHANGES_QUERY)
+
+    # -------- ALERTS --------
+    @staticmethod
+    def _alert_map(rows):
+        return {row["node_id"]: (row["alert_id"], row["alert_level"]) for row in rows}
+
+    def active_alerts(self, shard=None):
+        """node_id -> (alert_id, alert_level) for every open alert."""
+        return self._alert_map(self._fetchall(*shard_query(GET_ACTIVE_ALERTS_QUERY, shard)))
+
+    def alerts_for(self, node_ids):
+        """Same mapping for the open alerts of the given nodes."""
+        alerts = {}
+        for chunk in _chunks(node_ids):
+            alerts.update(self._alert_map(
+                self._fetchall(GET_ALERT_IDS_PREFIX + _in_list(len(chunk)), tuple(chunk))
+            ))
+        return alerts
+
+    def insert_alerts(self, alert_rows):
+        """alert_rows: (node_id, hierarchy_level, alert_level, cwqi, reason, detected_at)"""
+        self._insert_rows(INSERT_ALERTS_PREFIX, [row + (1,) for row in alert_rows], 7)
+        return len(alert_rows)
+
+    def resolve_alerts(self, node_ids, now):
+        """Resolves every active alert of the given nodes."""
+        resolved = 0
+        for chunk in _chunks(node_ids):
+            resolved += self._execute(RESOLVE_ALERTS_PREFIX + _in_list(len(chunk)), (now,) + tuple(chunk))
+        return resolved
+
+    # -------- HIERARCHY / DASHBOARD --------
+    def nodes(self):
+        return self._fetchall(NODES_QUERY)
+
+    def node_statuses(self):
+        return self._fetchall(NODE_STATUS_QUERY)
+
+    def alerts(self, resolved_limit=10):
+        return {
+            "active": self._fetchall(ACTIVE_ALERTS_LIST_QUERY),
+            "resolved": self._fetchall(RESOLVED_ALERTS_LIST_QUERY, (resolved_limit,)),
+        }
+
+    def latest_sensor_rows(self):
+        return self._fetchall(LATEST_SENSOR_QUERY)
+
+
+# -------- MYSQL --------
+class MySQLStorage(Storage):
+    """
+    Wraps one connection (usually borrowed from the pool). Bulk writes use
+    multi-row statements of rows_per_statement rows, or LOAD DATA LOCAL
+    INFILE chunks with load_chunk set (see bulk_writer.py).
+    """
+
+    backend = "mysql"
+    upsert_status_suffix = MYSQL_UPSERT_STATUS_SUFFIX
+
+    def __init__(self, conn, rows_per_statement=WRITE_BATCH_ROWS, load_chunk=None):
+        self.conn = conn
+        self.cursor = conn.cursor(dictionary=True)
+        self.rows_per_statement = rows_per_statement
+        self.load_chunk = load_chunk
+
+    def _fetchall(self, query, params=()):
+        self.cursor.execute(query, params or None)
+        return self.cursor.fetchall()
+
+    def _execute(self, query, params=()):
+        self.cursor.execute(query, params or None)
+        return self.cursor.rowcount
+
+    def _insert_rows(self, prefix, rows, width, suffix=""):
+        for i in range(0, len(rows), self.rows_per_statement):
+            chunk = rows[i:i + self.rows_per_statement]
+            self.cursor.execute(prefix + _placeholders(len(chunk), width) + suffix,
+                                [v for row in chunk for v in row])
+
+    def insert_readings(self, rows):
+        statements = 0
+        for i in range(0, len(rows), self.rows_per_statement):
+            chunk = rows[i:i + self.rows_per_statement]
+            if self.load_chunk:
+                self.load_chunk(self.cursor, chunk)
+            else:
+                self.cursor.execute(INSERT_READINGS_PREFIX + _placeholders(len(chunk), len(LATEST_COLUMNS)),
+                                    [v for r in chunk for v in r])
+            statements += 1
+        upsert_latest(self.cursor, rows)
+        return statements
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.cursor.close()
+
+
+# -------- SQLITE --------
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    node_id TEXT PRIMARY KEY,
+    hierarchy_level INTEGER NOT NULL,
+    pump TEXT NOT NULL,
+    zone TEXT,
+    colony TEXT,
+    installed_on DATE,
+    latitude REAL,
+    longitude REAL,
+    status TEXT DEFAULT 'GREEN',
+    last_updated DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS sensor_readings (
+    reading_id INTEGER PRIMARY KEY,
+    node_id TEXT NOT NULL,
+    timestamp DATETIME NOT NULL,
+    turbidity REAL,
+    ph REAL,
+    fluoride REAL,
+    coliform INTEGER,
+    conductivity REAL,
+    temperature REAL,
+    dissolved_oxygen REAL,
+    pressure REAL,
+    flow_rate REAL
+);
+CREATE INDEX IF NOT EXISTS idx_node_time ON sensor_readings (node_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_time ON sensor_readings (timestamp);
+
+CREATE TABLE IF NOT EXISTS sensor_latest (
+    node_id TEXT PRIMARY KEY,
+    timestamp DATETIME NOT NULL,
+    turbidity REAL,
+    ph REAL,
+    fluoride REAL,
+    coliform INTEGER,
+    conductivity REAL,
+    temperature REAL,
+    dissolved_oxygen REAL,
+    pressure REAL,
+    flow_rate REAL
+);
+
+CREATE TABLE IF NOT EXISTS node_status (
+    node_id TEXT PRIMARY KEY,
+    last_updated DATETIME NOT NULL,
+    cwqi REAL NOT NULL,
+    status TEXT NOT NULL,
+    reason TEXT,
+    anomaly_detected INTEGER DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS node_status_changes (
+    change_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    node_id TEXT NOT NULL,
+    changed_at DATETIME NOT NULL,
+    cwqi REAL NOT NULL,
+    status TEXT NOT NULL,
+    reason TEXT,
+    anomaly_detected INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_status_changed ON node_status_changes (changed_at);
+
+CREATE TABLE IF NOT EXISTS status_snapshots (
+    snapshot_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    taken_at DATETIME NOT NULL,
+    last_change_id INTEGER NOT NULL,
+    nodes INTEGER NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_taken ON status_snapshots (taken_at);
+
+CREATE TABLE IF NOT EXISTS node_status_transitions (
+    transition_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    node_id TEXT NOT NULL,
+    changed_at DATETIME NOT NULL,
+    from_status TEXT,
+    to_status TEXT NOT NULL,
+    cwqi REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_node_changed ON node_status_transitions (node_id, changed_at);
+CREATE INDEX IF NOT EXISTS idx_changed ON node_status_transitions (changed_at);
+
+CREATE TABLE IF NOT EXISTS alerts (
+    alert_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    node_id TEXT NOT NULL,
+    hierarchy_level INTEGER NOT NULL,
+    alert_level TEXT NOT NULL,
+    cwqi_value REAL NOT NULL,
+    reason TEXT,
+    detected_at DATETIME NOT NULL,
+    resolved_at DATETIME,
+    is_active INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS idx_node_active ON alerts (node_id, is_active);
+CREATE INDEX IF NOT EXISTS idx_active_detected ON alerts (is_active, detected_at);
+CREATE INDEX IF NOT EXISTS idx_active_resolved ON alerts (is_active, resolved_at);
+CREATE INDEX IF NOT EXISTS idx_active_node ON alerts (is_active, node_id, alert_level);
+"""
+
+# Tuned for a high insert rate from one writer: WAL so readers never
+# block it, fsync only at checkpoints (a crash can lose the last commits
+# but never corrupts the file), a 64 MB page cache and memory-mapped reads.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA mmap_size = 268435456",
+    "PRAGMA busy_timeout = 10000",
+)
+
+def _naive_utc(ts):
+    # MySQL DATETIME keeps the digits and drops the offset; store aware
+    # values the same way so both backends compare like with like
+    return ts.astimezone(timezone.utc).replace(tzinfo=None) if ts.tzinfo else ts
+
+
+sqlite3.register_adapter(datetime, lambda ts: _naive_utc(ts).isoformat(" "))
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_converter("DATETIME", lambda raw: _naive_utc(datetime.fromisoformat(raw.decode())))
+sqlite3.register_converter("DATE", lambda raw: date.fromisoformat(raw.decode()))
+
+
+def _dict_row(cursor, row):
+    return {col[0]: value for col, value in zip(cursor.description, row)}
+
+
+class SQLiteStorage(Storage):
+    """
+    One embedded database file in WAL mode. A connection belongs to the
+    thread that opened it; use session() to get the current thread's.
+    """
+
+    backend = "sqlite"
+    upsert_status_suffix = SQLITE_UPSERT_STATUS_SUFFIX
+
+    def __init__(self, path=SQLITE_PATH):
+        self.path = path
+        self.conn = sqlite3.connect(path, detect_types=sqlite3.PARSE_DECLTYPES)
+        self.conn.row_factory = _dict_row
+        self.conn.create_function("CRC32", 1, lambda s: zlib.crc32(s.encode("utf-8")), deterministic=True)
+        self.conn.create_function("MOD", 2, lambda a, b: a % b, deterministic=True)
+        for pragma in SQLITE_PRAGMAS:
+            self.conn.execute(pragma)
+        self.conn.executescript(SQLITE_SCHEMA)
+
+    def _fetchall(self, query, params=()):
+        return self.conn.execute(query.replace("%s", "?"), params).fetchall()
+
+    def _execute(self, query, params=()):
+        return self.conn.execute(query.replace("%s", "?"), params).rowcount
+
+    def _insert_rows(self, prefix, rows, width, suffix=""):
+        # executemany reuses one prepared statement for every row
+        if rows:
+            query = prefix + "(" + ", ".join(["?"] * width) + ")" + suffix
+            self.conn.executemany(query, rows)
+
+    def insert_readings(self, rows):
+        if not rows:
+            return 0
+        self._insert_rows(INSERT_READINGS_PREFIX, rows, len(LATEST_COLUMNS))
+        self.conn.executemany(SQLITE_UPSERT_LATEST, rows)
+        return 2
+
+    def commit(self):
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def close(self):
+        self.conn.close()
+
+    # -------- SETUP --------
+    def load_seed(self, path=SEED_FILE):
+        """
+        Loads the nodes and node_status rows from the MySQL seed dump; its
+        REPLACE INTO statements are valid SQLite as they are.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            statements = f.read().split(";\n")
+        loaded = 0
+        for statement in statements:
+            statement = statement.strip()
+            if statement.startswith("REPLACE INTO"):
+                loaded += self.conn.execute(statement).rowcount
+        self.commit()
+        return loaded
+
+    def load_nodes(self, nodes):
+        """Tuples from network_generator.generate_network."""
+        from network_generator import NODE_COLUMNS
+        self._insert_rows(f"INSERT OR REPLACE INTO nodes ({', '.join(NODE_COLUMNS)}) VALUES ",
+                          nodes, len(NODE_COLUMNS))
+        self.commit()
+        return len(nodes)
+
+
+# -------- MYSQL SETUP --------
+def migrate(conn):
+    """
+    Brings an existing MySQL database up to node_status_transitions
+    through migrate.py. Returns the versions applied.
+    """
+    from migrate import upgrade
+    return upgrade(conn, TRANSITIONS_MIGRATION_VERSION)
+
+
+# -------- SESSIONS --------
+_local = threading.local()
+
+
+def _thread_sqlite():
+    """This thread's SQLiteStorage, reopened after a fork."""
+    store = getattr(_local, "store", None)
+    if store is None or getattr(_local, "pid", None) != os.getpid():
+        store = SQLiteStorage(SQLITE_PATH)
+        _local.store, _local.pid = store, os.getpid()
+    return store
+
+
+@contextmanager
+def session(backend=None):
+    """
+    Storage for one unit of work on the configured backend. MySQL borrows
+    a pooled connection for the duration; SQLite reuses the thread's
+    connection. Commit explicitly. If the body raises, its uncommitted
+    writes are rolled back on both backends (the pool does it for MySQL).
+    """
+    if (backend or STORAGE_BACKEND) == "sqlite":
+        store = _thread_sqlite()
+        try:
+            yield store
+        except BaseException:
+            store.rollback()
+            raise
+        return
+
+    from db import connection
+    with connection() as conn:
+        store = MySQLStorage(conn)
+        try:
+            yield store
+        finally:
+            store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Set up an embedded SQLite database, or migrate MySQL")
+    parser.add_argument("action", choices=["init", "migrate"])
+    parser.add_argument("--path", default=SQLITE_PATH)
+    parser.add_argument("--seed", default=SEED_FILE, help="MySQL seed dump with the nodes")
+    parser.add_argument("--synthetic", type=int, help="generate about N nodes instead of the seed")
+    args = parser.parse_args()
+
+    if args.action == "migrate":
+        from db import connection
+        try:
+            with connection() as conn:
+                versions = migrate(conn)
+            print(f"[STORAGE] node_status_transitions ready, {len(versions)} migrations applied")
+        except STORAGE_ERRORS as e:
+            print(f"[ERROR] {e}")
+            sys.exit(1)
+        sys.exit(0)
+
+    try:
+        store = SQLiteStorage(args.path)
+        if args.synthetic:
+            from network_generator import generate_network
+            print(f"[STORAGE] Loaded {store.load_nodes(generate_network(args.synthetic))} synthetic nodes")
+        else:
+            print(f"[STORAGE] Loaded {store.load_seed(args.seed)} rows from {args.seed}")
+        # Baseline for point-in-time lookups (timetravel.py)
+        store.backfill_status_changes()
+        store.commit()
+        store.close()
+        print(f"[STORAGE] {args.path} ready; run with STORAGE_BACKEND=sqlite SQLITE_PATH={args.path}")
+    except sqlite3.Error as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
@@ -0,0 +1,87 @@
+import csv
+import io
+import threading
+from datetime import datetime
+
+import bulk_writer
+from bulk_writer import BulkWriter
+from sensor_latest import LATEST_COLUMNS
+from storage import SQLiteStorage
+
+
+class CapturingCursor:
+    """Reads the LOAD DATA file before _load_chunk deletes it."""
+
+    def execute(self, query, params):
+        self.query = query
+        with open(params[0], "r", newline="", encoding="utf-8") as f:
+            self.data = f.read()
+
+
+def _load_data_rows(data):
+    """Parses a file the way FIELDS ... OPTIONALLY ENCLOSED BY '"' does, \\N as NULL."""
+    return [
+        [None if field == "\\N" else field for field in row]
+        for row in csv.reader(io.StringIO(data), delimiter=",", quotechar='"')
+    ]
+
+
+def test_load_chunk_round_trips_commas_and_nulls():
+    node_id = "L3_BANIPARK_DIRECT_BOOSTING_ST_ROAD,NASIA,SECTOR 2"
+    row = (node_id, datetime(2026, 1, 1, 0, 0, 5), 1.5, 7.1, 0.4, 0, 450.0, 25.0, 6.5, 2.5, None)
+    assert len(row) == len(LATEST_COLUMNS)
+
+    cursor = CapturingCursor()
+    BulkWriter._load_chunk(cursor, [row])
+
+    assert "OPTIONALLY ENCLOSED BY '\"'" in cursor.query
+    assert "LINES TERMINATED BY '\\n'" in cursor.query
+    assert cursor.data.endswith("\n") and "\r" not in cursor.data
+
+    (loaded,) = _load_data_rows(cursor.data)
+    assert len(loaded) == len(LATEST_COLUMNS)
+    assert loaded[0] == node_id
+    assert loaded[1] == "2026-01-01 00:00:05"
+    assert loaded[-1] is None
+
+
+class FailingSQLiteStorage(SQLiteStorage):
+    """Raises a non-database error for ticks from node "BAD"."""
+
+    def insert_readings(self, rows):
+        if rows[0][0] == "BAD":
+            raise TypeError("bad row")
+        return super().insert_readings(rows)
+
+
+def _reading(node_id):
+    return (node_id, datetime(2026, 1, 1), 1.5, 7.1, 0.4, 0, 450.0, 25.0, 6.5, 2.5, 1.0)
+
+
+def test_writer_survives_non_database_errors(tmp_path, monkeypatch):
+    path = str(tmp_path / "writer.db")
+    monkeypatch.setattr(bulk_writer, "SQLITE_PATH", path)
+    monkeypatch.setattr(bulk_writer, "SQLiteStorage", FailingSQLiteStorage)
+
+    writer = BulkWriter(backend="sqlite", queue_ticks=1)
+
+    def produce():
+        for node_id in ("N1", "BAD", "N2", "N3"):
+            writer.submit([_reading(node_id)])
+        writer.flush()
+
+    # A dead writer thread would leave submit() and flush() blocked forever
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    producer.join(timeout=10)
+    assert not producer.is_alive()
+
+    stats = writer.stats()
+    writer.close()
+    assert stats["written_rows"] == 3
+    assert stats["failed_rows"] == 1 and stats["failed_ticks"] == 1
+
+    store = SQLiteStorage(path)
+    written = store._fetchall("SELECT node_id FROM sensor_readings ORDER BY reading_id")
+    store.close()
+    assert [row["node_id"] for row in written] == ["N1", "N2", "N3"]
@@ -0,0 +1,164 @@
+import copy
+import random
+
+import numpy as np
+import pytest
+
+from cwqi import (
+    BIS_PROFILE, PROFILES, READING_KEYS, STATUS_NAMES, CWQICache, _round2,
+    compute_cwqi, compute_cwqi_batch, profile_id, readings_to_columns,
+    reason_text, register_profile,
+)
+
+# Values on or next to every breakpoint of the BIS curves
+EDGES = {
+    "turbidity": [0, 1, 1.005, 5, 3.33],
+    "ph": [6.5, 6.49, 8.5, 8.51, 7, 5, 9],
+    "fluoride": [1.0, 1.5, 1.2, 1.505],
+    "coliform": [0, 10, 11, -1, 5],
+    "conductivity": [500, 1500, 777.7, 500.05],
+    "temperature": [20, 19.99, 30, 35, 10, -5],
+    "dissolved_oxygen": [4, 6, 5.05, 3.99],
+    "pressure": [1, 2, 5, 6, 0.5, 5.5, 5.01],
+}
+RANGES = {
+    "turbidity": (-1, 30), "ph": (3, 11), "fluoride": (0, 3), "coliform": (-2, 40),
+    "conductivity": (0, 2500), "temperature": (-10, 45), "dissolved_oxygen": (0, 10),
+    "pressure": (0, 8),
+}
+
+
+def _random_readings(count, seed=1):
+    """Readings with ~10% NULLs and ~20% breakpoint values per column."""
+    rng = random.Random(seed)
+    readings = []
+    for _ in range(count):
+        reading = {}
+        for key, (low, high) in RANGES.items():
+            u = rng.random()
+            if u < 0.1:
+                reading[key] = None
+            elif u < 0.3:
+                reading[key] = rng.choice(EDGES[key])
+            elif key == "coliform":
+                reading[key] = rng.randint(low, high)
+            else:
+                reading[key] = round(rng.uniform(low, high), rng.choice([1, 2, 3]))
+        readings.append(reading)
+    return readings
+
+
+def _batch_results(readings, **kwargs):
+    cwqi, status, reasons = compute_cwqi_batch(readings_to_columns(readings), **kwargs)
+    return [
+        (float(c), STATUS_NAMES[s], reason_text(r))
+        for c, s, r in zip(cwqi.tolist(), status.tolist(), reasons.tolist())
+    ]
+
+
+def _mismatches(readings, batch, profile=None):
+    return [
+        (reading, compute_cwqi(reading, profile), got)
+        for reading, got in zip(readings, batch)
+        if compute_cwqi(reading, profile) != got
+    ]
+
+
+# -------- BATCH == SCALAR --------
+def test_batch_matches_scalar_on_random_readings():
+    readings = _random_readings(20000)
+    assert _mismatches(readings, _batch_results(readings)) == []
+
+
+def test_batch_matches_scalar_on_edge_readings():
+    readings = [
+        dict.fromkeys(READING_KEYS),                        # every column NULL
+        dict(dict.fromkeys(READING_KEYS), coliform=0),      # one column only
+        dict(dict.fromkeys(READING_KEYS), coliform=12),     # coliform override alone
+        {"turbidity": 0.5, "ph": 7.0, "fluoride": 0.5, "coliform": 3, "conductivity": 300,
+         "temperature": 25, "dissolved_oxygen": 7, "pressure": 3},
+        {"turbidity": 0.5, "ph": 7.0, "fluoride": 0.5, "coliform": 11, "conductivity": 300,
+         "temperature": 25, "dissolved_oxygen": 7, "pressure": 3},
+    ]
+    for key, values in EDGES.items():
+        for value in values:
+            readings.append(dict(readings[3], **{key: value}))
+    assert _mismatches(readings, _batch_results(readings)) == []
+
+
+def test_round2_matches_builtin_round_on_ties():
+    # .xx5 values, where np.round alone can pick the other neighbour
+    values = np.array([i / 1000 for i in range(0, 100001, 5)] + [0.285, 1.005, 2.675, 80.125])
+    assert _round2(values).tolist() == [round(v, 2) for v in values.tolist()]
+
+
+# -------- PROFILES --------
+def test_batch_matches_scalar_per_profile():
+    readings = _random_readings(5000, seed=2)
+    assert _mismatches(readings, _batch_results(readings, profile="monsoon"), "monsoon") == []
+
+    ids = [profile_id("bis"), profile_id("monsoon")] * (len(readings) // 2)
+    mixed = _batch_results(readings, profile_ids=ids)
+    expected = [compute_cwqi(r, "bis" if i % 2 == 0 else "monsoon") for i, r in enumerate(readings)]
+    assert mixed == expected
+
+
+def test_register_profile_scores_and_replaces():
+    spec = copy.deepcopy(BIS_PROFILE)
+    spec["weights"]["pressure"] = 0.5
+    pid = register_profile("test_pressure_heavy", spec)
+    assert PROFILES["test_pressure_heavy"].weights["pressure"] == 0.5
+
+    readings = _random_readings(2000, seed=3)
+    batch = _batch_results(readings, profile="test_pressure_heavy")
+    assert _mismatches(readings, batch, "test_pressure_heavy") == []
+
+    spec["weights"]["pressure"] = 0.2
+    assert register_profile("test_pressure_heavy", spec) == pid
+    assert PROFILES["test_pressure_heavy"].weights["pressure"] == 0.2
+
+
+@pytest.mark.parametrize("params", [
+    {"edges": [["le", 5], ["le", 1]], "pieces": [100, 50, 0]},   # unsorted
+    {"edges": [["le", 1]], "pieces": [100, 50, 0]},              # one piece too many
+])
+def test_register_profile_rejects_bad_curves(params):
+    spec = copy.deepcopy(BIS_PROFILE)
+    spec["params"]["turbidity"] = params
+    with pytest.raises(ValueError):
+        register_profile("test_bad", spec)
+
+
+# -------- CACHE --------
+def test_cache_scores_the_quantized_reading():
+    cache = CWQICache(capacity=8)
+    reading = {"turbidity": 1.2345, "ph": 7.004, "fluoride": 0.5, "coliform": 0,
+               "conductivity": 800.001, "temperature": 31, "dissolved_oxygen": 5.0,
+               "pressure": None}
+    quantized = {k: None if v is None else round(v, 2) for k, v in reading.items()}
+
+    assert cache.key(reading) == cache.key(quantized)
+    assert cache.compute(reading) == compute_cwqi(quantized)
+    assert cache.compute(quantized) == compute_cwqi(quantized)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Same values under another profile are a separate entry
+    assert cache.compute(quantized, "monsoon") == compute_cwqi(quantized, "monsoon")
+    assert cache.misses == 2
+
+
+def test_cache_batch_matches_uncached_and_evicts():
+    readings = _random_readings(300, seed=4)
+    for reading in readings:
+        for key, value in reading.items():
+            if isinstance(value, float):
+                reading[key] = round(value, 2)
+    ids = [profile_id("bis")] * len(readings)
+
+    cache = CWQICache(capacity=100)
+    cached = cache.compute_batch(readings, ids)
+    uncached = compute_cwqi_batch(readings_to_columns(readings))
+    for got, expected in zip(cached, uncached):
+        assert got.tolist() == expected.tolist()
+    assert cache.stats()["size"] == 100
+    assert cache.evictions == cache.misses - 100
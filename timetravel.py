@@ -0,0 +1,220 @@
+import os
+import sys
+import json
+import time
+import zlib
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from storage import session, STORAGE_BACKEND, STORAGE_ERRORS
+
+# =========================
+# Point-in-time network status
+# =========================
+#
+# Every node_status write is also appended to node_status_changes (see
+# Storage.upsert_statuses; the analyzer only writes rows that changed).
+# This job folds those changes into a compact snapshot of the whole
+# network every SNAPSHOT_INTERVAL_SECONDS:
+#
+#   status_snapshots   taken_at, last_change_id, zlib-compressed JSON
+#                      node_id -> [last_updated, cwqi, status, reason, anomaly]
+#
+# The state at time T is the newest snapshot taken at or before T, plus
+# each node's last change between that snapshot and the next one made at
+# or before T. That is one snapshot row and one grouped range scan of at
+# most one interval of changes, whatever T is.
+#
+# change_id order stands in for changed_at order, which holds since
+# each tick's changes are committed together by the analyzer.
+#
+# changed_at is the analyzer's UTC clock, stored without an offset.
+# Lookup times are converted to that form; naive ones are local time.
+
+SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "300"))
+# Snapshots (and the changes they fold in) older than this are dropped; 0 keeps all
+STATUS_HISTORY_RETENTION_DAYS = int(os.getenv("STATUS_HISTORY_RETENTION_DAYS", "90"))
+SNAPSHOT_FETCH_ROWS = 50000
+# Newer than any change_id: "no next snapshot"
+NO_UPPER_BOUND = 2 ** 63 - 1
+
+# db/migrations/004_status_history.sql
+MIGRATION_VERSION = 4
+
+
+# -------- ENCODING --------
+def to_stored_time(value):
+    """Naive UTC, as changed_at and taken_at are stored."""
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _iso(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+def _entry(row):
+    return [_iso(row["changed_at"]), float(row["cwqi"]), row["status"], row["reason"],
+            bool(row["anomaly_detected"])]
+
+
+def encode_state(state):
+    return zlib.compress(json.dumps(state, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def decode_state(blob):
+    return json.loads(zlib.decompress(blob))
+
+
+# -------- SNAPSHOTS --------
+def take_snapshot(store, fetch_rows=SNAPSHOT_FETCH_ROWS):
+    """
+    Folds the changes since the newest snapshot into a new one and
+    commits it. Returns the snapshot's node count, or None if nothing
+    changed.
+    """
+    previous = store.snapshot_at()
+    state = decode_state(previous["data"]) if previous else {}
+    last_change_id = previous["last_change_id"] if previous else 0
+
+    last_row = None
+    while True:
+        rows = store.status_changes_since(last_change_id, fetch_rows)
+        for row in rows:
+            state[row["node_id"]] = _entry(row)
+        if rows:
+            last_row = rows[-1]
+            last_change_id = last_row["change_id"]
+        if len(rows) < fetch_rows:
+            break
+
+    if last_row is None:
+        return None
+    store.insert_snapshot(last_row["changed_at"], last_change_id, len(state), encode_state(state))
+    store.commit()
+    return len(state)
+
+
+def prune(store, retention_days=STATUS_HISTORY_RETENTION_DAYS):
+    """
+    Keeps the newest snapshot before the retention cutoff (so the cutoff
+    itself can still be rebuilt) and everything after it.
+    """
+    if retention_days <= 0:
+        return 0, 0
+    keep = store.snapshot_at(to_stored_time(datetime.now()) - timedelta(days=retention_days))
+    if keep is None:
+        return 0, 0
+    deleted = store.prune_status_history(keep)
+    store.commit()
+    return deleted
+
+
+# -------- RECONSTRUCTION --------
+def state_at(store, at):
+    """
+    Network status at `at`: {"at", "snapshot_at", "replayed", "nodes"},
+    nodes being node_id -> {last_updated, cwqi, status, reason, anomaly_detected}.
+    Nodes with no status yet at `at` are absent. Times in the result are UTC.
+    """
+    at = to_stored_time(at)
+    snapshot = store.snapshot_at(at)
+    state = decode_state(snapshot["data"]) if snapshot else {}
+    after_id = snapshot["last_change_id"] if snapshot else 0
+    upto_id = store.next_snapshot_change_id(snapshot["snapshot_id"] if snapshot else 0)
+
+    rows = store.latest_status_changes(after_id, upto_id or NO_UPPER_BOUND, at)
+    for row in rows:
+        state[row["node_id"]] = _entry(row)
+
+    return {
+        "at": _iso(at),
+        "snapshot_at": _iso(snapshot["taken_at"]) if snapshot else None,
+        "replayed": len(rows),
+        "nodes": {
+            node_id: {
+                "last_updated": last_updated, "cwqi": cwqi, "status": status,
+                "reason": reason, "anomaly_detected": anomaly,
+            }
+            for node_id, (last_updated, cwqi, status, reason, anomaly) in state.items()
+        },
+    }
+
+
+# -------- SETUP --------
+def migrate(conn):
+    """
+    Brings MySQL up to node_status_changes and status_snapshots through
+    migrate.py, which records the baseline on first apply. Returns the
+    versions applied.
+    """
+    from migrate import upgrade
+    return upgrade(conn, MIGRATION_VERSION)
+
+
+# -------- LOOP --------
+def run_snapshots(interval_seconds=SNAPSHOT_INTERVAL_SECONDS):
+    print("[SNAPSHOT] Status snapshot job started")
+    try:
+        while True:
+            start = time.perf_counter()
+            with session() as store:
+                nodes = take_snapshot(store)
+                snapshots, changes = prune(store)
+            if nodes is not None:
+                print(f"[SNAPSHOT] Saved {nodes} nodes in "
+                      f"{round((time.perf_counter() - start) * 1000, 1)}ms")
+            if snapshots:
+                print(f"[SNAPSHOT] Pruned {snapshots} snapshots and {changes} changes")
+            time.sleep(interval_seconds)
+    except KeyboardInterrupt:
+        print("\n[SNAPSHOT] Stopped.")
+    except STORAGE_ERRORS as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Status snapshots and point-in-time lookups")
+    parser.add_argument("action", nargs="?", default="run", choices=["run", "once", "migrate", "at"])
+    parser.add_argument("--time", type=datetime.fromisoformat, help="at: ISO time")
+    args = parser.parse_args()
+
+    if args.action == "run":
+        run_snapshots()
+        sys.exit(0)
+
+    try:
+        if args.action == "migrate":
+            if STORAGE_BACKEND == "mysql":
+                from db import connection
+                with connection() as conn:
+                    versions = migrate(conn)
+                print(f"[SNAPSHOT] Status history ready, {len(versions)} migrations applied")
+            else:
+                # Without a baseline, nodes that never change would be missing
+                with session() as store:
+                    added = store.backfill_status_changes()
+                    store.commit()
+                print(f"[SNAPSHOT] Status history ready, {added} current statuses recorded")
+
+        elif args.action == "once":
+            with session() as store:
+                nodes = take_snapshot(store)
+            print(f"[SNAPSHOT] Saved {nodes or 0} nodes")
+
+        else:
+            if not args.time:
+                parser.error("at needs --time")
+            start = time.perf_counter()
+            with session() as store:
+                result = state_at(store, args.time)
+            counts = {}
+            for node in result["nodes"].values():
+                counts[node["status"]] = counts.get(node["status"], 0) + 1
+            print(f"[SNAPSHOT] {args.time}: {len(result['nodes'])} nodes {counts} "
+                  f"(snapshot {result['snapshot_at']}, {result['replayed']} changes replayed, "
+                  f"{round((time.perf_counter() - start) * 1000, 1)}ms)")
+
+    except STORAGE_ERRORS as e:
+        print(f"[ERROR] {e}")
+        sys.exit(1)
@@ -0,0 +1,160 @@
+import numpy as np
+
+# =========================
+# Network topology index
+# =========================
+#
+# The pump -> zone -> colony tree as flat integer arrays:
+#
+#   parent[i]                       parent index, -1 for pumps (and orphans)
+#   children[offsets[i]:offsets[i + 1]]   CSR child list
+#   tin[i], size[i]                 Euler tour entry and subtree size; the
+#                                   subtree of i is order[tin[i]:tin[i] + size[i]]
+#
+# Descendants are a slice of `order` (O(k)), subtree size and "is a below
+# b" are O(1), ancestors walk at most two parents. The arrays cost about
+# 25 bytes per node, roughly 25 MB for a million nodes, plus the node_id
+# strings themselves.
+
+NODES_QUERY = "SELECT node_id, hierarchy_level, pump, zone FROM nodes"
+
+
+def _ranges(starts, lengths):
+    """Concatenation of range(s, s + l) for each pair, as one array."""
+    total = int(lengths.sum())
+    if not total:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return np.arange(total) - offsets + np.repeat(starts, lengths)
+
+
+class Topology:
+    """Immutable tree over node indices 0..n-1; node_ids[i] names node i."""
+
+    def __init__(self, node_ids, levels, parent):
+        """node_ids: list of str; levels, parent: per-node arrays (-1 = root)."""
+        self.node_ids = list(node_ids)
+        self.index = {node_id: i for i, node_id in enumerate(self.node_ids)}
+        self.level = np.asarray(levels, dtype=np.int8)
+        self.parent = np.asarray(parent, dtype=np.int32)
+        n = len(self.node_ids)
+
+        # CSR children, siblings in node order
+        has_parent = self.parent >= 0
+        child_count = np.bincount(self.parent[has_parent], minlength=n)
+        self.offsets = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(child_count, out=self.offsets[1:])
+        self.children = np.flatnonzero(has_parent)[
+            np.argsort(self.parent[has_parent], kind="stable")
+        ].astype(np.int32)
+
+        # Breadth-first layers; each layer comes out grouped by parent
+        self.roots = np.flatnonzero(~has_parent).astype(np.int32)
+        layers = [self.roots]
+        while layers[-1].size:
+            frontier = layers[-1]
+            layers.append(self.children[_ranges(self.offsets[frontier], child_count[frontier])])
+        layers.pop()
+
+        # Subtree sizes bottom-up, then Euler entry times top-down
+        self.size = np.ones(n, dtype=np.int32)
+        for layer in reversed(layers[1:]):
+            self.size += np.bincount(self.parent[layer], weights=self.size[layer], minlength=n).astype(np.int32)
+
+        self.tin = np.zeros(n, dtype=np.int32)
+        self.tin[self.roots] = np.cumsum(self.size[self.roots]) - self.size[self.roots]
+        for layer in layers[1:]:
+            parents = self.parent[layer]
+            before = np.cumsum(self.size[layer]) - self.size[layer]
+            first = np.ones(layer.size, dtype=bool)
+            first[1:] = parents[1:] != parents[:-1]
+            group_start = np.repeat(before[first], np.diff(np.append(np.flatnonzero(first), layer.size)))
+            self.tin[layer] = self.tin[parents] + 1 + before - group_start
+
+        self.order = np.empty(n, dtype=np.int32)
+        self.order[self.tin] = np.arange(n, dtype=np.int32)
+
+    # -------- CONSTRUCTION --------
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        rows: dicts with node_id, hierarchy_level, pump, zone. A zone's
+        parent is the pump node with the same pump; a colony's is the
+        zone node with the same (pump, zone).
+        """
+        pumps = {}
+        zones = {}
+        for i, row in enumerate(rows):
+            if row["hierarchy_level"] == 1:
+                pumps[row["pump"]] = i
+            elif row["hierarchy_level"] == 2:
+                zones[(row["pump"], row["zone"])] = i
+
+        parent = [
+            pumps.get(row["pump"], -1) if row["hierarchy_level"] == 2
+            else zones.get((row["pump"], row["zone"]), -1) if row["hierarchy_level"] == 3
+            else -1
+            for row in rows
+        ]
+        return cls([row["node_id"] for row in rows], [row["hierarchy_level"] for row in rows], parent)
+
+    @classmethod
+    def load(cls, conn):
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(NODES_QUERY)
+        rows = cursor.fetchall()
+        cursor.close()
+        return cls.from_rows(rows)
+
+    # -------- QUERIES (integer ids) --------
+    def __len__(self):
+        return len(self.node_ids)
+
+    def children_of(self, i):
+        return self.children[self.offsets[i]:self.offsets[i + 1]]
+
+    def subtree(self, i):
+        """i and everything below it."""
+        return self.order[self.tin[i]:self.tin[i] + self.size[i]]
+
+    def descendants(self, i):
+        return self.order[self.tin[i] + 1:self.tin[i] + self.size[i]]
+
+    def subtree_size(self, i):
+        return int(self.size[i])
+
+    def ancestors(self, i):
+        """Parent first, root last."""
+        result = []
+        p = self.parent[i]
+        while p >= 0:
+            result.append(int(p))
+            p = self.parent[p]
+        return result
+
+    def is_ancestor(self, a, b):
+        """True if b is in the subtree of a (a node counts as its own)."""
+        return self.tin[a] <= self.tin[b] < self.tin[a] + self.size[a]
+
+    def pump_of(self, i):
+        ancestors = self.ancestors(i)
+        return ancestors[-1] if ancestors else i
+
+    # -------- QUERIES (node_id strings) --------
+    def ids(self, indices):
+        return [self.node_ids[i] for i in indices]
+
+    def descendant_ids(self, node_id):
+        return self.ids(self.descendants(self.index[node_id]))
+
+    def ancestor_ids(self, node_id):
+        return self.ids(self.ancestors(self.index[node_id]))
+
+    def parent_id(self, node_id):
+        p = self.parent[self.index[node_id]]
+        return self.node_ids[p] if p >= 0 else None
+
+    def nbytes(self):
+        arrays = (self.level, self.parent, self.offsets, self.children,
+                  self.roots, self.size, self.tin, self.order)
+        return sum(a.nbytes for a in arrays)
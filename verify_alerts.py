@@ -1,18 +1,9 @@
 import time
 import subprocess
-import mysql.connector
 from datetime import datetime, timezone
 
-# DB CONFIG
-DB_CONFIG = {
-    "host": "127.0.0.1",
-    "user": "root",
-    "password": "5568",
-    "database": "jalrakshak"
-}
-
-def get_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+from db import get_connection
+from sensor_latest import upsert_latest
 
 def setup_test_data():
     conn = get_connection()
@@ -23,6 +14,7 @@ def setup_test_data():
     # Clean up
     cursor.execute("DELETE FROM alerts WHERE node_id = %s", (node_id,))
     cursor.execute("DELETE FROM sensor_readings WHERE node_id = %s", (node_id,))
+    cursor.execute("DELETE FROM sensor_latest WHERE node_id = %s", (node_id,))
     cursor.execute("DELETE FROM node_status WHERE node_id = %s", (node_id,))
     cursor.execute("DELETE FROM nodes WHERE node_id = %s", (node_id,))
     
@@ -36,6 +28,16 @@ def setup_test_data():
     conn.commit()
     return node_id, conn
 
+def insert_reading(cursor, row):
+    # Same transaction as the history insert, like the simulator
+    cursor.execute("""
+        INSERT INTO sensor_readings (
+            node_id, timestamp, turbidity, ph, fluoride, coliform,
+            conductivity, temperature, dissolved_oxygen, pressure, flow_rate
+        ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, row)
+    upsert_latest(cursor, [row])
+
 def insert_reading_bad(node_id, conn):
     cursor = conn.cursor()
     # Bad reading (coliform > 0 -> RED immediately, or bad values)
@@ -49,23 +51,13 @@ def insert_reading_bad(node_id, conn):
     # Let's make it very bad.
     
     print(f"Inserting BAD reading for {node_id}")
-    cursor.execute("""
-        INSERT INTO sensor_readings (
-            node_id, turbidity, ph, fluoride, coliform,
-            conductivity, temperature, dissolved_oxygen, pressure
-        ) VALUES (%s, 10.0, 4.0, 2.0, 100, 2000, 40, 1.0, 0.5)
-    """, (node_id,))
+    insert_reading(cursor, (node_id, datetime.now(), 10.0, 4.0, 2.0, 100, 2000, 40, 1.0, 0.5, None))
     conn.commit()
 
 def insert_reading_good(node_id, conn):
     cursor = conn.cursor()
     print(f"Inserting GOOD reading for {node_id}")
-    cursor.execute("""
-        INSERT INTO sensor_readings (
-            node_id, turbidity, ph, fluoride, coliform,
-            conductivity, temperature, dissolved_oxygen, pressure
-        ) VALUES (%s, 0.5, 7.0, 0.5, 0, 300, 25, 7.0, 3.0)
-    """, (node_id,))
+    insert_reading(cursor, (node_id, datetime.now(), 0.5, 7.0, 0.5, 0, 300, 25, 7.0, 3.0, None))
     conn.commit()
 
 def check_alerts(node_id, conn):